@@ -0,0 +1,60 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from .write_queue import WriteQueue
+
+
+class AsyncDatabase:
+    """واجهة غير متزامنة لـ Database: الكتابة عبر طابور Group Commit والقراءة في مجموعة خيوط
+
+    Usage:
+        orders = await db.aio.get_all_orders(limit=100)
+        await db.aio.delete_order(order_id)
+    """
+
+    # Methods with these prefixes only read and may run concurrently
+    READ_PREFIXES = ("get_", "is_", "explain_", "generate_")
+    READ_METHODS = frozenset({"check_query_plans"})
+
+    def __init__(self, db, readers: int = 3):
+        self.db = db
+        self.writes = WriteQueue(db._pool)
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+
+    @classmethod
+    def is_read(cls, name: str) -> bool:
+        """هل الدالة للقراءة فقط؟"""
+        return name.startswith(cls.READ_PREFIXES) or name in cls.READ_METHODS
+
+    async def run(self, fn: Callable[..., Any], *args, write: bool = True, **kwargs) -> Any:
+        """تشغيل دالة متزامنة على خيط قاعدة البيانات المناسب دون حجب حلقة الأحداث"""
+        if write:
+            return await asyncio.wrap_future(self.writes.submit(fn, *args, **kwargs))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(fn, *args, **kwargs))
+
+    def queue_stats(self) -> Dict[str, float]:
+        """عدادات زمن الانتظار والإنتاجية لطابور الكتابة"""
+        return self.writes.stats()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        write = not self.is_read(name)
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, write=write, **kwargs)
+
+        # cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, method)
+        return method
+
+    def close(self) -> None:
+        """انتظار العمليات الجارية ثم إيقاف الخيوط"""
+        self.writes.close()
+        self._readers.shutdown(wait=True)
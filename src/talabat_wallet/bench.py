@@ -0,0 +1,461 @@
+"""أدوات قياس الأداء المدمجة
+
+Usage:
+    python -m talabat_wallet.bench profiles [--orders N]
+    python -m talabat_wallet.bench plans [--db PATH]
+    python -m talabat_wallet.bench queue [--orders N]
+    python -m talabat_wallet.bench wallet-stress [--procs N] [--ops N]
+    python -m talabat_wallet.bench recurring [--weeks N]
+    python -m talabat_wallet.bench arabic [--rows N]
+    python -m talabat_wallet.bench bulk-delete [--orders N]
+    python -m talabat_wallet.bench import [--rows N] [--format csv|jsonl]
+    python -m talabat_wallet.bench engine [--rows N] [--seed N]
+    python -m talabat_wallet.bench ledger [--orders N]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .database import Database
+from .engine import AccountingEngine
+from .storage import PROFILES
+
+
+def _sample_order(i: int) -> dict:
+    order_type = ("Restaurant", "Mart", "Friendly Restaurant")[i % 3]
+    order = AccountingEngine.create_order(
+        "CASH", order_type, paid=50.0 + i % 7, expected=100.0 + i % 11,
+        actual=105.0 + i % 13, delivery_fee=20.0
+    )
+    return order.to_dict()
+
+
+def benchmark_profiles(orders: int = 200, aggregates: int = 50) -> List[Dict[str, float]]:
+    """قياس زمن الإدخال والتجميع لكل نمط تخزين على الجهاز الحالي"""
+    results = []
+    for name in PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(str(Path(tmp) / "bench.db"), profile=name)
+            try:
+                start = time.perf_counter()
+                for i in range(orders):
+                    db.add_order(_sample_order(i))
+                insert_ms = (time.perf_counter() - start) * 1000 / orders
+
+                start = time.perf_counter()
+                for _ in range(aggregates):
+                    db.get_analysis_stats("MONTHLY")
+                    db.get_daily_profit()
+                aggregate_ms = (time.perf_counter() - start) * 1000 / aggregates
+            finally:
+                db.close()
+        results.append({
+            'profile': name,
+            'insert_ms': insert_ms,
+            'aggregate_ms': aggregate_ms,
+        })
+    return results
+
+
+def benchmark_queue(orders: int = 200) -> Dict[str, Dict[str, float]]:
+    """مقارنة الإدخال المباشر (COMMIT لكل طلب) بطابور الكتابة الجماعية"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / "direct.db"))
+        try:
+            start = time.perf_counter()
+            for i in range(orders):
+                db.add_order(_sample_order(i))
+            results['direct'] = {
+                'ms_per_order': (time.perf_counter() - start) * 1000 / orders,
+                'commits': orders,
+            }
+        finally:
+            db.close()
+
+        async def burst(db: Database) -> None:
+            await asyncio.gather(*(db.aio.add_order(_sample_order(i)) for i in range(orders)))
+
+        db = Database(str(Path(tmp) / "queued.db"))
+        try:
+            start = time.perf_counter()
+            asyncio.run(burst(db))
+            stats = db.aio.queue_stats()
+            results['queued'] = {
+                'ms_per_order': (time.perf_counter() - start) * 1000 / orders,
+                'commits': stats['batches'],
+                'avg_latency_ms': stats['avg_latency_ms'],
+            }
+        finally:
+            db.close()
+    return results
+
+
+def _stress_worker(db_path: str, seed: int, ops: int) -> Dict[str, int]:
+    """عملية مستقلة تضيف وتعدل وتحذف الطلبات على نفس الملف"""
+    rng = random.Random(seed)
+    db = Database(db_path)
+    mine: List[int] = []
+    done = errors = 0
+    try:
+        for i in range(ops):
+            try:
+                action = rng.random()
+                if action < 0.2 and mine:
+                    db.delete_order(mine.pop(rng.randrange(len(mine))))
+                elif action < 0.4 and mine:
+                    db.update_order(rng.choice(mine), _sample_order(rng.randrange(1000)))
+                else:
+                    mine.append(db.add_order(_sample_order(seed * ops + i)))
+                done += 1
+            except Exception:
+                errors += 1
+    finally:
+        db.close()
+    return {'ops': done, 'errors': errors}
+
+
+def stress_wallet(procs: int = 4, ops: int = 200) -> Dict[str, float]:
+    """ضغط المحفظة من عدة عمليات؛ يجب أن يساوي رصيد الشركة مجموع تأثيرات الطلبات"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "stress.db")
+        Database(db_path).close()
+
+        start = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(procs) as pool:
+            results = pool.starmap(_stress_worker, [(db_path, seed, ops) for seed in range(procs)])
+        elapsed = time.perf_counter() - start
+
+        db = Database(db_path)
+        try:
+            wallet = db.get_settings()['company_wallet']
+            with db._pool.read() as conn:
+                expected = conn.execute("SELECT COALESCE(SUM(company_wallet_effect), 0) FROM orders").fetchone()[0]
+        finally:
+            db.close()
+
+    total_ops = sum(r['ops'] for r in results)
+    return {
+        'ops': total_ops,
+        'errors': sum(r['errors'] for r in results),
+        'ops_per_sec': total_ops / elapsed if elapsed else 0.0,
+        'company_wallet': wallet,
+        'expected_wallet': expected,
+        'drift': wallet - expected,
+    }
+
+
+def benchmark_recurring(weeks: int = 4) -> Dict[str, float]:
+    """جدولة قالب Sun–Thu 18:00–02:00: وردية بوردية مقابل دفعة واحدة"""
+    first = datetime.now().date() + timedelta(days=1)
+    weekdays = (6, 0, 1, 2, 3)
+    dates = [first + timedelta(days=i) for i in range(weeks * 7)]
+    dates = [d.strftime("%Y-%m-%d") for d in dates if d.weekday() in weekdays]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / "single.db"))
+        try:
+            start = time.perf_counter()
+            for d in dates:
+                db.add_scheduled_shift(d, "18:00", "02:00")
+            single_ms = (time.perf_counter() - start) * 1000
+        finally:
+            db.close()
+        db = Database(str(Path(tmp) / "bulk.db"))
+        try:
+            start = time.perf_counter()
+            result = db.add_recurring_shifts(first.strftime("%Y-%m-%d"), weekdays, "18:00", "02:00", weeks)
+            bulk_ms = (time.perf_counter() - start) * 1000
+        finally:
+            db.close()
+    return {'shifts': len(dates), 'added': len(result['added']), 'single_ms': single_ms, 'bulk_ms': bulk_ms}
+
+
+def benchmark_arabic(rows: int = 1000) -> Dict[str, Any]:
+    """تشكيل نصوص سجل من N سطر: بدون ذاكرة، ثم بارد (ذاكرة فارغة)، ثم دافئ"""
+    from . import utils
+    descriptions = ["بنزين", "غداء", "ماء", "قهوة", "صيانة الموتوسيكل", "شحن رصيد", "Parking", "زيت"]
+    statuses = ["🏁 FINISHED", "❌ ABSENT", "📅 SCHEDULED", "🟢 ACTIVE"]
+    # the strings one row hands to format_arabic (order type, description, status)
+    labels = []
+    for i in range(rows):
+        labels += [("Restaurant", "Mart", "Friendly Restaurant")[i % 3],
+                   f"{descriptions[i % len(descriptions)]} {i % 30}", statuses[i % len(statuses)]]
+
+    def timed(fn) -> float:
+        start = time.perf_counter()
+        for text in labels:
+            fn(text)
+        return (time.perf_counter() - start) * 1000
+
+    uncached_ms = timed(utils._shape_arabic.__wrapped__)
+    utils.clear_format_arabic_cache()
+    cold_ms = timed(utils.format_arabic)
+    warm_ms = timed(utils.format_arabic)
+    return {'labels': len(labels), 'uncached_ms': uncached_ms, 'cold_ms': cold_ms, 'warm_ms': warm_ms,
+            'shaping': utils.HAS_ARABIC_SUPPORT, **utils.format_arabic_cache_info()}
+
+
+def benchmark_bulk_delete(orders: int = 200) -> Dict[str, Any]:
+    """حذف N طلب: delete_order في حلقة (COMMIT لكل طلب) مقابل delete_orders (معاملة واحدة)"""
+    results = {'orders': orders}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("loop", "bulk"):
+            db = Database(str(Path(tmp) / f"{name}.db"))
+            try:
+                shift_date = datetime.now().strftime("%Y-%m-%d")
+                db.add_scheduled_shift(shift_date, "00:00", "23:59")
+                db.start_shift(db.get_shifts_by_date(shift_date)[0]['id'])
+                # every other order goes, so the surviving totals are worth comparing
+                ids = [db.add_order(_sample_order(i)) for i in range(orders * 2)][::2]
+                start = time.perf_counter()
+                if name == "loop":
+                    for order_id in ids:
+                        db.delete_order(order_id)
+                else:
+                    db.delete_orders(ids)
+                results[f'{name}_ms'] = (time.perf_counter() - start) * 1000
+                shift = db.get_active_shift()
+                results[f'{name}_state'] = (round(db.get_balances()['company_wallet'], 6),
+                                            shift['total_orders'], round(shift['total_income'], 6))
+            finally:
+                db.close()
+    return results
+
+
+def _write_export(path: Path, rows: int, fmt: str = "csv") -> None:
+    """ملف تصدير اصطناعي من N طلب (كل خامس طلب VISA ببقشيش) بصيغة csv أو jsonl"""
+    from .importer import AMOUNT_FIELDS
+    fields = ['datetime', 'mode', 'order_type', *AMOUNT_FIELDS]
+    start_day = datetime(2025, 1, 1)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for i in range(rows):
+            row = {key: value for key, value in _sample_order(i).items() if key in fields}
+            row['datetime'] = (start_day + timedelta(minutes=7 * i)).isoformat()
+            if i % 5 == 0:
+                row.update(mode="VISA", paid=0.0, expected=0.0, actual=0.0, tip_cash=0.0, tip_visa=float(i % 4))
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row) + "\n")
+
+
+def benchmark_import(rows: int = 100_000, fmt: str = "csv") -> Dict[str, Any]:
+    """استيراد ملف من N طلب مرتين: الأولى تُدخل كل شيء، والثانية تتخطى كل شيء بالبصمة"""
+    from .importer import import_orders
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"orders.{fmt}"
+        _write_export(path, rows, fmt)
+        db = Database(str(Path(tmp) / "import.db"))
+        try:
+            first = import_orders(db, str(path))
+            again = import_orders(db, str(path))
+        finally:
+            db.close()
+    return {'rows': rows, 'first': first, 'again': again}
+
+
+def benchmark_ledger(orders: int = 100_000, shifts: int = 300) -> Dict[str, Any]:
+    """verify_ledger على قاعدة من N طلب موزعة على ورديات: فحص نظيف، ثم انحراف مزروع يُكتشف ويُصلح"""
+    from .importer import import_orders
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "orders.csv"
+        _write_export(path, orders)
+        db = Database(str(Path(tmp) / "ledger.db"))
+        try:
+            import_orders(db, str(path))
+            for day in range(shifts):
+                db.add_scheduled_shift((datetime(2025, 1, 1) + timedelta(days=day)).strftime("%Y-%m-%d"), "00:00", "23:59")
+            with db._pool.write() as conn:
+                # hand the imported history to the shifts, then settle their counters once
+                conn.execute("UPDATE orders SET shift_id = (SELECT MIN(id) FROM shifts) + id % ?", (shifts,))
+            db.verify_ledger(repair=True)
+            clean = db.verify_ledger()
+            with db._pool.write() as conn:
+                # one drifted value of each kind
+                conn.execute("UPDATE settings SET company_wallet = company_wallet + 1 WHERE id = 1")
+                conn.execute("UPDATE shifts SET total_orders = total_orders + 1 WHERE id = (SELECT MIN(id) FROM shifts)")
+                conn.execute("UPDATE daily_stats SET delivery_income = delivery_income - 20 WHERE date = '2025-01-02'")
+            db.settings_store.load()
+            drifted = db.verify_ledger()
+            repaired = db.verify_ledger(repair=True)
+            after = db.verify_ledger()
+        finally:
+            db.close()
+    return {'orders': orders, 'clean': clean, 'drifted': drifted, 'repaired': repaired, 'after': after}
+
+
+def _effect_columns(rows: int, seed: int) -> Dict[str, List[Any]]:
+    """أعمدة طلبات عشوائية تغطي كل الفروع والحالات الحدية (أصفار سالبة، NaN، لا نهاية، أوضاع أخرى)"""
+    rng = random.Random(seed)
+    edge = [0.0, -0.0, 1e-300, -1e-300, 1e308, -1e308, float("inf"), float("-inf"), float("nan"), 0.1, 0.2, 0.30000000000000004]
+
+    def amount() -> float:
+        roll = rng.random()
+        if roll < 0.15:
+            return rng.choice(edge)
+        if roll < 0.25:
+            return float(rng.randint(-50, 500))  # whole numbers and negatives, as typed in the form
+        return rng.uniform(-100.0, 1000.0)
+
+    columns = {'mode': [], 'order_type': [], 'paid': [], 'expected': [], 'actual': [],
+               'delivery_fee': [], 'tip_cash': [], 'tip_visa': []}
+    for i in range(rows):
+        columns['mode'].append(rng.choice(("CASH", "CASH", "VISA", "VISA", "SETTLEMENT", "TIP")))
+        columns['order_type'].append(rng.choice(("Restaurant", "Mart", "Friendly Restaurant", "Tip")))
+        for key in ('paid', 'expected', 'actual', 'delivery_fee', 'tip_cash', 'tip_visa'):
+            columns[key].append(amount())
+    return columns
+
+
+def check_engine_batch(rows: int = 200_000, seed: int = 0) -> Dict[str, Any]:
+    """مقارنة calculate_order_effects_batch بالمسار العادي عنصراً عنصراً على مستوى البتات"""
+    import numpy as np
+    c = _effect_columns(rows, seed)
+
+    start = time.perf_counter()
+    scalar = [AccountingEngine.calculate_order_effects(
+        c['mode'][i], c['order_type'][i], c['paid'][i], c['expected'][i], c['actual'][i],
+        c['delivery_fee'][i], manual_tip_cash=c['tip_cash'][i], manual_tip_visa=c['tip_visa'][i]
+    ) for i in range(rows)]
+    scalar_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    batch = AccountingEngine.calculate_order_effects_batch(
+        c['mode'], c['order_type'], c['paid'], c['expected'], c['actual'], c['delivery_fee'],
+        manual_tip_cash=c['tip_cash'], manual_tip_visa=c['tip_visa']
+    )
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    mismatches = {}
+    for k, name in enumerate(('personal_effect', 'company_effect', 'tip_cash', 'tip_visa')):
+        expected_bits = np.array([float(row[k]) for row in scalar], dtype=np.float64).view(np.int64)
+        bad = np.flatnonzero(expected_bits != batch[k].view(np.int64))
+        if len(bad):
+            mismatches[name] = [(int(i), c['mode'][i], c['order_type'][i], scalar[i][k], float(batch[k][i])) for i in bad[:5]]
+    return {'rows': rows, 'scalar_ms': scalar_ms, 'batch_ms': batch_ms, 'mismatches': mismatches}
+
+
+def check_plans(db_path: str = None) -> int:
+    """طباعة خطط الاستعلامات الساخنة؛ ترجع 1 إذا وُجد مسح كامل لجدول"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path or str(Path(tmp) / "plans.db"))
+        try:
+            for name, details in db.explain_hot_queries().items():
+                print(f"{name:<22} {' | '.join(details)}")
+            failures = db.check_query_plans()
+        finally:
+            db.close()
+    for name, detail in failures:
+        print(f"FULL SCAN: {name}: {detail}")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m talabat_wallet.bench")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_profiles = sub.add_parser("profiles", help="compare storage profiles on this device")
+    p_profiles.add_argument("--orders", type=int, default=200)
+    p_queue = sub.add_parser("queue", help="direct commits vs the group-commit write queue")
+    p_queue.add_argument("--orders", type=int, default=200)
+    p_stress = sub.add_parser("wallet-stress", help="hammer wallet mutations from several processes")
+    p_stress.add_argument("--procs", type=int, default=4)
+    p_stress.add_argument("--ops", type=int, default=200)
+    p_recurring = sub.add_parser("recurring", help="per-shift scheduling vs one bulk recurring plan")
+    p_recurring.add_argument("--weeks", type=int, default=4)
+    p_arabic = sub.add_parser("arabic", help="cold vs warm format_arabic over a history list")
+    p_arabic.add_argument("--rows", type=int, default=1000)
+    p_bulk = sub.add_parser("bulk-delete", help="delete_order in a loop vs one delete_orders transaction")
+    p_bulk.add_argument("--orders", type=int, default=200)
+    p_import = sub.add_parser("import", help="import a synthetic export, then re-import it (all duplicates)")
+    p_import.add_argument("--rows", type=int, default=100_000)
+    p_import.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    p_engine = sub.add_parser("engine", help="check the NumPy batch effects are bit-equal to the scalar path")
+    p_engine.add_argument("--rows", type=int, default=200_000)
+    p_engine.add_argument("--seed", type=int, default=0)
+    p_ledger = sub.add_parser("ledger", help="time verify_ledger and check it finds and repairs planted drift")
+    p_ledger.add_argument("--orders", type=int, default=100_000)
+    p_plans = sub.add_parser("plans", help="fail if a hot query falls back to a full table scan")
+    p_plans.add_argument("--db", default=None, help="database to inspect (default: a fresh one)")
+    args = parser.parse_args(argv)
+
+    if args.command == "profiles":
+        print(f"{'Profile':<22} {'Insert (ms/order)':>18} {'Aggregate (ms)':>16}")
+        print("-" * 58)
+        for row in benchmark_profiles(orders=args.orders):
+            print(f"{row['profile']:<22} {row['insert_ms']:>18.3f} {row['aggregate_ms']:>16.3f}")
+    elif args.command == "queue":
+        for name, row in benchmark_queue(orders=args.orders).items():
+            extra = f"  avg latency {row['avg_latency_ms']:.2f} ms" if 'avg_latency_ms' in row else ""
+            print(f"{name:<8} {row['ms_per_order']:>8.3f} ms/order  {row['commits']:>5} commits{extra}")
+    elif args.command == "wallet-stress":
+        row = stress_wallet(procs=args.procs, ops=args.ops)
+        print(f"{row['ops']} ops ({row['errors']} errors) at {row['ops_per_sec']:.0f} ops/s")
+        print(f"company wallet {row['company_wallet']:.2f}, sum of effects {row['expected_wallet']:.2f}")
+        if abs(row['drift']) > 1e-6 or row['errors']:
+            print(f"FAILED: drift {row['drift']:+.6f}")
+            sys.exit(1)
+        print("OK: no lost updates")
+    elif args.command == "recurring":
+        row = benchmark_recurring(weeks=args.weeks)
+        print(f"{row['shifts']} shifts: one by one {row['single_ms']:.1f} ms, bulk {row['bulk_ms']:.1f} ms ({row['added']} added)")
+    elif args.command == "arabic":
+        row = benchmark_arabic(rows=args.rows)
+        if not row['shaping']:
+            print("arabic_reshaper / python-bidi not installed: format_arabic is a no-op")
+        print(f"{row['labels']} labels: uncached {row['uncached_ms']:.1f} ms, "
+              f"cold {row['cold_ms']:.1f} ms, warm {row['warm_ms']:.1f} ms")
+        print(f"cache: {row['hits']} hits, {row['misses']} misses, {row['size']}/{row['maxsize']} entries")
+    elif args.command == "bulk-delete":
+        row = benchmark_bulk_delete(orders=args.orders)
+        print(f"{row['orders']} orders: loop {row['loop_ms']:.1f} ms ({row['orders']} commits), "
+              f"bulk {row['bulk_ms']:.1f} ms (1 commit)")
+        if row['loop_state'] != row['bulk_state']:
+            print(f"FAILED: loop left {row['loop_state']}, bulk left {row['bulk_state']}")
+            sys.exit(1)
+        print(f"OK: same wallet / shift totals {row['bulk_state']}")
+    elif args.command == "import":
+        row = benchmark_import(rows=args.rows, fmt=args.format)
+        for name in ("first", "again"):
+            r = row[name]
+            print(f"{name:<6} {r['read']} rows in {r['elapsed_ms'] / 1000:.2f} s ({r['chunks']} chunks): "
+                  f"{r['imported']} imported, {r['duplicates']} duplicates, {r['failed']} failed")
+    elif args.command == "engine":
+        row = check_engine_batch(rows=args.rows, seed=args.seed)
+        print(f"{row['rows']} orders: scalar {row['scalar_ms']:.1f} ms, batch {row['batch_ms']:.1f} ms")
+        for name, samples in row['mismatches'].items():
+            print(f"MISMATCH {name}: {samples}")
+        if row['mismatches']:
+            sys.exit(1)
+        print("OK: batch effects are bit-for-bit equal to calculate_order_effects")
+    elif args.command == "ledger":
+        row = benchmark_ledger(orders=args.orders)
+        for name in ("clean", "drifted", "repaired", "after"):
+            r = row[name]
+            print(f"{name:<9} {r['orders']} orders in {r['elapsed_ms']:.1f} ms: {r['issues']} issues"
+                  f"{' (repaired)' if r['repaired'] else ''}")
+        drifted = row['drifted']
+        for where, field, stored, expected in (drifted['wallets'] + drifted['shifts'] + drifted['daily_stats']
+                                               + drifted['balance_checkpoints']):
+            print(f"  {where:<12} {field:<16} stored {stored:.2f}, expected {expected:.2f}")
+        if not row['clean']['ok'] or row['drifted']['issues'] != 3 or not row['after']['ok']:
+            print("FAILED: verify_ledger missed the planted drift or left it unrepaired")
+            sys.exit(1)
+        print("OK: 3 planted discrepancies found and repaired")
+    elif args.command == "plans":
+        sys.exit(check_plans(args.db))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+from .storage import StorageProfile, get_profile
+
+
+class ConnectionManager:
+    """مدير اتصالات قاعدة البيانات: اتصال كتابة واحد واتصال قراءة لكل خيط"""
+
+    def __init__(self, db_path: Path, profile: Optional[StorageProfile] = None, timeout: float = 5.0):
+        self.db_path = Path(db_path)
+        self.profile = profile or get_profile()
+        self.timeout = timeout
+        self._write_lock = threading.RLock()
+        self._writer: sqlite3.Connection = None
+        self._depth = 0
+        self._owner = None
+        self._after_commit: List[List[Callable[[], None]]] = []  # one list per open level
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def _open(self, is_writer: bool = False) -> sqlite3.Connection:
+        """فتح اتصال جديد وتهيئته مرة واحدة"""
+        # check_same_thread is off so close() can run from any thread;
+        # the writer is guarded by _write_lock and readers stay thread-local.
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self.profile.apply(conn, is_writer=is_writer)
+        return conn
+
+    @property
+    def writer(self) -> sqlite3.Connection:
+        """اتصال الكتابة المشترك (يُفتح عند أول استخدام)"""
+        if self._writer is None:
+            with self._write_lock:
+                if self._writer is None:
+                    self._writer = self._open(is_writer=True)
+        return self._writer
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def in_write(self) -> bool:
+        """هل الخيط الحالي داخل معاملة كتابة؟"""
+        return self._owner == threading.get_ident() and self._depth > 0
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """معاملة كتابة: الاستدعاءات المتداخلة تصبح SAVEPOINT داخل المعاملة الخارجية"""
+        with self._write_lock:
+            conn = self.writer
+            self._depth += 1
+            self._owner = threading.get_ident()
+            self._after_commit.append([])
+            savepoint = f"sp_{self._depth}"
+            callbacks = None
+            try:
+                if self._depth == 1:
+                    if not conn.in_transaction:
+                        # IMMEDIATE takes the write lock up front: no lost updates or
+                        # SQLITE_BUSY on lock upgrade when another process writes too
+                        conn.execute("BEGIN IMMEDIATE")
+                else:
+                    conn.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    yield conn
+                except BaseException:
+                    if self._depth == 1:
+                        conn.rollback()
+                    else:
+                        conn.execute(f"ROLLBACK TO {savepoint}")
+                        conn.execute(f"RELEASE {savepoint}")
+                    raise
+                if self._depth == 1:
+                    conn.commit()
+                else:
+                    conn.execute(f"RELEASE {savepoint}")
+                callbacks = self._after_commit[-1]
+            finally:
+                # A rolled-back level drops its callbacks with it
+                self._after_commit.pop()
+                self._depth -= 1
+                if self._depth == 0:
+                    self._owner = None
+            if callbacks:
+                if self._depth:
+                    # Released savepoint: still undone if the outer transaction rolls back
+                    self._after_commit[-1].extend(callbacks)
+                else:
+                    self._run_callbacks(callbacks)
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """تنفيذ دالة بعد حفظ المعاملة الخارجية الحالية (أو فوراً خارج أي معاملة)"""
+        if self.in_write():
+            self._after_commit[-1].append(callback)
+        else:
+            self._run_callbacks([callback])
+
+    @staticmethod
+    def _run_callbacks(callbacks: List[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in after-commit callback: {e}")
+
+    @contextmanager
+    def committed(self) -> Iterator[sqlite3.Connection]:
+        """اتصال الكتابة بين المعاملات: قراءة الحالة المحفوظة دون أن يتداخل معها حفظ من هذه العملية"""
+        with self._write_lock:
+            yield self.writer
+
+    def external_data_version(self) -> Optional[int]:
+        """PRAGMA data_version على اتصال الكتابة: يتغير فقط بحفظ اتصال أو عملية أخرى
+
+        Returns None instead of waiting when the writer is busy on another thread.
+        """
+        if not self._write_lock.acquire(blocking=False):
+            return None
+        try:
+            return self.writer.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._write_lock.release()
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """اتصال قراءة؛ داخل معاملة كتابة نقرأ من اتصال الكتابة لرؤية التغييرات غير المحفوظة"""
+        if self.in_write():
+            yield self._writer
+        else:
+            yield self._reader()
+
+    def data_version(self) -> int:
+        """عدّاد يتغير كلما حفظ اتصال آخر تغييرات في الملف (PRAGMA data_version)، دون قراءة أي جدول"""
+        return self._reader().execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        """إغلاق جميع الاتصالات المفتوحة"""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._local = threading.local()
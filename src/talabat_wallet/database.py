@@ -1,93 +1,419 @@
 import sqlite3
 import json
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Iterator, Union
 from pathlib import Path
+from .connection import ConnectionManager
+from .deadlines import DeadlineScheduler
+from .settings_store import SettingsStore
+from .shift_clock import ShiftClock
+from .importer import AMOUNT_FIELDS, IMPORT_MODES, order_content_hash
+from .queries import (
+    ACTIVE_SHIFT, ACTIVE_SHIFT_DEADLINES, ACTIVE_SHIFT_ID, BALANCE_CHECKPOINT, BALANCE_DAY, IMPORT_DEDUP,
+    JSON_VALUES, NEXT_SHIFT, ORDER_ALLOWED, ORDERS_BY_IDS, SCHEDULED_SHIFT_ENDS, SHIFT_EXPENSE_TOTAL,
+    SHIFT_MONTH, SHIFT_ORDER_TOTALS, SHIFT_OVERLAP, SHIFTS_BY_DATE, TODAY_FINISHED_SHIFT, TODAY_NEXT_SHIFT,
+    orders_page_sql,
+)
+from .suggestions import SuggestionIndex
+from .storage import get_profile
+from .utils import shift_span, to_epoch
+
+# فهارس مسارات الوصول الساخنة (الجزئية منها تغطي الحالات النادرة فقط)
+SECONDARY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_shifts_active ON shifts(id) WHERE status = 'ACTIVE'",
+    "CREATE INDEX IF NOT EXISTS idx_shifts_scheduled ON shifts(shift_date, scheduled_start) WHERE status = 'SCHEDULED'",
+    "CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts(shift_date, scheduled_start)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_shift ON orders(shift_id, mode)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_shift ON expenses(shift_id, type)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_description ON expenses(description COLLATE NOCASE)",
+)
+
+# بصمة المحتوى فريدة؛ صفوف TIP والتسويات بلا بصمة
+ORDER_HASH_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_content_hash ON orders(content_hash) WHERE content_hash IS NOT NULL"
+# أعمدة الطلب التي يقبلها update_orders
+ORDER_PATCH_COLUMNS = (
+    'datetime', 'mode', 'order_type', 'paid', 'expected', 'actual', 'tip_cash', 'tip_visa',
+    'delivery_fee', 'personal_wallet_effect', 'company_wallet_effect', 'shift_id', 'subtype', 'metadata',
+)
+
+# أقل فرق يُعدّ انحرافاً في الدفتر (نصف قرش: تحت دقة العرض، وفوق أخطاء تقريب الجمع)
+LEDGER_TOLERANCE = 0.005
+# إجماليات كل وردية كما يحسبها end_active_shift، من الصفوف الخام في مرور واحد
+LEDGER_SHIFTS = """
+    SELECT s.id, s.total_orders, s.total_income, s.total_expenses, s.net_profit,
+           COALESCE(o.orders, 0), COALESCE(o.income, 0.0), COALESCE(e.expenses, 0.0)
+    FROM shifts s
+    LEFT JOIN (
+        SELECT shift_id, COUNT(*) AS orders, TOTAL(delivery_fee + tip_cash + tip_visa) AS income
+        FROM orders WHERE shift_id IS NOT NULL AND mode != 'TIP' GROUP BY shift_id
+    ) o ON o.shift_id = s.id
+    LEFT JOIN (
+        SELECT shift_id, TOTAL(amount) AS expenses
+        FROM expenses WHERE shift_id IS NOT NULL AND type = 'OUT' GROUP BY shift_id
+    ) e ON e.shift_id = s.id
+"""
+
+# الاستعلامات الساخنة (نفس النصوص التي تنفذها الدوال، من queries.py) وعينات معاملاتها للتحقق عبر EXPLAIN QUERY PLAN
+HOT_QUERIES = {
+    'active_shift': (ACTIVE_SHIFT, ()),
+    'active_shift_id': (ACTIVE_SHIFT_ID, ()),
+    'order_allowed': (ORDER_ALLOWED, ()),
+    'shift_deadlines': (ACTIVE_SHIFT_DEADLINES, ()),
+    'scheduled_shifts': (SCHEDULED_SHIFT_ENDS, ()),
+    'next_shift': (NEXT_SHIFT, ()),
+    'shifts_by_date': (SHIFTS_BY_DATE, ("2025-01-01",)),
+    'shift_month': (SHIFT_MONTH, ("2025-01-01", "2025-01-31")),
+    'shift_overlap': (SHIFT_OVERLAP, (0, 86400, 3600)),
+    'dashboard_next': (TODAY_NEXT_SHIFT, ("2025-01-01",)),
+    'dashboard_finished': (TODAY_FINISHED_SHIFT, ("2025-01-01",)),
+    'shift_orders': (SHIFT_ORDER_TOTALS, (1,)),
+    'shift_expenses': (SHIFT_EXPENSE_TOTAL, (1,)),
+    'orders_since': (orders_page_sql(" AND ts >= ?"), (0, 100)),
+    'orders_page': (orders_page_sql(after=True), (0, 0, 100)),
+    'orders_by_ids': (ORDERS_BY_IDS, ("[1, 2]",)),
+    'import_dedup': (IMPORT_DEDUP, ('["a", "b"]',)),
+    'balance_checkpoint': (BALANCE_CHECKPOINT, ("2025-01-01",)),
+    'balance_day': (BALANCE_DAY, (0, 86400)),
+}
+
+# فلاتر نافذة السجل (Order/Tips/Settlement) -> شروط على عمود mode
+HISTORY_MODE_FILTERS = {
+    "Order": "mode NOT IN ('TIP', 'SETTLEMENT')",
+    "Tips": "mode = 'TIP'",
+    "Settlement": "mode = 'SETTLEMENT'",
+}
+
+# نفس الفلاتر على صف في الذاكرة (يجب أن تطابق HISTORY_MODE_FILTERS)
+HISTORY_MODE_MATCHERS = {
+    "Order": lambda mode: mode not in ('TIP', 'SETTLEMENT'),
+    "Tips": lambda mode: mode == 'TIP',
+    "Settlement": lambda mode: mode == 'SETTLEMENT',
+}
+
+# سجل الترحيلات المرتبة حسب PRAGMA user_version: (الإصدار، الوصف، الدالة)
+MIGRATIONS = (
+    (1, "base schema", "_migration_base_schema"),
+    (2, "daily stats rollup", "_migration_daily_stats"),
+    (3, "epoch ts columns", "_migration_epoch_ts"),
+    (4, "secondary indexes", "_migration_secondary_indexes"),
+    (5, "shift span columns", "_migration_shift_span"),
+    (6, "order content hash", "_migration_order_hash"),
+    (7, "balance checkpoints", "_migration_balance_checkpoints"),
+    (8, "undated order ts", "_migration_order_ts_not_null"),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# أطول وردية ممكنة (النهاية تُرحَّل يوماً واحداً على الأكثر عند عبور منتصف الليل)
+MAX_SHIFT_SECONDS = 24 * 3600
 
 class Database:
     """فئة لإدارة قاعدة البيانات"""
     
-    def __init__(self, db_path: str = "talabat_wallet.db"):
+    def __init__(self, db_path: str = "talabat_wallet.db", profile: Optional[str] = None):
         """تهيئة قاعدة البيانات"""
         self.db_path = Path(db_path)
-        self.init_database()
+        self.storage_profile = get_profile(profile)
+        # اتصالات طويلة العمر بدلاً من فتح اتصال جديد في كل استدعاء
+        self._pool = ConnectionManager(self.db_path, self.storage_profile)
+        self._aio = None
+        self._suggestions: Optional[SuggestionIndex] = None
         self.migrate_database()
+        # الإعدادات والأرصدة تُقرأ مرة واحدة؛ الكتابات تحدّث النسخة في الذاكرة
+        self.settings_store = SettingsStore(self._pool)
+        self.settings_store.load()
+
+    @property
+    def aio(self):
+        """واجهة غير متزامنة (AsyncDatabase) تشارك نفس الاتصالات"""
+        if self._aio is None:
+            from .async_database import AsyncDatabase
+            self._aio = AsyncDatabase(self)
+        return self._aio
+
+    def close(self) -> None:
+        """إغلاق اتصالات قاعدة البيانات"""
+        if self._aio is not None:
+            self._aio.close()
+            self._aio = None
+        self._pool.close()
         
-    def migrate_database(self) -> None:
-        """تحديث هيكل قاعدة البيانات إذا لزم الأمر"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # تحقق من وجود عمود type في جدول expenses
-            cursor.execute("PRAGMA table_info(expenses)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'type' not in columns:
-                cursor.execute("ALTER TABLE expenses ADD COLUMN type TEXT NOT NULL DEFAULT 'OUT'")
-            
-            # تحقق من وجود عمود shift_id في جدول orders
-            cursor.execute("PRAGMA table_info(orders)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'shift_id' not in columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN shift_id INTEGER")
-            if 'subtype' not in columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN subtype TEXT")
-            if 'metadata' not in columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN metadata TEXT")
-            
-            # تحقق من وجود عمود shift_id في جدول expenses
-            cursor.execute("PRAGMA table_info(expenses)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'shift_id' not in columns:
-                cursor.execute("ALTER TABLE expenses ADD COLUMN shift_id INTEGER")
-            
-            # --- SHIFTS TABLE MIGRATION ---
-            cursor.execute("PRAGMA table_info(shifts)")
-            shift_columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'shift_date' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN shift_date DATE")
-            if 'scheduled_start' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN scheduled_start TEXT")
-            if 'scheduled_end' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN scheduled_end TEXT")
-            if 'actual_start' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN actual_start TEXT")
-            if 'actual_end' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN actual_end TEXT")
-            if 'status' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN status TEXT DEFAULT 'FINISHED'") 
-                # Default to FINISHED for old shifts to avoid issues
-            if 'is_late' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN is_late BOOLEAN DEFAULT 0")
-            if 'break_active' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN break_active BOOLEAN DEFAULT 0")
-            if 'break_start' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN break_start TEXT")
-            if 'break_end' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN break_end TEXT")
-            if 'total_break_time' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN total_break_time INTEGER DEFAULT 0")
-            if 'break_planned_duration' not in shift_columns:
-                cursor.execute("ALTER TABLE shifts ADD COLUMN break_planned_duration INTEGER")
-            
-            conn.commit()
+    def migrate_database(self) -> Dict[str, Any]:
+        """تطبيق الترحيلات الناقصة حسب PRAGMA user_version (القاعدة المحدثة = قراءة واحدة)"""
+        started = time.perf_counter()
+        with self._pool.read() as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+        
+        applied = []
+        for version, description, method in MIGRATIONS:
+            if version <= current:
+                continue
+            step_started = time.perf_counter()
+            # كل ترحيل في معاملة مستقلة مع رقم الإصدار الجديد
+            with self._pool.write() as conn:
+                # another process may have applied it while we were waiting
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    continue
+                getattr(self, method)(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version}")
+            applied.append((version, description, (time.perf_counter() - step_started) * 1000))
+        
+        self.migration_report = {
+            'from_version': current,
+            'to_version': max(current, SCHEMA_VERSION),
+            'applied': applied,
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+        }
+        return self.migration_report
+
+    @staticmethod
+    def _add_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+        """إضافة عمود إذا لم يكن موجوداً (لقواعد البيانات القديمة)"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @staticmethod
+    def _order_ts(when: Any) -> int:
+        """ts الطلب؛ 0 إذا تعذّر تحليل التاريخ (حيث كان NULL يُرتَّب أصلاً) كي لا ينقطع ترقيم Keyset"""
+        return to_epoch(when) or 0
+
+    # Schema migrations (see MIGRATIONS)
+
+    def _migration_base_schema(self, cursor: sqlite3.Cursor) -> None:
+        """الهيكل الأساسي + أعمدة الإصدارات القديمة + القيم الافتراضية"""
+        # جدول الإعدادات
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                id INTEGER PRIMARY KEY,
+                mode TEXT NOT NULL DEFAULT 'CASH',
+                batch TEXT NOT NULL DEFAULT '1',
+                personal_wallet REAL NOT NULL DEFAULT 0.0,
+                company_wallet REAL NOT NULL DEFAULT 0.0
+            )
+        """)
+        
+        # جدول أسعار الباتشات
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS batch_prices (
+                batch_name TEXT PRIMARY KEY,
+                mart_price REAL NOT NULL,
+                restaurant_price REAL NOT NULL
+            )
+        """)
+        
+        # جدول الطلبات
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                datetime TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                order_type TEXT NOT NULL,
+                paid REAL NOT NULL,
+                expected REAL NOT NULL,
+                actual REAL NOT NULL,
+                tip_cash REAL NOT NULL DEFAULT 0.0,
+                tip_visa REAL NOT NULL DEFAULT 0.0,
+                delivery_fee REAL NOT NULL DEFAULT 0.0,
+                personal_wallet_effect REAL NOT NULL,
+                company_wallet_effect REAL NOT NULL
+            )
+        """)
+        
+        # جدول المصاريف (Expenses)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                datetime TEXT NOT NULL,
+                description TEXT NOT NULL,
+                amount REAL NOT NULL,
+                type TEXT NOT NULL DEFAULT 'OUT',
+                shift_id INTEGER
+            )
+        """)
+        
+        # جدول الورديات (Shifts) - UPDATED STRUCTURE
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS shifts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                shift_date DATE NOT NULL,
+                scheduled_start TEXT,
+                scheduled_end TEXT,
+                actual_start TEXT,
+                actual_end TEXT,
+                status TEXT DEFAULT 'SCHEDULED', -- SCHEDULED, ACTIVE, FINISHED, ABSENT
+                is_late BOOLEAN DEFAULT 0,
+                break_active BOOLEAN DEFAULT 0,
+                break_start TEXT,
+                break_end TEXT,
+                break_planned_duration INTEGER,
+                total_break_time INTEGER DEFAULT 0,
+                
+                -- Legacy/Stats fields
+                total_orders INTEGER DEFAULT 0,
+                total_income REAL DEFAULT 0.0,
+                total_expenses REAL DEFAULT 0.0,
+                net_profit REAL DEFAULT 0.0,
+                
+                -- Deprecated but kept if needed for migration
+                start_time TEXT,
+                end_time TEXT,
+                is_active INTEGER
+            )
+        """)
+        
+        # أعمدة أُضيفت بعد الإصدارات الأولى
+        self._add_column(cursor, "expenses", "type", "TEXT NOT NULL DEFAULT 'OUT'")
+        self._add_column(cursor, "expenses", "shift_id", "INTEGER")
+        self._add_column(cursor, "orders", "shift_id", "INTEGER")
+        self._add_column(cursor, "orders", "subtype", "TEXT")
+        self._add_column(cursor, "orders", "metadata", "TEXT")
+        self._add_column(cursor, "shifts", "shift_date", "DATE")
+        self._add_column(cursor, "shifts", "scheduled_start", "TEXT")
+        self._add_column(cursor, "shifts", "scheduled_end", "TEXT")
+        self._add_column(cursor, "shifts", "actual_start", "TEXT")
+        self._add_column(cursor, "shifts", "actual_end", "TEXT")
+        # Default to FINISHED for old shifts to avoid issues
+        self._add_column(cursor, "shifts", "status", "TEXT DEFAULT 'FINISHED'")
+        self._add_column(cursor, "shifts", "is_late", "BOOLEAN DEFAULT 0")
+        self._add_column(cursor, "shifts", "break_active", "BOOLEAN DEFAULT 0")
+        self._add_column(cursor, "shifts", "break_start", "TEXT")
+        self._add_column(cursor, "shifts", "break_end", "TEXT")
+        self._add_column(cursor, "shifts", "total_break_time", "INTEGER DEFAULT 0")
+        self._add_column(cursor, "shifts", "break_planned_duration", "INTEGER")
+        
+        # إدخال الإعدادات الافتراضية إذا لم تكن موجودة
+        cursor.execute("SELECT COUNT(*) FROM settings")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("""
+                INSERT INTO settings (mode, batch, personal_wallet, company_wallet)
+                VALUES ('CASH', '1', 0.0, 0.0)
+            """)
+        
+        # إدخال أسعار الباتشات الافتراضية
+        default_prices = [
+            ('1', 20.0, 22.0),
+            ('2', 18.0, 20.0),
+            ('3', 16.0, 18.0),
+            ('4', 14.0, 16.0),
+            ('New', 12.0, 14.0)
+        ]
+        
+        cursor.execute("SELECT COUNT(*) FROM batch_prices")
+        if cursor.fetchone()[0] == 0:
+            cursor.executemany("""
+                INSERT OR REPLACE INTO batch_prices (batch_name, mart_price, restaurant_price)
+                VALUES (?, ?, ?)
+            """, default_prices)
+
+    def _migration_daily_stats(self, cursor: sqlite3.Cursor) -> None:
+        """جدول التجميع اليومي (Rollup) - يُحدَّث مع كل طلب/مصروف في نفس المعاملة"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                date TEXT PRIMARY KEY,
+                orders_count INTEGER NOT NULL DEFAULT 0,
+                delivery_income REAL NOT NULL DEFAULT 0.0,
+                tip_cash REAL NOT NULL DEFAULT 0.0,
+                tip_visa REAL NOT NULL DEFAULT 0.0,
+                expenses REAL NOT NULL DEFAULT 0.0
+            ) WITHOUT ROWID
+        """)
+        self._rebuild_daily_stats(cursor)
+
+    def _migration_epoch_ts(self, cursor: sqlite3.Cursor) -> None:
+        """أعمدة ts رقمية مفهرسة بدلاً من مقارنة النصوص (T مقابل المسافة)"""
+        # shifts.ts is shift_date at local midnight
+        for table, source in (("orders", "datetime"), ("expenses", "datetime"), ("shifts", "shift_date")):
+            self._add_column(cursor, table, "ts", "INTEGER")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(ts)")
+            # stored strings are local time; 'utc' converts them before '%s'
+            cursor.execute(f"""
+                UPDATE {table} SET ts = CAST(strftime('%s', {source}, 'utc') AS INTEGER)
+                WHERE ts IS NULL
+            """)
+        cursor.execute("DROP INDEX IF EXISTS idx_orders_datetime")
+
+    def _migration_secondary_indexes(self, cursor: sqlite3.Cursor) -> None:
+        """فهارس مسارات الوصول الساخنة"""
+        for statement in SECONDARY_INDEXES:
+            cursor.execute(statement)
+
+    def _migration_shift_span(self, cursor: sqlite3.Cursor) -> None:
+        """أعمدة start_ts/end_ts محسوبة مرة واحدة (مع عبور منتصف الليل) بدلاً من تحليل النصوص"""
+        self._add_column(cursor, "shifts", "start_ts", "INTEGER")
+        self._add_column(cursor, "shifts", "end_ts", "INTEGER")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_shifts_span ON shifts(start_ts, end_ts)")
+        # stored times come in several formats, so parse them once here in Python
+        cursor.execute("SELECT id, shift_date, scheduled_start, scheduled_end FROM shifts WHERE start_ts IS NULL")
+        cursor.executemany(
+            "UPDATE shifts SET start_ts = ?, end_ts = ? WHERE id = ?",
+            [(*shift_span(r['shift_date'], r['scheduled_start'], r['scheduled_end']), r['id']) for r in cursor.fetchall()]
+        )
+
+    def _migration_order_hash(self, cursor: sqlite3.Cursor) -> None:
+        """بصمة محتوى لكل طلب وفهرس فريد عليها: الاستيراد يتخطى ما هو موجود"""
+        self._add_column(cursor, "orders", "content_hash", "TEXT")
+        # Existing orders get fingerprints too, so re-importing a backup of this phone is a no-op
+        cursor.execute(f"""
+            SELECT id, datetime, mode, order_type, {', '.join(AMOUNT_FIELDS)}
+            FROM orders WHERE content_hash IS NULL AND mode IN ({', '.join('?' * len(IMPORT_MODES))})
+            ORDER BY id
+        """, IMPORT_MODES)
+        seen = set()
+        updates = []
+        for row in cursor.fetchall():
+            try:
+                content_hash = order_content_hash(dict(row))
+            except ValueError:
+                continue  # unparseable datetime: leave it without a fingerprint
+            if content_hash not in seen:  # identical twins: only the first one is marked
+                seen.add(content_hash)
+                updates.append((content_hash, row['id']))
+        cursor.executemany("UPDATE orders SET content_hash = ? WHERE id = ?", updates)
+        cursor.execute(ORDER_HASH_INDEX)
+
+    def _migration_balance_checkpoints(self, cursor: sqlite3.Cursor) -> None:
+        """الرصيد التراكمي في نهاية كل يوم فيه حركة: balance_at = نقطة واحدة + مجموع يوم واحد"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS balance_checkpoints (
+                day TEXT PRIMARY KEY,
+                company_wallet REAL NOT NULL DEFAULT 0.0
+            ) WITHOUT ROWID
+        """)
+        self._rebuild_balance_checkpoints(cursor)
+
+    def _migration_order_ts_not_null(self, cursor: sqlite3.Cursor) -> None:
+        """ts لكل طلب: مؤشر الترقيم (ts, id) لا يحتمل NULL"""
+        # SQLite's strftime (migration 3) rejects some strings fromisoformat reads; retry in Python
+        cursor.execute("SELECT id, datetime FROM orders WHERE ts IS NULL")
+        cursor.executemany(
+            "UPDATE orders SET ts = ? WHERE id = ?",
+            [(self._order_ts(row['datetime']), row['id']) for row in cursor.fetchall()]
+        )
 
     def add_expense(self, description: str, amount: float, txn_type: str = 'OUT') -> bool:
         """إضافة مصروف أو إيداع جديد"""
+        return self.insert_expense(description, amount, txn_type) is not None
+
+    def insert_expense(self, description: str, amount: float, txn_type: str = 'OUT') -> Optional[Dict[str, Any]]:
+        """إضافة مصروف وإرجاع الصف المضاف (لتحديث النوافذ دون إعادة الاستعلام)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
                 # الحصول على الوردية النشطة إن وجدت
-                cursor.execute("SELECT id FROM shifts WHERE status = 'ACTIVE'")
+                cursor.execute(ACTIVE_SHIFT_ID)
                 active_shift = cursor.fetchone()
                 shift_id = active_shift[0] if active_shift else None
                 
                 cursor.execute(
-                    "INSERT INTO expenses (datetime, description, amount, type, shift_id) VALUES (?, ?, ?, ?, ?)",
-                    (now, description, amount, txn_type, shift_id)
+                    "INSERT INTO expenses (datetime, description, amount, type, shift_id, ts) VALUES (?, ?, ?, ?, ?, ?)",
+                    (now, description, amount, txn_type, shift_id, to_epoch(now))
                 )
+                expense_id = cursor.lastrowid
+                if txn_type == 'OUT':
+                    self._bump_daily_stats(cursor, now, expenses=amount)
                 
                 # ✅ Update active shift statistics live
                 if shift_id and txn_type == 'OUT':
@@ -97,28 +423,32 @@ class Database:
                             net_profit = total_income - (total_expenses + ?)
                         WHERE id = ?
                     """, (amount, amount, shift_id))
-                    
-                conn.commit()
-                return True
+                cursor.execute("SELECT * FROM expenses WHERE id = ?", (expense_id,))
+                row = dict(cursor.fetchone())
+            if self._suggestions is not None:
+                self._suggestions.add(description, row['ts'])
+            return row
         except Exception:
-            return False
+            return None
 
     def delete_expense(self, expense_id: int) -> bool:
         """حذف مصروف وإرجاع الإحصائيات"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 
                 # جلب بيانات المصروف قبل الحذف
-                cursor.execute("SELECT amount, type, shift_id FROM expenses WHERE id = ?", (expense_id,))
+                cursor.execute("SELECT amount, type, shift_id, datetime, description FROM expenses WHERE id = ?", (expense_id,))
                 row = cursor.fetchone()
                 if not row:
                     return False
                 
-                amount, txn_type, shift_id = row
+                amount, txn_type, shift_id, txn_datetime, description = row
                 
                 # حذف المصروف
                 cursor.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+                if txn_type == 'OUT':
+                    self._bump_daily_stats(cursor, txn_datetime, expenses=-amount)
                 
                 # ✅ Update active shift statistics live (reversing)
                 if shift_id and txn_type == 'OUT':
@@ -128,35 +458,60 @@ class Database:
                             net_profit = total_income - (total_expenses - ?)
                         WHERE id = ?
                     """, (amount, amount, shift_id))
-                
-                conn.commit()
-                return True
+            if self._suggestions is not None:
+                self._suggestions.remove(description)
+            return True
         except Exception:
             return False
 
     def update_expense(self, expense_id: int, description: str, amount: float, txn_type: str) -> bool:
         """تحديث بيانات المصروف"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
+                cursor.execute("SELECT amount, type, datetime, description, ts, shift_id FROM expenses WHERE id = ?", (expense_id,))
+                old = cursor.fetchone()
                 cursor.execute("""
                     UPDATE expenses 
                     SET description = ?, amount = ?, type = ?
                     WHERE id = ?
                 """, (description, amount, txn_type, expense_id))
-                conn.commit()
-                return True
+                if old:
+                    if old['type'] == 'OUT':
+                        self._bump_daily_stats(cursor, old['datetime'], expenses=-old['amount'])
+                    if txn_type == 'OUT':
+                        self._bump_daily_stats(cursor, old['datetime'], expenses=amount)
+                    # ✅ The owning shift takes the old -> new difference too (like update_order)
+                    delta = (amount if txn_type == 'OUT' else 0.0) - (old['amount'] if old['type'] == 'OUT' else 0.0)
+                    if old['shift_id'] and delta:
+                        cursor.execute("""
+                            UPDATE shifts 
+                            SET total_expenses = total_expenses + ?,
+                                net_profit = total_income - (total_expenses + ?)
+                            WHERE id = ?
+                        """, (delta, delta, old['shift_id']))
+            if old and self._suggestions is not None and old['description'] != description:
+                self._suggestions.remove(old['description'])
+                self._suggestions.add(description, old['ts'])
+            return True
         except Exception:
             return False
 
+    def get_expense_by_id(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        """الحصول على عملية محددة بواسطة المعرف"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM expenses WHERE id = ?", (expense_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
     def get_all_expenses(self, limit: int = 20) -> List[Dict[str, Any]]:
         """الحصول على جميع العمليات (مصاريف وإيداعات)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    "SELECT * FROM expenses ORDER BY datetime DESC LIMIT ?",
+                    "SELECT * FROM expenses ORDER BY ts DESC LIMIT ?",
                     (limit,)
                 )
                 rows = cursor.fetchall()
@@ -167,7 +522,7 @@ class Database:
     def get_wallet_stats(self) -> Dict[str, float]:
         """إحصائيات إجمالي المصاريف والإيداعات"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT 
@@ -186,204 +541,88 @@ class Database:
         except Exception:
             return {'total_in': 0.0, 'total_out': 0.0, 'net': 0.0}
 
-    def get_unique_descriptions(self, prefix: str = "") -> List[str]:
-        """الحصول على أوصاف فريدة سابقة للاقتراحات"""
+    def get_unique_descriptions(self, prefix: str = "", limit: int = 5) -> List[str]:
+        """الحصول على أوصاف فريدة سابقة للاقتراحات (من الفهرس في الذاكرة، الأكثر استخداماً وحداثة أولاً)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                query = "SELECT DISTINCT description FROM expenses"
-                params = ()
-                if prefix:
-                    query += " WHERE description LIKE ?"
-                    params = (f"{prefix}%",)
-                query += " ORDER BY description LIMIT 5"
-                cursor.execute(query, params)
-                return [row[0] for row in cursor.fetchall()]
+            return self._suggestion_index().suggest(prefix, limit)
         except Exception:
             return []
+
+    def _suggestion_index(self) -> SuggestionIndex:
+        """بناء فهرس الاقتراحات مرة واحدة عند أول طلب؛ بعدها تحدّثه عمليات المصاريف مباشرة"""
+        if self._suggestions is None:
+            with self._pool.read() as conn:
+                rows = conn.execute(
+                    "SELECT description, COUNT(*), MAX(ts) FROM expenses GROUP BY description"
+                ).fetchall()
+            self._suggestions = SuggestionIndex(tuple(r) for r in rows)
+        return self._suggestions
         
-    def init_database(self) -> None:
-        """تهيئة جداول قاعدة البيانات"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # جدول الإعدادات
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    id INTEGER PRIMARY KEY,
-                    mode TEXT NOT NULL DEFAULT 'CASH',
-                    batch TEXT NOT NULL DEFAULT '1',
-                    personal_wallet REAL NOT NULL DEFAULT 0.0,
-                    company_wallet REAL NOT NULL DEFAULT 0.0
-                )
-            """)
-            
-            # جدول أسعار الباتشات
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS batch_prices (
-                    batch_name TEXT PRIMARY KEY,
-                    mart_price REAL NOT NULL,
-                    restaurant_price REAL NOT NULL
-                )
-            """)
-            
-            # جدول الطلبات
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    datetime TEXT NOT NULL,
-                    mode TEXT NOT NULL,
-                    order_type TEXT NOT NULL,
-                    paid REAL NOT NULL,
-                    expected REAL NOT NULL,
-                    actual REAL NOT NULL,
-                    tip_cash REAL NOT NULL DEFAULT 0.0,
-                    tip_visa REAL NOT NULL DEFAULT 0.0,
-                    delivery_fee REAL NOT NULL DEFAULT 0.0,
-                    personal_wallet_effect REAL NOT NULL,
-                    company_wallet_effect REAL NOT NULL
-                )
-            """)
-            
-            # إنشاء الفهارس
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_datetime ON orders(datetime)")
-            
-            # جدول المصاريف (Expenses)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS expenses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    datetime TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    type TEXT NOT NULL DEFAULT 'OUT',
-                    shift_id INTEGER
-                )
-            """)
-            
-            # جدول الورديات (Shifts) - UPDATED STRUCTURE
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS shifts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    shift_date DATE NOT NULL,
-                    scheduled_start TEXT,
-                    scheduled_end TEXT,
-                    actual_start TEXT,
-                    actual_end TEXT,
-                    status TEXT DEFAULT 'SCHEDULED', -- SCHEDULED, ACTIVE, FINISHED, ABSENT
-                    is_late BOOLEAN DEFAULT 0,
-                    break_active BOOLEAN DEFAULT 0,
-                    break_start TEXT,
-                    break_end TEXT,
-                    break_planned_duration INTEGER,
-                    total_break_time INTEGER DEFAULT 0,
-                    
-                    -- Legacy/Stats fields
-                    total_orders INTEGER DEFAULT 0,
-                    total_income REAL DEFAULT 0.0,
-                    total_expenses REAL DEFAULT 0.0,
-                    net_profit REAL DEFAULT 0.0,
-                    
-                    -- Deprecated but kept if needed for migration
-                    start_time TEXT,
-                    end_time TEXT,
-                    is_active INTEGER
-                )
-            """)
-            
-            # إدخال الإعدادات الافتراضية إذا لم تكن موجودة
-            cursor.execute("SELECT COUNT(*) FROM settings")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute("""
-                    INSERT INTO settings (mode, batch, personal_wallet, company_wallet)
-                    VALUES ('CASH', '1', 0.0, 0.0)
-                """)
-            
-            # إدخال أسعار الباتشات الافتراضية
-            default_prices = [
-                ('1', 20.0, 22.0),
-                ('2', 18.0, 20.0),
-                ('3', 16.0, 18.0),
-                ('4', 14.0, 16.0),
-                ('New', 12.0, 14.0)
-            ]
-            
-            cursor.execute("SELECT COUNT(*) FROM batch_prices")
-            if cursor.fetchone()[0] == 0:
-                cursor.executemany("""
-                    INSERT OR REPLACE INTO batch_prices (batch_name, mart_price, restaurant_price)
-                    VALUES (?, ?, ?)
-                """, default_prices)
-            
-            conn.commit()
-    
     def get_settings(self) -> Dict[str, Any]:
-        """الحصول على الإعدادات الحالية"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM settings WHERE id = 1")
-            row = cursor.fetchone()
-            return dict(row) if row else {}
+        """الحصول على الإعدادات الحالية (من SettingsStore، بلا استعلام)"""
+        return self.settings_store.settings()
     
+    def get_balances(self) -> Dict[str, float]:
+        """رصيد المحفظتين فقط (حمولة أحداث التغيير)"""
+        return self.settings_store.balances()
+
     def update_settings(self, settings: Dict[str, Any]) -> None:
-        """تحديث الإعدادات"""
-        with sqlite3.connect(self.db_path) as conn:
+        """تحديث الإعدادات (الحقول المرسلة فقط)"""
+        # Omitting the wallet keys keeps a stale snapshot from overwriting live balances
+        columns = [key for key in ('mode', 'batch', 'personal_wallet', 'company_wallet') if key in settings]
+        if not columns:
+            return
+        with self._pool.write() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE settings 
-                SET mode = ?, batch = ?, personal_wallet = ?, company_wallet = ?
-                WHERE id = 1
-            """, (
-                settings['mode'],
-                settings['batch'],
-                settings['personal_wallet'],
-                settings['company_wallet']
-            ))
-            conn.commit()
+            cursor.execute(
+                f"UPDATE settings SET {', '.join(f'{key} = ?' for key in columns)} WHERE id = 1",
+                tuple(settings[key] for key in columns)
+            )
+            self.settings_store.apply({key: settings[key] for key in columns})
     
     def get_batch_prices(self) -> Dict[str, Dict[str, float]]:
-        """الحصول على أسعار الباتشات"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM batch_prices ORDER BY batch_name")
-            rows = cursor.fetchall()
-            
-            prices = {}
-            for row in rows:
-                prices[row['batch_name']] = {
-                    'mart': row['mart_price'],
-                    'restaurant': row['restaurant_price']
-                }
-            return prices
+        """الحصول على أسعار الباتشات (من SettingsStore، بلا استعلام)"""
+        return self.settings_store.batch_prices()
     
     def update_batch_price(self, batch_name: str, mart_price: float, restaurant_price: float) -> None:
         """تحديث سعر الباتش"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.write() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT OR REPLACE INTO batch_prices (batch_name, mart_price, restaurant_price)
                 VALUES (?, ?, ?)
             """, (batch_name, mart_price, restaurant_price))
-            conn.commit()
+            self.settings_store.set_batch_price(batch_name, mart_price, restaurant_price)
     
     def add_order(self, order_data: Dict[str, Any]) -> int:
         """إضافة طلب جديد"""
-        with sqlite3.connect(self.db_path) as conn:
+        return self.insert_order(order_data)[0]['id']
+
+    def insert_order(self, order_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """إضافة طلب وإرجاع الصفوف المضافة (الطلب ثم صف البقشيش إن وجد)"""
+        with self._pool.write() as conn:
             cursor = conn.cursor()
             
             # الحصول على الوردية النشطة إن وجدت
-            cursor.execute("SELECT id FROM shifts WHERE status = 'ACTIVE'")
+            cursor.execute(ACTIVE_SHIFT_ID)
             active_shift = cursor.fetchone()
             shift_id = active_shift[0] if active_shift else None
             
+            # Fingerprinted like imported rows, so importing a backup that holds this order skips it
+            content_hash = None
+            if order_data['mode'] in IMPORT_MODES:
+                try:
+                    content_hash = order_content_hash(order_data)
+                except ValueError:
+                    pass
             cursor.execute("""
                 INSERT INTO orders (
                     datetime, mode, order_type, paid, expected, actual,
                     tip_cash, tip_visa, delivery_fee,
                     personal_wallet_effect, company_wallet_effect, shift_id,
-                    subtype, metadata
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    subtype, metadata, ts, content_hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                          CASE WHEN EXISTS (SELECT 1 FROM orders WHERE content_hash = ?16) THEN NULL ELSE ?16 END)
             """, (
                 order_data['datetime'],
                 order_data['mode'],
@@ -398,23 +637,33 @@ class Database:
                 order_data['company_wallet_effect'],
                 shift_id,
                 order_data.get('subtype'),
-                order_data.get('metadata')
+                order_data.get('metadata'),
+                self._order_ts(order_data['datetime']),
+                content_hash
             ))
             
             order_id = cursor.lastrowid
+            inserted_ids = [order_id]
             
             # ✅ NEW FEATURE: Create separate tip entry if tips exist
             tip_cash = order_data.get('tip_cash', 0.0)
             tip_visa = order_data.get('tip_visa', 0.0)
             
+            if order_data['mode'] != 'SETTLEMENT':
+                self._bump_daily_stats(
+                    cursor, order_data['datetime'], orders_count=1,
+                    delivery_income=order_data.get('delivery_fee', 0.0),
+                    tip_cash=tip_cash, tip_visa=tip_visa
+                )
+            
             if tip_cash > 0 or tip_visa > 0:
                 # Create a TIP entry in orders table
                 cursor.execute("""
                     INSERT INTO orders (
                         datetime, mode, order_type, paid, expected, actual,
                         tip_cash, tip_visa, delivery_fee,
-                        personal_wallet_effect, company_wallet_effect, shift_id
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        personal_wallet_effect, company_wallet_effect, shift_id, ts
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     order_data['datetime'],
                     'TIP',  # Special mode for tip entries
@@ -427,23 +676,24 @@ class Database:
                     0.0,  # No delivery fee for tip entries
                     0.0,  # Tips don't affect personal wallet (already counted in order)
                     0.0,  # Tips don't affect company wallet (already counted in order)
-                    shift_id
+                    shift_id,
+                    self._order_ts(order_data['datetime'])
                 ))
+                inserted_ids.append(cursor.lastrowid)
+                self._bump_daily_stats(
+                    cursor, order_data['datetime'], orders_count=1,
+                    tip_cash=tip_cash, tip_visa=tip_visa
+                )
             
             # ✅ NEW LOGIC: Orders only affect company_wallet, NOT personal_wallet
-            settings = self.get_settings()
-            
-            # Personal wallet stays unchanged - orders don't affect it
-            new_personal = settings['personal_wallet']
-            
-            # Only company wallet changes from orders
-            new_company = settings['company_wallet'] + order_data['company_wallet_effect']
-            
+            # Applied as an in-SQL delta so concurrent writers never lose an update
             cursor.execute("""
                 UPDATE settings 
-                SET personal_wallet = ?, company_wallet = ?
+                SET company_wallet = company_wallet + ?
                 WHERE id = 1
-            """, (new_personal, new_company))
+            """, (order_data['company_wallet_effect'],))
+            self.settings_store.add_to_wallets(company=order_data['company_wallet_effect'])
+            self._bump_balance_checkpoints(cursor, {order_data['datetime']: order_data['company_wallet_effect']})
             
             # ✅ NEW FEATURE: Update active shift statistics live
             if shift_id:
@@ -455,19 +705,22 @@ class Database:
                         net_profit = (total_income + ?) - total_expenses
                     WHERE id = ?
                 """, (order_income, order_income, shift_id))
-
-            conn.commit()
-            return order_id
+            
+            cursor.execute(
+                f"SELECT * FROM orders WHERE id IN ({', '.join('?' * len(inserted_ids))}) ORDER BY id",
+                inserted_ids
+            )
+            return [dict(row) for row in cursor.fetchall()]
     
     def delete_order(self, order_id: int) -> bool:
         """حذف طلب وإعادة حساب المحافظ"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.write() as conn:
             cursor = conn.cursor()
             
             # الحصول على تأثير الطلب والتفاصيل اللازمة للإحصائيات
             cursor.execute("""
                 SELECT personal_wallet_effect, company_wallet_effect, shift_id,
-                       delivery_fee, tip_cash, tip_visa, mode
+                       delivery_fee, tip_cash, tip_visa, mode, datetime
                 FROM orders WHERE id = ?
             """, (order_id,))
             
@@ -475,7 +728,14 @@ class Database:
             if not row:
                 return False
             
-            personal_effect, company_effect, shift_id, delivery_fee, t_cash, t_visa, order_mode = row
+            personal_effect, company_effect, shift_id, delivery_fee, t_cash, t_visa, order_mode, order_datetime = row
+            
+            if order_mode != 'SETTLEMENT':
+                self._bump_daily_stats(
+                    cursor, order_datetime, orders_count=-1,
+                    delivery_income=-(delivery_fee or 0.0),
+                    tip_cash=-(t_cash or 0.0), tip_visa=-(t_visa or 0.0)
+                )
             
             # ✅ Update active shift statistics live (reversing)
             if shift_id and order_mode != 'TIP':
@@ -491,70 +751,247 @@ class Database:
             # حذف الطلب
             cursor.execute("DELETE FROM orders WHERE id = ?", (order_id,))
             
-            # ✅ NEW LOGIC: Only reverse company_wallet effect
-            settings = self.get_settings()
-            
-            # Personal wallet stays unchanged - orders don't affect it
-            new_personal = settings['personal_wallet']
-            
-            # Only reverse company wallet effect
-            new_company = settings['company_wallet'] - company_effect
-            
+            # ✅ NEW LOGIC: Only reverse company_wallet effect (personal stays unchanged)
             cursor.execute("""
                 UPDATE settings 
-                SET personal_wallet = ?, company_wallet = ?
+                SET company_wallet = company_wallet - ?
                 WHERE id = 1
-            """, (new_personal, new_company))
-            
-            conn.commit()
+            """, (company_effect,))
+            self.settings_store.add_to_wallets(company=-company_effect)
+            self._bump_balance_checkpoints(cursor, {order_datetime: -company_effect})
             return True
-    
-    def get_all_orders(self, limit: int = 100, order_type: Optional[str] = None, period: Optional[str] = None) -> List[Dict[str, Any]]:
-        """الحصول على جميع الطلبات مع دعم الفلترة"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+
+    def delete_orders(self, order_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """حذف مجموعة طلبات في معاملة واحدة؛ ترجع الصفوف المحذوفة"""
+        ids = self._id_list(order_ids)
+        with self._pool.write() as conn:
             cursor = conn.cursor()
-            
-            query = "SELECT * FROM orders WHERE 1=1"
-            params = []
-            
-            if order_type and order_type != "All":
+            cursor.execute(ORDERS_BY_IDS, (ids,))
+            rows = [dict(row) for row in cursor.fetchall()]
+            if not rows:
+                return []
+            shifts, days, balances = {}, {}, {}
+            self._collect_order_deltas(cursor, f"id IN ({JSON_VALUES})", (ids,), -1, shifts, days, balances)
+            cursor.execute(f"DELETE FROM orders WHERE id IN ({JSON_VALUES})", (ids,))
+            self._apply_order_deltas(cursor, shifts, days, balances)
+            return rows
+
+    def update_orders(self, order_ids: Iterable[int], patch: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """تطبيق نفس القيم على مجموعة طلبات في معاملة واحدة؛ ترجع أزواج (قبل، بعد)"""
+        # Like update_settings, only known columns are written
+        columns = [key for key in ORDER_PATCH_COLUMNS if key in patch]
+        values = [patch[key] for key in columns]
+        if 'datetime' in patch:
+            columns.append('ts')
+            values.append(self._order_ts(patch['datetime']))
+        ids = self._id_list(order_ids)
+        if not columns:
+            return []
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(ORDERS_BY_IDS, (ids,))
+            before = [dict(row) for row in cursor.fetchall()]
+            if not before:
+                return []
+            # Old effects out, new effects in: both sides summed per shift / day, applied once
+            shifts, days, balances = {}, {}, {}
+            self._collect_order_deltas(cursor, f"id IN ({JSON_VALUES})", (ids,), -1, shifts, days, balances)
+            cursor.execute(
+                f"UPDATE orders SET {', '.join(f'{key} = ?' for key in columns)} WHERE id IN ({JSON_VALUES})",
+                (*values, ids)
+            )
+            self._collect_order_deltas(cursor, f"id IN ({JSON_VALUES})", (ids,), 1, shifts, days, balances)
+            self._apply_order_deltas(cursor, shifts, days, balances)
+            cursor.execute(ORDERS_BY_IDS, (ids,))
+            after = [dict(row) for row in cursor.fetchall()]
+            return list(zip(before, after))
+
+    def import_order_chunk(self, orders: List[Dict[str, Any]]) -> Dict[str, int]:
+        """إدخال دفعة طلبات مُجهّزة (importer.prepare_order) في معاملة واحدة، مع تخطي البصمات الموجودة"""
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                IMPORT_DEDUP,
+                (json.dumps([order['content_hash'] for order in orders]),)
+            )
+            seen = {row[0] for row in cursor.fetchall()}
+            rows = []
+            for order in orders:
+                if order['content_hash'] in seen:
+                    continue
+                seen.add(order['content_hash'])  # twins inside the file count once too
+                ts = self._order_ts(order['datetime'])
+                rows.append((
+                    order['datetime'], order['mode'], order['order_type'], order['paid'], order['expected'],
+                    order['actual'], order['tip_cash'], order['tip_visa'], order['delivery_fee'],
+                    order['personal_wallet_effect'], order['company_wallet_effect'],
+                    order.get('subtype'), order.get('metadata'), order['content_hash'], ts
+                ))
+                tips = order['tip_cash'] + order['tip_visa']
+                if order['tip_cash'] > 0 or order['tip_visa'] > 0:
+                    # Same separate TIP row insert_order writes, right after its order
+                    rows.append((
+                        order['datetime'], 'TIP', 'Tip', 0.0, 0.0, tips, order['tip_cash'], order['tip_visa'],
+                        0.0, 0.0, 0.0, None, None, None, ts
+                    ))
+            imported = sum(1 for row in rows if row[1] != 'TIP')
+            if rows:
+                last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+                # Imported history belongs to no local shift
+                cursor.executemany("""
+                    INSERT INTO orders (
+                        datetime, mode, order_type, paid, expected, actual,
+                        tip_cash, tip_visa, delivery_fee,
+                        personal_wallet_effect, company_wallet_effect,
+                        subtype, metadata, content_hash, ts
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                shifts, days, balances = {}, {}, {}
+                self._collect_order_deltas(cursor, "id > ?", (last_id,), 1, shifts, days, balances)
+                self._apply_order_deltas(cursor, shifts, days, balances)
+            return {'imported': imported, 'duplicates': len(orders) - imported}
+
+    @staticmethod
+    def _id_list(order_ids: Iterable[int]) -> str:
+        # One JSON parameter instead of N placeholders: no SQLITE_MAX_VARIABLE_NUMBER limit
+        return json.dumps(sorted({int(order_id) for order_id in order_ids}))
+
+    def _collect_order_deltas(self, cursor: sqlite3.Cursor, where: str, params: Tuple, sign: int,
+                              shifts: Dict[int, List[float]], days: Dict[str, List[float]],
+                              balances: Dict[str, float]) -> None:
+        """جمع تأثير الطلبات (GROUP BY وردية ويوم) في قواميس الفروقات مضروباً في sign"""
+        # Same rules as delete_order: TIP rows don't count toward the shift, SETTLEMENT not toward the day
+        cursor.execute(f"""
+            SELECT shift_id, COUNT(*),
+                   SUM(COALESCE(delivery_fee, 0.0) + COALESCE(tip_cash, 0.0) + COALESCE(tip_visa, 0.0))
+            FROM orders
+            WHERE {where} AND shift_id IS NOT NULL AND mode != 'TIP'
+            GROUP BY shift_id
+        """, params)
+        for shift_id, count, income in cursor.fetchall():
+            entry = shifts.setdefault(shift_id, [0, 0.0])
+            entry[0] += sign * count
+            entry[1] += sign * income
+        cursor.execute(f"""
+            SELECT substr(datetime, 1, 10), COUNT(*), SUM(COALESCE(delivery_fee, 0.0)),
+                   SUM(COALESCE(tip_cash, 0.0)), SUM(COALESCE(tip_visa, 0.0))
+            FROM orders
+            WHERE {where} AND mode != 'SETTLEMENT'
+            GROUP BY 1
+        """, params)
+        for day, count, delivery, tip_cash, tip_visa in cursor.fetchall():
+            entry = days.setdefault(day, [0, 0.0, 0.0, 0.0])
+            for i, value in enumerate((count, delivery, tip_cash, tip_visa)):
+                entry[i] += sign * value
+        # Company wallet effect per day (settlements included) feeds the balance checkpoints
+        cursor.execute(f"""
+            SELECT substr(datetime, 1, 10), TOTAL(company_wallet_effect)
+            FROM orders
+            WHERE {where}
+            GROUP BY 1
+        """, params)
+        for day, company in cursor.fetchall():
+            balances[day] = balances.get(day, 0.0) + sign * company
+
+    def _apply_order_deltas(self, cursor: sqlite3.Cursor, shifts: Dict[int, List[float]],
+                            days: Dict[str, List[float]], balances: Dict[str, float]) -> None:
+        """تطبيق الفروقات المجمّعة: تحديث واحد لكل وردية ولكل يوم ولمحفظة الشركة"""
+        cursor.executemany("""
+            UPDATE shifts
+            SET total_orders = total_orders + ?,
+                total_income = total_income + ?,
+                net_profit = (total_income + ?) - total_expenses
+            WHERE id = ?
+        """, [(count, income, income, shift_id) for shift_id, (count, income) in shifts.items() if count or income])
+        for day, (count, delivery, tip_cash, tip_visa) in days.items():
+            if count or delivery or tip_cash or tip_visa:
+                self._bump_daily_stats(cursor, day, orders_count=count, delivery_income=delivery,
+                                       tip_cash=tip_cash, tip_visa=tip_visa)
+        self._bump_balance_checkpoints(cursor, balances)
+        company = sum(balances.values())
+        if company:
+            cursor.execute("UPDATE settings SET company_wallet = company_wallet + ? WHERE id = 1", (company,))
+            self.settings_store.add_to_wallets(company=company)
+    
+    def _order_filters(self, order_type: Optional[str], period: Optional[str]) -> Tuple[str, List[Any]]:
+        """شروط WHERE المشتركة لفلترة الطلبات حسب النوع والفترة"""
+        query = ""
+        params = []
+        
+        if order_type and order_type != "All":
+            if order_type in HISTORY_MODE_FILTERS:
+                query += f" AND {HISTORY_MODE_FILTERS[order_type]}"
+            else:
                 query += " AND order_type = ?"
                 params.append(order_type)
-                
-            if period and period != "All":
-                now = datetime.now()
-                if period == "Today":
-                    start_date = now.strftime("%Y-%m-%d 00:00:00")
-                    query += " AND datetime >= ?"
-                    params.append(start_date)
-                elif period == "Yesterday":
-                    from datetime import timedelta
-                    yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
-                    query += " AND datetime >= ? AND datetime <= ?"
-                    params.append(f"{yesterday} 00:00:00")
-                    params.append(f"{yesterday} 23:59:59")
-                elif period == "Week":
-                    from datetime import timedelta
-                    week_start = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d 00:00:00")
-                    query += " AND datetime >= ?"
-                    params.append(week_start)
-                elif period == "Month":
-                    month_start = now.strftime("%Y-%m-01 00:00:00")
-                    query += " AND datetime >= ?"
-                    params.append(month_start)
-            
-            query += " ORDER BY datetime DESC LIMIT ?"
-            params.append(limit)
             
-            cursor.execute(query, tuple(params))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+        # نطاقات على عمود ts المفهرس (بداية اليوم المحلي)
+        start, end = self._period_range(period)
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(end)
+        return query, params
+
+    @staticmethod
+    def _period_range(period: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+        """حدود الفترة كـ epoch: (البداية، النهاية) - None تعني بلا حد"""
+        today = datetime.now().date()
+        if period == "Today":
+            return to_epoch(today), None
+        if period == "Yesterday":
+            return to_epoch(today - timedelta(days=1)), to_epoch(today)
+        if period == "Week":
+            return to_epoch(today - timedelta(days=today.weekday())), None
+        if period == "Month":
+            return to_epoch(today.replace(day=1)), None
+        return None, None
+
+    def order_matches(self, order: Dict[str, Any], order_type: Optional[str] = None,
+                      period: Optional[str] = None) -> bool:
+        """هل يظهر الصف تحت نفس فلاتر _order_filters؟ (بدون استعلام)"""
+        if order_type and order_type != "All":
+            if order_type in HISTORY_MODE_MATCHERS:
+                if not HISTORY_MODE_MATCHERS[order_type](order.get('mode')):
+                    return False
+            elif order.get('order_type') != order_type:
+                return False
+        start, end = self._period_range(period)
+        ts = order.get('ts') or 0
+        return (start is None or ts >= start) and (end is None or ts < end)
+
+    def get_all_orders(self, limit: int = 100, order_type: Optional[str] = None, period: Optional[str] = None) -> List[Dict[str, Any]]:
+        """الحصول على جميع الطلبات مع دعم الفلترة"""
+        return self.get_orders_page(page_size=limit, order_type=order_type, period=period)
+
+    def get_orders_page(self, after: Optional[Tuple[int, int]] = None, page_size: int = 100,
+                        order_type: Optional[str] = None, period: Optional[str] = None) -> List[Dict[str, Any]]:
+        """صفحة من الطلبات (الأحدث أولاً) بعد المؤشر (ts, id) - ترقيم Keyset على فهرس ts"""
+        filters, params = self._order_filters(order_type, period)
+        if after is not None:
+            params.extend(after)
+        params.append(page_size)
+        
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(orders_page_sql(filters, after is not None), tuple(params))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def iter_orders(self, after: Optional[Tuple[int, int]] = None, page_size: int = 500,
+                    order_type: Optional[str] = None, period: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """المرور على الطلبات صفحة بصفحة دون تحميلها كلها في الذاكرة"""
+        while True:
+            page = self.get_orders_page(after, page_size, order_type, period)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = (page[-1]['ts'], page[-1]['id'])
             
     def get_order_by_id(self, order_id: int) -> Optional[Dict[str, Any]]:
         """الحصول على طلب محدد بواسطة المعرف"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
             row = cursor.fetchone()
@@ -562,77 +999,78 @@ class Database:
     
     def get_orders_by_date_range(self, start_date: str, end_date: str) -> List[Dict[str, Any]]:
         """الحصول على الطلبات حسب النطاق الزمني"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT * FROM orders 
-                WHERE datetime BETWEEN ? AND ?
-                ORDER BY datetime
-            """, (start_date, end_date))
+                WHERE ts BETWEEN ? AND ?
+                ORDER BY ts
+            """, (to_epoch(start_date), to_epoch(end_date)))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
     def get_daily_profit(self, days: int = 14) -> List[Dict[str, Any]]:
         """الحصول على الأرباح اليومية"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        since = (datetime.now().date() - timedelta(days=days)).isoformat()
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT 
-                    DATE(datetime) as date,
-                    SUM(delivery_fee + tip_cash + tip_visa) as profit,
-                    COUNT(*) as orders_count
-                FROM orders
-                WHERE datetime >= DATE('now', ? || ' days')
-                  AND mode != 'SETTLEMENT'
-                GROUP BY DATE(datetime)
+                    date,
+                    delivery_income + tip_cash + tip_visa as profit,
+                    orders_count
+                FROM daily_stats
+                WHERE date >= ? AND orders_count > 0
                 ORDER BY date
-            """, (f"-{days}",))
+            """, (since,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @staticmethod
+    def _period_start(period: str) -> str:
+        """بداية الفترة (DAILY/WEEKLY/MONTHLY/YEARLY) كتاريخ YYYY-MM-DD"""
+        today = datetime.now().date()
+        if period == "DAILY":
+            start = today
+        elif period == "WEEKLY":
+            # Same as SQLite DATE('now', 'weekday 0', '-7 days'): the last Sunday before today
+            start = today + timedelta(days=(6 - today.weekday()) % 7 - 7)
+        elif period == "MONTHLY":
+            start = today.replace(day=1)
+        else:  # YEARLY
+            start = today.replace(month=1, day=1)
+        return start.isoformat()
+    
     def get_analysis_stats(self, period: str = "DAILY") -> Dict[str, Any]:
         """الحصول على إحصائيات التحليل المتقدمة لفترة محددة"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 
-                # تعريف فواصل الزمن بناءً على الفترة
-                if period == "DAILY":
-                    range_sql = "DATE(datetime) = DATE('now')"
-                elif period == "WEEKLY":
-                    range_sql = "datetime >= DATE('now', 'weekday 0', '-7 days')"
-                elif period == "MONTHLY":
-                    range_sql = "datetime >= DATE('now', 'start of month')"
-                else:  # YEARLY
-                    range_sql = "datetime >= DATE('now', 'start of year')"
+                # تعريف فواصل الزمن بناءً على الفترة (قراءة من جدول التجميع اليومي)
+                start_date = self._period_start(period)
+                range_sql = "date = ?" if period == "DAILY" else "date >= ?"
                 
-                # حساب الدخل من الطلبات
                 cursor.execute(f"""
                     SELECT 
-                        SUM(delivery_fee) as delivery_income,
+                        SUM(delivery_income) as delivery_income,
                         SUM(tip_cash) as tip_cash,
                         SUM(tip_visa) as tip_visa,
-                        COUNT(*) as orders_count
-                    FROM orders 
-                    WHERE {range_sql} AND mode != 'SETTLEMENT'
-                """)
-                order_row = cursor.fetchone()
-                
-                # حساب المصاريف من جدول المحفظة
-                cursor.execute(f"SELECT SUM(amount) FROM expenses WHERE {range_sql} AND type = 'OUT'")
-                expense_row = cursor.fetchone()
+                        SUM(orders_count) as orders_count,
+                        SUM(expenses) as total_expenses
+                    FROM daily_stats 
+                    WHERE {range_sql}
+                """, (start_date,))
+                row = cursor.fetchone()
                 
                 # تجميع البيانات
-                delivery_income = order_row['delivery_income'] or 0.0
-                tip_cash = order_row['tip_cash'] or 0.0
-                tip_visa = order_row['tip_visa'] or 0.0
+                delivery_income = row['delivery_income'] or 0.0
+                tip_cash = row['tip_cash'] or 0.0
+                tip_visa = row['tip_visa'] or 0.0
                 total_tips = tip_cash + tip_visa
                 total_income = delivery_income + total_tips
-                total_expenses = expense_row[0] or 0.0
-                orders_count = order_row['orders_count'] or 0
+                total_expenses = row['total_expenses'] or 0.0
+                orders_count = row['orders_count'] or 0
                 
                 # إحصائيات إضافية للشهري والسنوي
                 best_month = ""
@@ -648,12 +1086,12 @@ class Database:
                     # الحصول على أفضل شهر
                     import calendar
                     cursor.execute("""
-                        SELECT strftime('%m', datetime) as month_num, 
-                               SUM(delivery_fee + tip_cash + tip_visa) as monthly_profit
-                        FROM orders 
-                        WHERE datetime >= DATE('now', 'start of year') AND mode != 'SETTLEMENT'
+                        SELECT substr(date, 6, 2) as month_num, 
+                               SUM(delivery_income + tip_cash + tip_visa) as monthly_profit
+                        FROM daily_stats 
+                        WHERE date >= ? AND orders_count > 0
                         GROUP BY month_num ORDER BY monthly_profit DESC LIMIT 1
-                    """)
+                    """, (start_date,))
                     best_month_row = cursor.fetchone()
                     if best_month_row:
                         m_idx = int(best_month_row['month_num'])
@@ -681,11 +1119,10 @@ class Database:
                 'net_profit': 0.0, 'orders_count': 0, 'daily_avg': 0.0, 'best_month': "N/A"
             }
 
-    async def update_order(self, order_id: int, new_data: dict) -> bool:
+    def update_order(self, order_id: int, new_data: dict) -> bool:
         """تحديث طلب موجود وتعديل المحافظ بناءً على الفروقات"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 
                 # 1. الحصول على البيانات القديمة لعكس تأثيرها
@@ -694,11 +1131,9 @@ class Database:
                 if not old_order:
                     return False
                 
-                # 2. ✅ NEW LOGIC: Only reverse company_wallet effect (not personal)
-                cursor.execute("""
-                    UPDATE settings SET 
-                        company_wallet = company_wallet - ?
-                """, (old_order['company_wallet_effect'],))
+                # 2. عكس تأثير الطلب القديم (محفظة الشركة فقط، والوردية، واليوم)
+                shifts, days, balances = {}, {}, {}
+                self._collect_order_deltas(cursor, "id = ?", (order_id,), -1, shifts, days, balances)
                 
                 # 3. تحديث بيانات الطلب (مع الحفاظ على التاريخ الأصلي)
                 cursor.execute("""
@@ -715,13 +1150,10 @@ class Database:
                     order_id
                 ))
                 
-                # 4. ✅ NEW LOGIC: Only apply new company_wallet effect (not personal)
-                cursor.execute("""
-                    UPDATE settings SET 
-                        company_wallet = company_wallet + ?
-                """, (new_data['company_wallet_effect'],))
-                
-                conn.commit()
+                # 4. ✅ NEW LOGIC: Only apply new company_wallet effect (not personal);
+                # the shift counters move too, so verify_ledger finds no drift after an edit
+                self._collect_order_deltas(cursor, "id = ?", (order_id,), 1, shifts, days, balances)
+                self._apply_order_deltas(cursor, shifts, days, balances)
                 return True
         except Exception as e:
             print(f"Error updating order: {e}")
@@ -731,14 +1163,14 @@ class Database:
     def get_average_profit_per_day_with_orders(self) -> float:
         """حساب متوسط الربح اليومي للأيام التي تحتوي على طلبات فقط"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT 
-                        SUM(delivery_fee + tip_cash + tip_visa) as total_profit,
-                        COUNT(DISTINCT DATE(datetime)) as days_with_orders
-                    FROM orders
-                    WHERE mode != 'SETTLEMENT'
+                        SUM(delivery_income + tip_cash + tip_visa) as total_profit,
+                        COUNT(*) as days_with_orders
+                    FROM daily_stats
+                    WHERE orders_count > 0
                 """)
                 row = cursor.fetchone()
                 if not row or not row[0] or not row[1] or row[1] == 0:
@@ -747,17 +1179,232 @@ class Database:
         except Exception:
             return 0.0
 
+    # Daily stats rollup
+
+    def _bump_daily_stats(self, cursor: sqlite3.Cursor, when: str, orders_count: int = 0,
+                          delivery_income: float = 0.0, tip_cash: float = 0.0,
+                          tip_visa: float = 0.0, expenses: float = 0.0) -> None:
+        """إضافة فروقات إلى صف اليوم في جدول التجميع (داخل نفس المعاملة)"""
+        cursor.execute("""
+            INSERT INTO daily_stats (date, orders_count, delivery_income, tip_cash, tip_visa, expenses)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                orders_count = orders_count + excluded.orders_count,
+                delivery_income = delivery_income + excluded.delivery_income,
+                tip_cash = tip_cash + excluded.tip_cash,
+                tip_visa = tip_visa + excluded.tip_visa,
+                expenses = expenses + excluded.expenses
+        """, (when[:10], orders_count, delivery_income or 0.0, tip_cash or 0.0, tip_visa or 0.0, expenses or 0.0))
+
+    def _rebuild_daily_stats(self, cursor: sqlite3.Cursor) -> None:
+        cursor.execute("DELETE FROM daily_stats")
+        # Same day key as _bump_daily_stats (when[:10]), so a rebuild reproduces the deltas exactly
+        cursor.execute("""
+            INSERT INTO daily_stats (date, orders_count, delivery_income, tip_cash, tip_visa)
+            SELECT substr(datetime, 1, 10), COUNT(*), SUM(delivery_fee), SUM(tip_cash), SUM(tip_visa)
+            FROM orders
+            WHERE mode != 'SETTLEMENT'
+            GROUP BY 1
+        """)
+        cursor.execute("""
+            INSERT INTO daily_stats (date, expenses)
+            SELECT substr(datetime, 1, 10), SUM(amount)
+            FROM expenses
+            WHERE type = 'OUT'
+            GROUP BY 1
+            ON CONFLICT(date) DO UPDATE SET expenses = excluded.expenses
+        """)
+
+    # Balance checkpoints (cumulative wallets at the end of each day)
+
+    def _bump_balance_checkpoints(self, cursor: sqlite3.Cursor, balances: Dict[str, float]) -> None:
+        """إضافة فروقات محفظة الشركة {day: delta} إلى نقطة اليوم وكل ما بعدها"""
+        deltas = {}
+        for day, company in balances.items():
+            deltas[day[:10]] = deltas.get(day[:10], 0.0) + company
+        days = sorted(day for day, company in deltas.items() if company)
+        # 1. Missing days start from the cumulative balance before them (all seeded before any update)
+        cursor.executemany("""
+            INSERT INTO balance_checkpoints (day, company_wallet)
+            SELECT ?1, COALESCE((SELECT company_wallet FROM balance_checkpoints WHERE day < ?1 ORDER BY day DESC LIMIT 1), 0.0)
+            WHERE true
+            ON CONFLICT(day) DO NOTHING
+        """, [(day,) for day in days])
+        # 2. Each stretch between two changed days gets the running total once:
+        # today's orders touch one row, a backdated batch walks the later rows a single time
+        company = 0.0
+        ranges = []
+        for i, day in enumerate(days):
+            company += deltas[day]
+            ranges.append((company, day, days[i + 1] if i + 1 < len(days) else None))
+        cursor.executemany("""
+            UPDATE balance_checkpoints SET company_wallet = company_wallet + ?1
+            WHERE day >= ?2 AND (?3 IS NULL OR day < ?3)
+        """, ranges)
+
+    def _rebuild_balance_checkpoints(self, cursor: sqlite3.Cursor) -> None:
+        cursor.execute("DELETE FROM balance_checkpoints")
+        cursor.execute("""
+            INSERT INTO balance_checkpoints (day, company_wallet)
+            SELECT day, SUM(company) OVER (ORDER BY day)
+            FROM (
+                SELECT substr(datetime, 1, 10) AS day, TOTAL(company_wallet_effect) AS company
+                FROM orders GROUP BY 1
+            )
+        """)
+
+    def balance_at(self, ts: Union[int, float, str, datetime]) -> Dict[str, Any]:
+        """رصيد محفظة الشركة كما كان في لحظة معينة (كل الطلبات حتى ts شاملة)
+
+        One checkpoint lookup (the cumulative balance at the end of the last
+        day before ts) plus an idx_orders_ts range sum over that day up to ts.
+        `ts` is epoch seconds, or a local datetime / ISO string. Only the
+        company wallet is derived from the rows, so only it has a history.
+        """
+        ts = int(ts) if isinstance(ts, (int, float)) else to_epoch(ts)
+        day = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+        with self._pool.read() as conn:
+            row = conn.execute(BALANCE_CHECKPOINT, (day,)).fetchone()
+            company = conn.execute(BALANCE_DAY, (to_epoch(day), ts)).fetchone()[0]
+        return {
+            'ts': ts,
+            'checkpoint': row['day'] if row else None,
+            'company_wallet': (row['company_wallet'] if row else 0.0) + company,
+        }
+
+    def rebuild_daily_stats(self) -> bool:
+        """إعادة بناء جدول التجميع اليومي بالكامل من الطلبات والمصاريف"""
+        try:
+            with self._pool.write() as conn:
+                self._rebuild_daily_stats(conn.cursor())
+            return True
+        except Exception as e:
+            print(f"Error rebuilding daily stats: {e}")
+            return False
+
+    def verify_ledger(self, repair: bool = False) -> Dict[str, Any]:
+        """إعادة حساب محفظة الشركة وإجماليات الورديات والتجميع اليومي ونقاط الرصيد من الصفوف الخام ومقارنتها بالمخزّن
+
+        One set-based pass (a handful of GROUP BY queries, no per-row Python),
+        so it is cheap enough for startup. With `repair=True` the check runs
+        inside a write transaction and every drifted value is overwritten with
+        the recomputed one before commit. The report lists each discrepancy as
+        (where, field, stored, expected).
+        """
+        started = time.perf_counter()
+        report = {'wallets': [], 'shifts': [], 'daily_stats': [], 'balance_checkpoints': [], 'repaired': False}
+        try:
+            with (self._pool.write() if repair else self._pool.read()) as conn:
+                cursor = conn.cursor()
+                report['orders'] = cursor.execute("SELECT COUNT(*) FROM orders WHERE mode != 'TIP'").fetchone()[0]
+
+                # 1. محفظة الشركة = مجموع company_wallet_effect
+                # personal_wallet is left alone: no row carries its starting balance,
+                # so the rows can't say what it should be
+                settings = cursor.execute("SELECT company_wallet FROM settings WHERE id = 1").fetchone()
+                company = cursor.execute("SELECT TOTAL(company_wallet_effect) FROM orders").fetchone()[0]
+                if settings and abs(settings['company_wallet'] - company) > LEDGER_TOLERANCE:
+                    report['wallets'].append(('settings', 'company_wallet', settings['company_wallet'], company))
+
+                # 2. الورديات: عدد الطلبات والدخل والمصاريف وصافي الربح
+                fixes = []
+                for shift_id, *stored, orders, income, expenses in cursor.execute(LEDGER_SHIFTS).fetchall():
+                    fields = zip(('total_orders', 'total_income', 'total_expenses', 'net_profit'),
+                                 stored, (orders, income, expenses, income - expenses))
+                    drift = [(f"shift {shift_id}", name, have, want) for name, have, want in fields
+                             if abs((have or 0) - want) > LEDGER_TOLERANCE]
+                    if drift:
+                        report['shifts'].extend(drift)
+                        fixes.append((orders, income, expenses, income - expenses, shift_id))
+
+                # 3. التجميع اليومي: نفس قواعد _rebuild_daily_stats
+                stored_days = {row[0]: tuple(row[1:]) for row in cursor.execute(
+                    "SELECT date, orders_count, delivery_income, tip_cash, tip_visa, expenses FROM daily_stats"
+                ).fetchall()}
+                expected_days = {}
+                for day, *values in cursor.execute("""
+                    SELECT substr(datetime, 1, 10), COUNT(*), TOTAL(delivery_fee), TOTAL(tip_cash), TOTAL(tip_visa)
+                    FROM orders WHERE mode != 'SETTLEMENT' GROUP BY 1
+                """).fetchall():
+                    expected_days[day] = (*values, 0.0)
+                for day, amount in cursor.execute("""
+                    SELECT substr(datetime, 1, 10), TOTAL(amount) FROM expenses WHERE type = 'OUT' GROUP BY 1
+                """).fetchall():
+                    expected_days[day] = (*expected_days.get(day, (0, 0.0, 0.0, 0.0, 0.0))[:4], amount)
+                empty = (0, 0.0, 0.0, 0.0, 0.0)
+                for day in sorted(stored_days.keys() | expected_days.keys()):
+                    have, want = stored_days.get(day, empty), expected_days.get(day, empty)
+                    for name, a, b in zip(('orders_count', 'delivery_income', 'tip_cash', 'tip_visa', 'expenses'), have, want):
+                        if abs((a or 0) - b) > LEDGER_TOLERANCE:
+                            report['daily_stats'].append((day, name, a, b))
+
+                # 4. نقاط الرصيد: مجموع تراكمي لتأثيرات كل يوم (يوم بلا نقطة يحمل رصيد ما قبله)
+                stored_points = dict(cursor.execute("SELECT day, company_wallet FROM balance_checkpoints").fetchall())
+                daily = dict(cursor.execute(
+                    "SELECT substr(datetime, 1, 10), TOTAL(company_wallet_effect) FROM orders GROUP BY 1"
+                ).fetchall())
+                running = have = 0.0
+                for day in sorted(stored_points.keys() | daily.keys()):
+                    running += daily.get(day, 0.0)
+                    have = stored_points.get(day, have)  # a day without a row reads the one before it
+                    if abs(have - running) > LEDGER_TOLERANCE:
+                        report['balance_checkpoints'].append((day, 'company_wallet', have, running))
+
+                if repair and (report['wallets'] or fixes or report['daily_stats'] or report['balance_checkpoints']):
+                    if report['wallets']:
+                        cursor.execute("UPDATE settings SET company_wallet = ? WHERE id = 1", (company,))
+                        self.settings_store.apply({'company_wallet': company})
+                    cursor.executemany("""
+                        UPDATE shifts SET total_orders = ?, total_income = ?, total_expenses = ?, net_profit = ?
+                        WHERE id = ?
+                    """, fixes)
+                    if report['daily_stats']:
+                        self._rebuild_daily_stats(cursor)
+                    if report['balance_checkpoints']:
+                        self._rebuild_balance_checkpoints(cursor)
+                    report['repaired'] = True
+        except Exception as e:
+            print(f"Error verifying ledger: {e}")
+            report['error'] = str(e)
+        report['issues'] = sum(len(report[key]) for key in ('wallets', 'shifts', 'daily_stats', 'balance_checkpoints'))
+        report['ok'] = report['issues'] == 0 and 'error' not in report
+        report['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        return report
+
+    def explain_hot_queries(self) -> Dict[str, List[str]]:
+        """خطة التنفيذ (EXPLAIN QUERY PLAN) لكل استعلام ساخن"""
+        plans = {}
+        with self._pool.read() as conn:
+            for name, (sql, params) in HOT_QUERIES.items():
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                plans[name] = [row['detail'] for row in rows]
+        return plans
+
+    def check_query_plans(self) -> List[Tuple[str, str]]:
+        """الاستعلامات الساخنة التي تقرأ الجدول كاملاً (قائمة فارغة = كل شيء مفهرس)"""
+        failures = []
+        for name, details in self.explain_hot_queries().items():
+            for detail in details:
+                # "SCAN orders" is a full table scan; "SCAN ... USING INDEX" walks an index
+                words = detail.split()
+                if len(words) == 2 and words[0] == "SCAN":
+                    failures.append((name, detail))
+        return failures
+
     def reset_database(self) -> bool:
         """مسح جميع البيانات وإعادة ضبط قاعدة البيانات"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM orders")
                 cursor.execute("DELETE FROM expenses")
                 cursor.execute("DELETE FROM shifts")
+                cursor.execute("DELETE FROM daily_stats")
+                cursor.execute("DELETE FROM balance_checkpoints")
                 cursor.execute("DELETE FROM sqlite_sequence")
                 cursor.execute("UPDATE settings SET personal_wallet = 0.0, company_wallet = 0.0")
-                conn.commit()
+                self.settings_store.apply({'personal_wallet': 0.0, 'company_wallet': 0.0})
+            self._suggestions = None
             return True
         except Exception:
             return False
@@ -784,13 +1431,20 @@ class Database:
         
         # إحصائيات الطلبات
         lines.append("\n### ORDER STATISTICS ###")
-        all_orders = self.get_all_orders(limit=9999)
-        total_orders = len(all_orders)
+        # المرور على كل الطلبات صفحة بصفحة بدلاً من limit=9999
+        total_orders = 0
+        total_delivery = 0.0
+        total_tips = 0.0
+        types_count = {}
+        for order in self.iter_orders():
+            total_orders += 1
+            total_delivery += order.get('delivery_fee', 0)
+            total_tips += order.get('tip_cash', 0) + order.get('tip_visa', 0)
+            order_type = order.get('order_type', 'Unknown')
+            types_count[order_type] = types_count.get(order_type, 0) + 1
         lines.append(f"Total Orders:         {total_orders}")
         
         if total_orders > 0:
-            total_delivery = sum(o.get('delivery_fee', 0) for o in all_orders)
-            total_tips = sum(o.get('tip_cash', 0) + o.get('tip_visa', 0) for o in all_orders)
             total_income = total_delivery + total_tips
             
             lines.append(f"Total Delivery Fees:  {total_delivery:.2f} EGP")
@@ -798,11 +1452,6 @@ class Database:
             lines.append(f"Total Income:         {total_income:.2f} EGP")
             
             # تفصيل حسب النوع
-            types_count = {}
-            for order in all_orders:
-                order_type = order.get('order_type', 'Unknown')
-                types_count[order_type] = types_count.get(order_type, 0) + 1
-            
             lines.append("\nOrders by Type:")
             for order_type, count in sorted(types_count.items()):
                 lines.append(f"  {order_type:15} {count:5} orders")
@@ -864,41 +1513,42 @@ class Database:
     
     def get_shifts_by_date(self, date_str: str) -> List[Dict[str, Any]]:
         """الحصول على الورديات لتاريخ معين"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._pool.read() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM shifts 
-                WHERE shift_date = ? 
-                ORDER BY scheduled_start
-            """, (date_str,))
+            cursor.execute(SHIFTS_BY_DATE, (date_str,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
             
+    def get_shift_summary_for_range(self, start: str, end: str) -> Dict[str, Dict[str, Any]]:
+        """حالة الورديات لكل يوم بين تاريخين (شاملة) في استعلام مجمّع واحد"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SHIFT_MONTH, (start, end))
+            return {
+                row['shift_date']: {
+                    'total': row['total'],
+                    'has_pending': row['pending'] > 0,
+                    'all_finished': row['finished'] == row['total'],
+                }
+                for row in cursor.fetchall()
+            }
+
     def get_active_shift(self) -> Optional[Dict[str, Any]]:
         """الحصول على الوردية النشطة حالياً"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._pool.read() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM shifts WHERE status = 'ACTIVE'")
+            cursor.execute(ACTIVE_SHIFT)
             row = cursor.fetchone()
             return dict(row) if row else None
             
     def get_next_shift(self) -> Optional[Dict[str, Any]]:
         """الحصول على الوردية القادمة (الأقرب)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 # البحث عن الورديات المجدولة التي لم تبدأ بعد
-                cursor.execute("""
-                    SELECT * FROM shifts 
-                    WHERE status = 'SCHEDULED' 
-                    AND (shift_date > DATE('now') OR (shift_date = DATE('now') AND scheduled_start > TIME('now')))
-                    ORDER BY shift_date ASC, scheduled_start ASC
-                    LIMIT 1
-                """)
+                cursor.execute(NEXT_SHIFT)
                 row = cursor.fetchone()
                 return dict(row) if row else None
         except Exception:
@@ -922,69 +1572,113 @@ class Database:
                     pass
 
             # ✅ التحقق من تداخل المواعيد
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            start_ts, end_ts = shift_span(final_date, start_time, end_time)
+            if start_ts is None or end_ts is None:
+                return False, final_date, "Invalid shift time"
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
-                
-                # حساب النطاق الزمني للوردية الجديدة
-                new_date_dt = datetime.strptime(final_date, "%Y-%m-%d")
-                ns_h, ns_m = map(int, start_time.split(":"))
-                ne_h, ne_m = map(int, end_time.split(":"))
-                
-                new_start_dt = new_date_dt.replace(hour=ns_h, minute=ns_m)
-                new_end_dt = new_date_dt.replace(hour=ne_h, minute=ne_m)
-                if new_end_dt <= new_start_dt:
-                    new_end_dt += timedelta(days=1)
-                
-                # جلب ورديات الأيام القريبة (يوم قبل وبعد) للتأكد من عدم التداخل مع ورديات منتصف الليل
-                prev_date = (new_date_dt - timedelta(days=1)).strftime("%Y-%m-%d")
-                next_date = (new_date_dt + timedelta(days=1)).strftime("%Y-%m-%d")
-                
-                cursor.execute("""
-                    SELECT * FROM shifts 
-                    WHERE shift_date IN (?, ?, ?) 
-                    AND status != 'ABSENT'
-                """, (prev_date, final_date, next_date))
-                
-                existing_shifts = cursor.fetchall()
-                for ex in existing_shifts:
-                    try:
-                        ex_date_dt = datetime.strptime(ex['shift_date'], "%Y-%m-%d")
-                        es_h, es_m = map(int, ex['scheduled_start'].split(":"))
-                        ee_h, ee_m = map(int, ex['scheduled_end'].split(":"))
-                        
-                        ex_start = ex_date_dt.replace(hour=es_h, minute=es_m)
-                        ex_end = ex_date_dt.replace(hour=ee_h, minute=ee_m)
-                        if ex_end <= ex_start:
-                            ex_end += timedelta(days=1)
-                        
-                        # Overlap logic: max(start1, start2) < min(end1, end2)
-                        overlap_start = max(new_start_dt, ex_start)
-                        overlap_end = min(new_end_dt, ex_end)
-                        
-                        if overlap_start < overlap_end:
-                            return False, final_date, f"Overlap with existing shift: {ex['scheduled_start']} - {ex['scheduled_end']}"
-                    except:
-                        continue
+                # One bounded range scan (see SHIFT_OVERLAP)
+                cursor.execute(SHIFT_OVERLAP, (start_ts - MAX_SHIFT_SECONDS, end_ts, start_ts))
+                clash = cursor.fetchone()
+                if clash:
+                    return False, final_date, f"Overlap with existing shift: {clash['scheduled_start']} - {clash['scheduled_end']}"
 
                 # تنفيذ الإضافة
                 cursor.execute("""
                     INSERT INTO shifts (
                         shift_date, scheduled_start, scheduled_end, 
-                        start_time, status, is_late, break_active, total_break_time
-                    ) VALUES (?, ?, ?, ?, 'SCHEDULED', 0, 0, 0)
-                """, (final_date, start_time, end_time, start_time))
-                
-                conn.commit()
+                        start_time, status, is_late, break_active, total_break_time, ts, start_ts, end_ts
+                    ) VALUES (?, ?, ?, ?, 'SCHEDULED', 0, 0, 0, ?, ?, ?)
+                """, (final_date, start_time, end_time, start_time, to_epoch(final_date), start_ts, end_ts))
                 return True, final_date, ""
         except Exception as e:
             print(f"Error adding shift: {e}")
             return False, shift_date, str(e)
 
+    def add_recurring_shifts(self, first_date: str, weekdays: Iterable[int], start_time: str, end_time: str,
+                             weeks: int) -> Dict[str, Any]:
+        """جدولة ورديات متكررة (أيام الأسبوع × عدد الأسابيع) في معاملة واحدة مع تقرير التعارضات لكل تاريخ"""
+        started = time.perf_counter()
+        result = {'added': [], 'conflicts': [], 'elapsed_ms': 0.0}
+        try:
+            first = datetime.strptime(first_date, "%Y-%m-%d").date()
+            days = set(weekdays)
+            today = datetime.now().date()
+            candidates = []
+            for offset in range(weeks * 7):
+                day = first + timedelta(days=offset)
+                if day.weekday() not in days:
+                    continue
+                date_str = day.strftime("%Y-%m-%d")
+                if day < today:
+                    result['conflicts'].append((date_str, "Date is in the past"))
+                    continue
+                start_ts, end_ts = shift_span(date_str, start_time, end_time)
+                if start_ts is None or end_ts is None:
+                    result['conflicts'].append((date_str, "Invalid shift time"))
+                    continue
+                candidates.append((start_ts, end_ts, date_str))
+            if not candidates:
+                return result
+
+            with self._pool.write() as conn:
+                cursor = conn.cursor()
+                # every existing shift that could touch the planned window, in one range read
+                cursor.execute("""
+                    SELECT start_ts, end_ts, shift_date, scheduled_start, scheduled_end FROM shifts
+                    WHERE start_ts > ? AND start_ts < ? AND status != 'ABSENT'
+                """, (candidates[0][0] - MAX_SHIFT_SECONDS, candidates[-1][1]))
+                existing = [
+                    (r['start_ts'], r['end_ts'], f"{r['scheduled_start']} - {r['scheduled_end']} ({r['shift_date']})")
+                    for r in cursor.fetchall() if r['end_ts'] is not None
+                ]
+                accepted, conflicts = self._sweep_shift_conflicts(existing, candidates)
+                result['conflicts'].extend(conflicts)
+                if accepted:
+                    last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM shifts").fetchone()[0]
+                    cursor.executemany("""
+                        INSERT INTO shifts (
+                            shift_date, scheduled_start, scheduled_end,
+                            start_time, status, is_late, break_active, total_break_time, ts, start_ts, end_ts
+                        ) VALUES (?, ?, ?, ?, 'SCHEDULED', 0, 0, 0, ?, ?, ?)
+                    """, [(d, start_time, end_time, start_time, to_epoch(d), s, e) for s, e, d in accepted])
+                    cursor.execute("SELECT * FROM shifts WHERE id > ? ORDER BY start_ts", (last_id,))
+                    result['added'] = [dict(r) for r in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error adding recurring shifts: {e}")
+            result['conflicts'].append((first_date, str(e)))
+        result['conflicts'].sort()
+        result['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        return result
+
+    @staticmethod
+    def _sweep_shift_conflicts(existing: List[Tuple[int, int, str]],
+                               candidates: List[Tuple[int, int, str]]) -> Tuple[List[Tuple[int, int, str]], List[Tuple[str, str]]]:
+        """تمريرة واحدة مرتبة حسب البداية: ترجع المرشحين المقبولين وتعارضات المرفوضين"""
+        # existing sorts before a candidate with the same start, so ties count as overlaps
+        events = sorted([(s, 0, e, label) for s, e, label in existing] + [(s, 1, e, label) for s, e, label in candidates])
+        reach = None  # existing shift reaching furthest so far: (end, label)
+        accepted: List[Tuple[int, int, str]] = []
+        conflicts: List[Tuple[str, str]] = []
+        for start, is_candidate, end, label in events:
+            if not is_candidate:
+                # accepted candidates are disjoint, so only the latest one can reach this start
+                if accepted and accepted[-1][1] > start:
+                    conflicts.append((accepted.pop()[2], f"Overlap with existing shift: {label}"))
+                if reach is None or end > reach[0]:
+                    reach = (end, label)
+            elif reach is not None and reach[0] > start:
+                conflicts.append((label, f"Overlap with existing shift: {reach[1]}"))
+            elif accepted and accepted[-1][1] > start:
+                conflicts.append((label, f"Overlaps the {accepted[-1][2]} shift in this plan"))
+            else:
+                accepted.append((start, end, label))
+        return accepted, conflicts
+
     def delete_shift(self, shift_id: int) -> bool:
         """حذف وردية (فقط إذا لم تبدأ)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT status FROM shifts WHERE id = ?", (shift_id,))
                 row = cursor.fetchone() # Fixed bug: row was not fetched
@@ -992,7 +1686,6 @@ class Database:
                     return False
                 
                 cursor.execute("DELETE FROM shifts WHERE id = ?", (shift_id,))
-                conn.commit()
                 return True
         except Exception as e:
             print(f"Error deleting shift: {e}")
@@ -1001,8 +1694,7 @@ class Database:
     def start_shift(self, shift_id: int) -> Tuple[bool, str]:
         """بدء الوردية يدوياً - مع قيود زمنية"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 
                 # جلب بيانات الوردية
@@ -1015,24 +1707,16 @@ class Database:
                     return False, f"Cannot start shift with status: {shift['status']}"
 
                 # التأكد من عدم وجود وردية نشطة أخرى
-                cursor.execute("SELECT id FROM shifts WHERE status = 'ACTIVE'")
+                cursor.execute(ACTIVE_SHIFT_ID)
                 if cursor.fetchone():
                     return False, "Another shift is already active!"
                 
                 # قيود الوقت: لا يمكن البدء قبل الموعد بأكثر من 30 دقيقة
                 now = datetime.now()
-                try:
-                    start_time_str = f"{shift['shift_date']} {shift['scheduled_start']}"
-                    try:
-                        scheduled_start = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M")
-                    except:
-                        scheduled_start = datetime.fromisoformat(start_time_str)
-                        
-                    diff = (scheduled_start - now).total_seconds() / 60
+                if shift['start_ts'] is not None:
+                    diff = (shift['start_ts'] - now.timestamp()) / 60
                     if diff > 30:
                         return False, f"Too early! Start available in {int(diff-30)} mins"
-                except Exception as e:
-                    print(f"Error checking start time: {e}")
                 
                 now_str = now.strftime("%Y-%m-%d %H:%M:%S")
                 
@@ -1041,8 +1725,6 @@ class Database:
                     SET status = 'ACTIVE', actual_start = ?, is_active = 1, is_late = 0
                     WHERE id = ?
                 """, (now_str, shift_id))
-                
-                conn.commit()
                 return cursor.rowcount > 0, "Success"
         except Exception as e:
             print(f"Error starting shift: {e}")
@@ -1051,12 +1733,11 @@ class Database:
     def end_active_shift(self, shift_id: int = None) -> Optional[Dict[str, Any]]:
         """إنهاء الوردية النشطة"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 
                 if shift_id is None:
-                    cursor.execute("SELECT id FROM shifts WHERE status = 'ACTIVE'")
+                    cursor.execute(ACTIVE_SHIFT_ID)
                     row = cursor.fetchone()
                     if not row:
                         return None
@@ -1065,19 +1746,12 @@ class Database:
                 now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
                 # حساب الإحصائيات
-                cursor.execute("""
-                    SELECT COUNT(*) as count,
-                           SUM(delivery_fee + tip_cash + tip_visa) as income
-                    FROM orders
-                    WHERE shift_id = ? AND mode != 'TIP'
-                """, (shift_id,))
+                cursor.execute(SHIFT_ORDER_TOTALS, (shift_id,))
                 row = cursor.fetchone()
                 total_orders = row['count'] if row else 0
                 total_income = row['income'] if row and row['income'] else 0.0
                 
-                cursor.execute("""
-                    SELECT SUM(amount) FROM expenses WHERE shift_id = ? AND type = 'OUT'
-                """, (shift_id,))
+                cursor.execute(SHIFT_EXPENSE_TOTAL, (shift_id,))
                 exp_row = cursor.fetchone()
                 total_expenses = exp_row[0] if exp_row and exp_row[0] else 0.0
                 
@@ -1087,7 +1761,6 @@ class Database:
                         total_orders = ?, total_income = ?, total_expenses = ?, net_profit = ?
                     WHERE id = ? AND status = 'ACTIVE'
                 """, (now_str, total_orders, total_income, total_expenses, total_income - total_expenses, shift_id)).rowcount > 0:
-                    conn.commit()
                     
                     # Return summary
                     cursor.execute("SELECT * FROM shifts WHERE id = ?", (shift_id,))
@@ -1101,8 +1774,7 @@ class Database:
     def toggle_break(self, shift_id: int, duration_mins: int = None) -> str:
         """تبديل حالة الاستراحة (بدء/إنهاء) - ترجع الحالة الجديدة"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("SELECT break_active, break_start, total_break_time FROM shifts WHERE id = ?", (shift_id,))
@@ -1134,8 +1806,6 @@ class Database:
                         WHERE id = ?
                     """, (now_str, duration_mins, shift_id))
                     new_status = "ACTIVE"
-                    
-                conn.commit()
                 return new_status
         except Exception as e:
             print(f"Error toggle_break: {e}")
@@ -1143,120 +1813,23 @@ class Database:
 
     def get_dashboard_status(self) -> Dict[str, Any]:
         """تجميع كافة البيانات اللازمة لعرض الحالة في الهيدر والتايمرات"""
+        # One-shot snapshot; the dashboard keeps a long-lived ShiftClock instead
         try:
-            today_iso = datetime.now().strftime("%Y-%m-%d")
-            
-            # Check for active shift
-            active = self.get_active_shift()
-            
-            # Check for upcoming 'SCHEDULED' shift
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM shifts WHERE shift_date = ? AND status = 'SCHEDULED' ORDER BY scheduled_start ASC LIMIT 1", (today_iso,))
-                next_shift = cursor.fetchone()
-                
-                # Check for just FINISHED shift
-                cursor.execute("SELECT * FROM shifts WHERE shift_date = ? AND status = 'FINISHED' ORDER BY actual_end DESC LIMIT 1", (today_iso,))
-                finished_shift = cursor.fetchone()
-
-            if active:
-                if active['break_active']:
-                    # Calculate break duration
-                    try:
-                        start = datetime.strptime(active['break_start'], "%Y-%m-%d %H:%M:%S")
-                        elapsed = int((datetime.now() - start).total_seconds())
-                        planned = active['break_planned_duration'] or 0
-                        return {
-                            "state": "BREAK",
-                            "elapsed_seconds": elapsed,
-                            "remaining_seconds": (planned * 60) - elapsed
-                        }
-                    except:
-                        return {"state": "BREAK", "elapsed_seconds": 0, "remaining_seconds": 0}
-                
-                else:
-                    # Active Shift
-                    try:
-                        start = datetime.strptime(active['actual_start'], "%Y-%m-%d %H:%M:%S")
-                        now = datetime.now()
-                        elapsed = int((now - start).total_seconds())
-                        
-                        # Calculate remaining based on scheduled end
-                        remaining = 0
-                        if active['scheduled_end']:
-                             end_dt = None
-                             end_time_str = f"{active['shift_date']} {active['scheduled_end']}".strip()
-                             for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %I:%M %p"):
-                                 try:
-                                     end_dt = datetime.strptime(end_time_str, fmt)
-                                     break
-                                 except ValueError:
-                                     continue
-                             
-                             if end_dt:
-                                 # Handle overnight shifts
-                                 if end_dt < start:
-                                     end_dt += timedelta(days=1)
-                                 remaining = int((end_dt - now).total_seconds())
-                        
-                        return {
-                            "state": "SHIFT_ACTIVE",
-                            "elapsed_seconds": elapsed,
-                            "remaining_seconds": remaining
-                        }
-                    except Exception as e:
-                        print(f"Error calcing active shift: {e}")
-                        return {"state": "SHIFT_ACTIVE", "elapsed_seconds": 0, "remaining_seconds": 0}
-
-            elif finished_shift and not next_shift:
-                # User just finished a shift today and has no upcoming one immediately
-                return {
-                    "state": "FINISHED",
-                    "elapsed_seconds": 0,
-                    "remaining_seconds": 0
-                }
-
-            elif next_shift:
-                # Calculate wait seconds
-                wait_seconds = 0
-                try:
-                    now = datetime.now()
-                    s_dt = datetime.strptime(f"{next_shift['shift_date']} {next_shift['scheduled_start']}", "%Y-%m-%d %H:%M:%S")
-                    wait_seconds = int((s_dt - now).total_seconds())
-                except:
-                    try:
-                        # Fallback for "%H:%M" format
-                        now = datetime.now()
-                        s_dt = datetime.strptime(f"{next_shift['shift_date']} {next_shift['scheduled_start']}", "%Y-%m-%d %H:%M")
-                        wait_seconds = int((s_dt - now).total_seconds())
-                    except:
-                        pass
-                
-                return {
-                    "state": "NEXT_UPCOMING",
-                    "scheduled_start": next_shift['scheduled_start'],
-                    "wait_seconds": wait_seconds,
-                    "elapsed_seconds": 0,
-                    "remaining_seconds": 0 
-                }
-            
-            return {"state": "NO_SHIFT", "elapsed_seconds": 0, "remaining_seconds": 0}
-
+            return ShiftClock(self).status()
         except Exception as e:
             print(f"Error getting dashboard status: {e}")
             return {"state": "ERROR", "elapsed_seconds": 0, "remaining_seconds": 0}
 
-        except Exception as e:
-            print(f"Error get_dashboard_status: {e}")
-            return {'state': 'NO_SHIFT'}
+    def get_data_version(self) -> int:
+        """رقم إصدار البيانات لاتصال القراءة الحالي (يتغير عند أي حفظ من اتصال آخر)"""
+        return self._pool.data_version()
 
     def is_order_allowed(self) -> Tuple[bool, str]:
         """التحقق من إمكانية إضافة طلبات (وردية نشطة + ليست في استراحة)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT id, break_active FROM shifts WHERE status = 'ACTIVE'")
+                cursor.execute(ORDER_ALLOWED)
                 row = cursor.fetchone()
                 
                 if not row:
@@ -1271,154 +1844,55 @@ class Database:
 
     def check_auto_updates(self) -> Dict[str, Any]:
         """التحقق من التحديثات التلقائية (انتهاء الوردية، الغياب، انتهاء الاستراحة)"""
+        # One-shot catch-up; the dashboard keeps a DeadlineScheduler armed instead
         try:
-            results = {'ended_shift': None, 'break_ended': False}
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                now = datetime.now()
-                now_str = now.strftime("%Y-%m-%d %H:%M:%S")
-                
-                # 1. إنهاء الورديات النشطة التي تجاوزت موعد الانتهاء
-                cursor.execute("SELECT * FROM shifts WHERE status = 'ACTIVE'")
-                active_shifts = [dict(r) for r in cursor.fetchall()]
-                
-                for shift in active_shifts:
-                    try:
-                        # 0. التحقق من انتهاء البريك تلقائياً إذا وجد
-                        if shift.get('break_active') and shift.get('break_planned_duration'):
-                            start_time = datetime.strptime(shift['break_start'], "%Y-%m-%d %H:%M:%S")
-                            planned_secs = shift['break_planned_duration'] * 60
-                            if now >= (start_time + timedelta(seconds=planned_secs)):
-                                self.toggle_break(shift['id'])
-                                results['break_ended'] = True
-
-                        # Reset to avoid leak
-                        scheduled_end = None
-                        
-                        end_val = shift.get('scheduled_end')
-                        date_val = shift.get('shift_date')
-                        
-                        if not end_val or not date_val:
-                            continue
-                            
-                        end_time_str = f"{date_val} {end_val}".strip()
-                        
-                        # Try parsing with multiple formats
-                        for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %I:%M %p"):
-                            try:
-                                scheduled_end = datetime.strptime(end_time_str, fmt)
-                                break
-                            except ValueError:
-                                continue
-                        
-                        if not scheduled_end:
-                            try:
-                                scheduled_end = datetime.fromisoformat(end_time_str.replace(" ", "T"))
-                            except ValueError:
-                                continue
-                                
-                        if not scheduled_end:
-                            continue
-                            
-                        # إضافة مهلة ساعتين (7200 ثانية) قبل الإنهاء التلقائي لتجنب الإزعاج أثناء العمل
-                        grace_period_seconds = 7200
-                        if now >= (scheduled_end + timedelta(seconds=grace_period_seconds)):
-                            # إنهاء هذه الوردية تلقائياً
-                            results['ended_shift'] = self.end_active_shift(shift['id'])
-                    except Exception as ex:
-                        print(f"Error auto-ending shift {shift['id']}: {ex}")
-
-                # 2. تحويل الورديات المجدولة إلى "غائب" إذا انتهى وقتها ولم تبدأ (مع مهلة ساعتين)
-                cursor.execute("SELECT * FROM shifts WHERE status = 'SCHEDULED'")
-                scheduled_shifts = [dict(r) for r in cursor.fetchall()]
-                
-                absent_grace = timedelta(hours=2)
-                for shift in scheduled_shifts:
-                    try:
-                        # Reset variables for each iteration to avoid leak
-                        scheduled_end = None
-                        scheduled_start = None
-                        
-                        # التحقق من التاريخ والوقت بدقة
-                        end_val = shift.get('scheduled_end')
-                        date_val = shift.get('shift_date')
-                        
-                        if not end_val or not date_val:
-                            continue
-                            
-                        end_time_str = f"{date_val} {end_val}".strip()
-                        
-                        # Try parsing end time with multiple formats
-                        for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %I:%M %p"):
-                            try:
-                                scheduled_end = datetime.strptime(end_time_str, fmt)
-                                break
-                            except ValueError:
-                                continue
-                        
-                        if not scheduled_end:
-                            try:
-                                scheduled_end = datetime.fromisoformat(end_time_str.replace(" ", "T"))
-                            except ValueError:
-                                continue
-                                
-                        if not scheduled_end:
-                            continue
-
-                        # Parsing start time for midnight crossing detection
-                        start_val = shift.get('scheduled_start')
-                        if start_val:
-                            start_time_str = f"{date_val} {start_val}".strip()
-                            for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %I:%M %p"):
-                                try:
-                                    scheduled_start = datetime.strptime(start_time_str, fmt)
-                                    break
-                                except ValueError:
-                                    continue
-                            
-                            if not scheduled_start:
-                                try:
-                                    scheduled_start = datetime.fromisoformat(start_time_str.replace(" ", "T"))
-                                except:
-                                    pass
-                                    
-                        # Dealing with midnight crossing
-                        if scheduled_start and scheduled_end < scheduled_start:
-                            scheduled_end += timedelta(days=1)
-
-                        if now >= (scheduled_end + absent_grace):
-                             cursor.execute("UPDATE shifts SET status = 'ABSENT' WHERE id = ?", (shift['id'],))
-                    except Exception as ex:
-                        print(f"Error checking absent status for shift {shift['id']}: {ex}")
-                conn.commit()
-                return results
+            with self._pool.write():
+                return DeadlineScheduler(self).rearm().fire_due()
         except Exception as e:
             print(f"Error in auto updates: {e}")
-            return {'ended_shift': None, 'break_ended': False}
+            return {'ended_shift': None, 'break_ended': False, 'changed': []}
+
+    def end_break(self, shift_id: int, break_start: str) -> bool:
+        """إنهاء استراحة بعينها، فقط إن كانت ما زالت الاستراحة الجارية"""
+        try:
+            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with self._pool.write() as conn:
+                return conn.execute("""
+                    UPDATE shifts
+                    SET break_active = 0, break_end = :now, break_planned_duration = NULL,
+                        total_break_time = COALESCE(total_break_time, 0)
+                            + CAST(strftime('%s', :now) AS INTEGER) - CAST(strftime('%s', break_start) AS INTEGER)
+                    WHERE id = :id AND break_active = 1 AND break_start = :start
+                """, {'now': now_str, 'id': shift_id, 'start': break_start}).rowcount > 0
+        except Exception as e:
+            print(f"Error end_break: {e}")
+            return False
+
+    def mark_shift_absent(self, shift_id: int) -> bool:
+        """تحويل وردية مجدولة لم تبدأ إلى غياب"""
+        try:
+            with self._pool.write() as conn:
+                return conn.execute(
+                    "UPDATE shifts SET status = 'ABSENT' WHERE id = ? AND status = 'SCHEDULED'", (shift_id,)
+                ).rowcount > 0
+        except Exception as e:
+            print(f"Error mark_shift_absent: {e}")
+            return False
 
     def get_shift_stats(self, shift_id: int) -> Dict[str, Any]:
         """الحساب اللحظي لإحصائيات الوردية (عدد الطلبات، الدخل، الربح)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 
                 # حساب الطلبات والدخل
-                cursor.execute("""
-                    SELECT COUNT(*) as count,
-                           SUM(delivery_fee + tip_cash + tip_visa) as income
-                    FROM orders
-                    WHERE shift_id = ? AND mode != 'TIP'
-                """, (shift_id,))
+                cursor.execute(SHIFT_ORDER_TOTALS, (shift_id,))
                 row = cursor.fetchone()
                 total_orders = row['count'] if row else 0
                 total_income = row['income'] if row and row['income'] else 0.0
                 
                 # حساب المصاريف
-                cursor.execute("""
-                    SELECT SUM(amount) FROM expenses WHERE shift_id = ? AND type = 'OUT'
-                """, (shift_id,))
+                cursor.execute(SHIFT_EXPENSE_TOTAL, (shift_id,))
                 exp_row = cursor.fetchone()
                 total_expenses = exp_row[0] if exp_row and exp_row[0] else 0.0
                 
@@ -1435,13 +1909,12 @@ class Database:
     def get_all_shifts(self, limit: int = 50) -> List[Dict[str, Any]]:
         """الحصول على سجل الورديات (المنتهية والغياب فقط)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._pool.read() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT * FROM shifts 
                     WHERE status IN ('FINISHED', 'ABSENT', 'SCHEDULED', 'ACTIVE')
-                    ORDER BY shift_date DESC, scheduled_start DESC
+                    ORDER BY ts DESC, scheduled_start DESC
                     LIMIT ?
                 """, (limit,))
                 rows = cursor.fetchall()
@@ -1451,8 +1924,7 @@ class Database:
             
     def get_shift_summary(self, shift_id: int) -> Optional[Dict[str, Any]]:
         """الحصول على ملخص الوردية"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM shifts WHERE id = ?", (shift_id,))
             row = cursor.fetchone()
@@ -0,0 +1,98 @@
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .queries import ACTIVE_SHIFT_DEADLINES, SCHEDULED_SHIFT_ENDS
+
+# مهلة (بالثواني) قبل الإنهاء التلقائي للوردية النشطة، وقبل اعتبار الوردية المجدولة غياباً
+AUTO_END_GRACE = 2 * 3600
+ABSENT_GRACE = 2 * 3600
+
+
+class DeadlineScheduler:
+    """كومة مواعيد انتقالات الورديات: كل انتقال يُنفَّذ في لحظته بتحديث واحد موجّه
+
+    `rearm()` reads the stored epoch deadlines of the ACTIVE and SCHEDULED
+    shifts (end_ts, break start + planned length) and pushes one entry
+    per upcoming transition (break expiry, auto-end, absence). The owner sleeps
+    until `next_due()` and calls `fire_due()`, which pops only the entries that
+    are due. Every update is guarded on the row still being in the state the
+    entry was computed from, so a stale entry is a harmless no-op.
+    """
+
+    BREAK_END = "break_end"
+    AUTO_END = "auto_end"
+    ABSENT = "absent"
+
+    def __init__(self, db):
+        self.db = db
+        # (due epoch, seq, kind, shift_id, guard): seq keeps ties in push order
+        self._heap: List[Tuple[int, int, str, int, Optional[str]]] = []
+        self.rearms = 0
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def rearm(self) -> "DeadlineScheduler":
+        """إعادة بناء الكومة من جدول الورديات (عند أي تغيير في الورديات)"""
+        try:
+            with self.db._pool.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute(ACTIVE_SHIFT_DEADLINES)
+                active = cursor.fetchall()
+                cursor.execute(SCHEDULED_SHIFT_ENDS)
+                scheduled = cursor.fetchall()
+        except Exception as e:
+            print(f"Error arming shift deadlines: {e}")
+            return self
+
+        entries = []
+        for shift in active:
+            if shift['break_due'] is not None:
+                entries.append((shift['break_due'], self.BREAK_END, shift['id'], shift['break_start']))
+            if shift['end_ts'] is not None:
+                entries.append((shift['end_ts'] + AUTO_END_GRACE, self.AUTO_END, shift['id'], None))
+        for shift in scheduled:
+            if shift['end_ts'] is not None:
+                entries.append((shift['end_ts'] + ABSENT_GRACE, self.ABSENT, shift['id'], None))
+
+        self._heap = [(due, seq, kind, shift_id, guard) for seq, (due, kind, shift_id, guard) in enumerate(entries)]
+        heapq.heapify(self._heap)
+        self.rearms += 1
+        return self
+
+    def next_due(self) -> Optional[int]:
+        """أقرب موعد انتقال (ثوانٍ منذ Epoch)، أو None إن لم يبق شيء"""
+        return self._heap[0][0] if self._heap else None
+
+    def seconds_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        due = self.next_due()
+        if due is None:
+            return None
+        return max(0.0, due - (time.time() if now is None else now))
+
+    def fire_due(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """تنفيذ كل الانتقالات التي حان موعدها؛ ترجع ما تغيّر فعلاً"""
+        now = time.time() if now is None else now
+        results = {'ended_shift': None, 'break_ended': False, 'changed': []}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, kind, shift_id, guard = heapq.heappop(self._heap)
+            self.fired += 1
+            try:
+                if kind == self.BREAK_END:
+                    changed = self.db.end_break(shift_id, guard)
+                    results['break_ended'] = results['break_ended'] or changed
+                elif kind == self.AUTO_END:
+                    ended = self.db.end_active_shift(shift_id)
+                    changed = ended is not None
+                    if ended:
+                        results['ended_shift'] = ended
+                else:
+                    changed = self.db.mark_shift_absent(shift_id)
+            except Exception as ex:
+                print(f"Error applying {kind} for shift {shift_id}: {ex}")
+                continue
+            if changed and shift_id not in results['changed']:
+                results['changed'].append(shift_id)
+        return results
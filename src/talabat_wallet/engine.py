@@ -64,6 +64,55 @@ class AccountingEngine:
         
         return personal_effect, company_effect, tip_cash, tip_visa
     
+    @staticmethod
+    def calculate_order_effects_batch(
+        mode,
+        order_type,
+        paid,
+        expected,
+        actual,
+        delivery_fee,
+        manual_tip_cash=None,
+        manual_tip_visa=None
+    ):
+        """
+        نسخة مصفوفات من calculate_order_effects لتاريخ كامل من الطلبات دفعة واحدة
+
+        Takes one array (or list) per column and returns the arrays
+        (personal_effect, company_effect, tip_cash, tip_visa) as float64.
+        Every branch of the scalar function becomes a mask and each element
+        goes through the same single IEEE operation, so the results are
+        bit-for-bit what the scalar path gives, including -0.0 and NaN.
+        """
+        import numpy as np
+
+        mode = np.asarray(mode)
+        order_type = np.asarray(order_type)
+        paid = np.asarray(paid, dtype=np.float64)
+        expected = np.asarray(expected, dtype=np.float64)
+        actual = np.asarray(actual, dtype=np.float64)
+        n = len(mode)
+        manual_tip_cash = np.zeros(n) if manual_tip_cash is None else np.asarray(manual_tip_cash, dtype=np.float64)
+        manual_tip_visa = np.zeros(n) if manual_tip_visa is None else np.asarray(manual_tip_visa, dtype=np.float64)
+        # delivery_fee never reaches the effects (same as the scalar path); kept for a matching signature
+
+        cash = mode == "CASH"
+        visa = mode == "VISA"
+        restaurant = cash & (order_type == "Restaurant")
+
+        with np.errstate(invalid="ignore", over="ignore"):
+            # max(diff, 0) keeps diff unless 0 > diff: -0.0 and NaN pass through like in Python
+            cash_tip = actual - expected
+            cash_tip = np.where(cash_tip < 0, 0.0, cash_tip)
+
+            personal_effect = np.zeros(n)
+            company_effect = np.where(restaurant, expected - paid,
+                             np.where(cash, expected,
+                             np.where(visa, -manual_tip_visa, 0.0)))
+        tip_cash = np.where(cash, cash_tip, np.where(visa, manual_tip_cash, 0.0))
+        tip_visa = np.where(visa, manual_tip_visa, 0.0)
+        return personal_effect, company_effect, tip_cash, tip_visa
+
     @staticmethod
     def create_order(
         mode: ModeType,
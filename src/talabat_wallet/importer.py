@@ -0,0 +1,168 @@
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .engine import AccountingEngine
+
+# عدد الصفوف في كل معاملة (executemany واحد لكل دفعة)
+CHUNK_SIZE = 2000
+# أوضاع الطلب التي يقبلها الاستيراد؛ صفوف TIP تُشتق من بقشيش الطلب نفسه فتُتخطّى
+IMPORT_MODES = ("CASH", "VISA")
+ORDER_TYPES = ("Restaurant", "Mart", "Friendly Restaurant")
+AMOUNT_FIELDS = ('paid', 'expected', 'actual', 'delivery_fee', 'tip_cash', 'tip_visa')
+# أقصى عدد من أخطاء الأسطر المحفوظة في التقرير (الباقي يُعدّ فقط)
+MAX_REPORTED_ERRORS = 50
+
+ImportProgress = Callable[[Dict[str, Any]], None]
+
+
+def local_stamp(value: Any) -> str:
+    """توحيد وقت ISO إلى وقت محلي بلا منطقة زمنية، كما يخزّنه باقي التطبيق"""
+    stamp = datetime.fromisoformat(str(value).strip())
+    if stamp.tzinfo is not None:
+        # an offset would put the row on another day in daily_stats/ts than the text says
+        stamp = stamp.astimezone().replace(tzinfo=None)
+    return stamp.isoformat()
+
+
+def order_content_hash(order: Dict[str, Any], stamp: Optional[str] = None) -> str:
+    """بصمة محتوى الطلب (الوقت والوضع والنوع والمبالغ): نفس الطلب يُستورد مرة واحدة فقط"""
+    # `stamp` is the already-normalized datetime when the caller just parsed it
+    stamp = stamp or local_stamp(order['datetime'])
+    parts = [stamp, order['mode'], order['order_type']]
+    parts += [repr(float(order.get(field) or 0.0)) for field in AMOUNT_FIELDS]
+    return hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def prepare_order(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """تحويل صف من الملف إلى طلب جاهز للإدخال عبر AccountingEngine؛ None لصفوف TIP
+
+    Raises ValueError with a readable reason for rows that can't be imported.
+    """
+    mode = str(row.get('mode') or "").strip().upper()
+    if mode == "TIP":
+        return None
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"unsupported mode '{row.get('mode')}'")
+    order_type = str(row.get('order_type') or "").strip()
+    if order_type not in ORDER_TYPES:
+        raise ValueError(f"unknown order type '{order_type}'")
+    try:
+        stamp = local_stamp(row.get('datetime') or "")
+    except ValueError:
+        raise ValueError(f"invalid datetime '{row.get('datetime')}'")
+    amounts = {}
+    for field in AMOUNT_FIELDS:
+        value = row.get(field)
+        try:
+            amounts[field] = float(value) if value not in (None, "") else 0.0
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got '{value}'")
+
+    ok, message = AccountingEngine.validate_order_values(
+        order_type, amounts['paid'], amounts['expected'], amounts['actual'], amounts['delivery_fee']
+    )
+    if not ok:
+        raise ValueError(message)
+    personal_effect, company_effect, tip_cash, tip_visa = AccountingEngine.calculate_order_effects(
+        mode, order_type, amounts['paid'], amounts['expected'], amounts['actual'], amounts['delivery_fee'],
+        manual_tip_cash=amounts['tip_cash'], manual_tip_visa=amounts['tip_visa']
+    )
+    order = {
+        'datetime': stamp,
+        'mode': mode,
+        'order_type': order_type,
+        **amounts,
+        'tip_cash': tip_cash,
+        'tip_visa': tip_visa,
+        'personal_wallet_effect': personal_effect,
+        'company_wallet_effect': company_effect,
+        'subtype': row.get('subtype') or None,
+        'metadata': row.get('metadata') or None,
+    }
+    order['content_hash'] = order_content_hash(order, stamp)
+    return order
+
+
+def iter_source_rows(path: str) -> Iterator[Tuple[int, Dict[str, Any], int]]:
+    """قراءة ملف CSV (بعناوين أعمدة) أو JSONL سطراً سطراً: (رقم السطر، الصف، البايتات المقروءة)"""
+    is_csv = str(path).lower().endswith(".csv")
+    with open(path, "rb") as raw:
+        position = 0
+
+        def lines() -> Iterator[str]:
+            nonlocal position
+            for line in raw:
+                # utf-8-sig drops the BOM spreadsheet exports put on the first line
+                encoding = "utf-8-sig" if position == 0 else "utf-8"
+                position += len(line)
+                yield line.decode(encoding)
+
+        if is_csv:
+            reader = csv.DictReader(lines())
+            for row in reader:
+                yield reader.line_num, row, position
+        else:
+            for line_no, line in enumerate(lines(), start=1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        row = {'__error__': f"invalid JSON: {e}"}
+                    if not isinstance(row, dict):
+                        row = {'__error__': "expected a JSON object per line"}
+                    yield line_no, row, position
+
+
+def import_orders(db, path: str, chunk_size: int = CHUNK_SIZE,
+                  progress: Optional[ImportProgress] = None) -> Dict[str, Any]:
+    """استيراد الطلبات من ملف على دفعات (معاملة لكل دفعة) مع تخطي المكرر ببصمة المحتوى
+
+    `progress` receives a snapshot of the report after every chunk; it is
+    called on the importing thread.
+    """
+    started = time.perf_counter()
+    report = {
+        'path': str(path), 'read': 0, 'imported': 0, 'duplicates': 0, 'skipped': 0,
+        'failed': 0, 'errors': [], 'bytes_read': 0, 'total_bytes': os.path.getsize(path),
+        'chunks': 0, 'elapsed_ms': 0.0, 'done': False,
+    }
+
+    def flush(chunk) -> None:
+        if chunk:
+            result = db.import_order_chunk(chunk)
+            report['imported'] += result['imported']
+            report['duplicates'] += result['duplicates']
+            report['chunks'] += 1
+            chunk.clear()
+        report['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        if progress:
+            progress(dict(report, errors=list(report['errors'])))
+
+    chunk = []
+    for line_no, row, position in iter_source_rows(path):
+        report['read'] += 1
+        report['bytes_read'] = position
+        try:
+            if '__error__' in row:
+                raise ValueError(row['__error__'])
+            order = prepare_order(row)
+        except ValueError as e:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append((line_no, str(e)))
+            continue
+        if order is None:
+            report['skipped'] += 1
+            continue
+        chunk.append(order)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+    report['done'] = True
+    flush(chunk)
+    return report
+
@@ -0,0 +1,80 @@
+"""نصوص استعلامات المسارات الساخنة: تستخدمها الدوال نفسها، وتفحص Database.HOT_QUERIES خططها
+
+Kept in their own module so database.py, shift_clock.py and deadlines.py
+can share them (the last two are imported by database.py).
+"""
+
+# قائمة قيم (معرّفات أو بصمات) كمعامل JSON واحد للعمليات الجماعية
+JSON_VALUES = "SELECT value FROM json_each(?)"
+
+# ── SHIFTS ─────────────────────────────────────────────────────────────────────
+ACTIVE_SHIFT = "SELECT * FROM shifts WHERE status = 'ACTIVE'"
+ACTIVE_SHIFT_ID = "SELECT id FROM shifts WHERE status = 'ACTIVE'"
+ORDER_ALLOWED = "SELECT id, break_active FROM shifts WHERE status = 'ACTIVE'"
+# break_start is a local "%Y-%m-%d %H:%M:%S" stamp; 'utc' makes it epoch like end_ts
+ACTIVE_SHIFT_DEADLINES = """
+    SELECT id, end_ts, break_start,
+           CASE WHEN break_active AND break_planned_duration
+                THEN CAST(strftime('%s', break_start, 'utc') AS INTEGER) + break_planned_duration * 60
+           END AS break_due
+    FROM shifts WHERE status = 'ACTIVE'
+"""
+SCHEDULED_SHIFT_ENDS = "SELECT id, end_ts FROM shifts WHERE status = 'SCHEDULED'"
+NEXT_SHIFT = """
+    SELECT * FROM shifts
+    WHERE status = 'SCHEDULED'
+    AND (shift_date > DATE('now') OR (shift_date = DATE('now') AND scheduled_start > TIME('now')))
+    ORDER BY shift_date ASC, scheduled_start ASC
+    LIMIT 1
+"""
+SHIFTS_BY_DATE = """
+    SELECT * FROM shifts
+    WHERE shift_date = ?
+    ORDER BY scheduled_start
+"""
+SHIFT_MONTH = """
+    SELECT shift_date,
+           COUNT(*) AS total,
+           SUM(status IN ('SCHEDULED', 'ACTIVE')) AS pending,
+           SUM(status IN ('FINISHED', 'ABSENT')) AS finished
+    FROM shifts
+    WHERE shift_date BETWEEN ? AND ?
+    GROUP BY shift_date
+"""
+# A shift never spans more than a day, so only starts within MAX_SHIFT_SECONDS
+# before ours can reach into it: one bounded range scan
+SHIFT_OVERLAP = """
+    SELECT scheduled_start, scheduled_end FROM shifts
+    WHERE start_ts > ? AND start_ts < ? AND end_ts > ? AND status != 'ABSENT' LIMIT 1
+"""
+TODAY_NEXT_SHIFT = "SELECT * FROM shifts WHERE shift_date = ? AND status = 'SCHEDULED' ORDER BY scheduled_start ASC LIMIT 1"
+TODAY_FINISHED_SHIFT = "SELECT * FROM shifts WHERE shift_date = ? AND status = 'FINISHED' ORDER BY actual_end DESC LIMIT 1"
+SHIFT_ORDER_TOTALS = """
+    SELECT COUNT(*) as count,
+           SUM(delivery_fee + tip_cash + tip_visa) as income
+    FROM orders
+    WHERE shift_id = ? AND mode != 'TIP'
+"""
+SHIFT_EXPENSE_TOTAL = "SELECT SUM(amount) FROM expenses WHERE shift_id = ? AND type = 'OUT'"
+
+# ── ORDERS ─────────────────────────────────────────────────────────────────────
+ORDERS_BY_IDS = f"SELECT * FROM orders WHERE id IN ({JSON_VALUES}) ORDER BY id"
+IMPORT_DEDUP = f"SELECT content_hash FROM orders WHERE content_hash IN ({JSON_VALUES})"
+
+
+def orders_page_sql(filters: str = "", after: bool = False) -> str:
+    """استعلام صفحة الطلبات (الأحدث أولاً)؛ filters من _order_filters، وafter يضيف مؤشر (ts, id)"""
+    query = "SELECT * FROM orders WHERE 1=1" + filters
+    if after:
+        # idx_orders_ts carries the rowid, so (ts, id) is one index range
+        query += " AND (ts, id) < (?, ?)"
+    return query + " ORDER BY ts DESC, id DESC LIMIT ?"
+
+
+# ── BALANCE ────────────────────────────────────────────────────────────────────
+# رصيد محفظة الشركة التراكمي في نهاية آخر يوم قبل اليوم المطلوب، ثم حركة ذلك اليوم حتى اللحظة
+BALANCE_CHECKPOINT = """
+    SELECT day, company_wallet FROM balance_checkpoints
+    WHERE day < ? ORDER BY day DESC LIMIT 1
+"""
+BALANCE_DAY = "SELECT TOTAL(company_wallet_effect) FROM orders WHERE ts >= ? AND ts <= ?"
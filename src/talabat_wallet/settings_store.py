@@ -0,0 +1,159 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# مفاتيح صف الإعدادات التي يحملها المخزن
+SETTINGS_KEYS = ('mode', 'batch', 'personal_wallet', 'company_wallet')
+WALLET_KEYS = ('personal_wallet', 'company_wallet')
+
+SettingsListener = Callable[[Dict[str, Any]], None]
+
+
+class SettingsStore:
+    """نسخة الإعدادات وأسعار الباتشات في الذاكرة: تُحمّل مرة واحدة وتُحدَّث مع كل كتابة
+
+    Database writes keep it current in place: `update_settings` /
+    `update_batch_price` write through, and every wallet-moving method queues
+    its delta with `add_to_wallets`. Changes are applied after the outer
+    transaction commits (a rolled-back batch never touches the cache) and
+    listeners get a dict of just the keys that moved; price changes arrive
+    under 'batch_prices'. Commits by another process are detected through
+    PRAGMA data_version on the writer connection, which only moves for
+    commits that are not ours, and trigger a reload.
+
+    Listeners are called on the committing thread (a WriteQueue worker for
+    `db.aio`), so they must be quick and thread-safe, e.g. `post_message`.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._lock = threading.RLock()
+        self._settings: Optional[Dict[str, Any]] = None
+        self._batch_prices: Optional[Dict[str, Dict[str, float]]] = None
+        self._data_version: Optional[int] = None
+        self._listeners: List[SettingsListener] = []
+        self.loads = 0
+
+    # ── READS ─────────────────────────────────────────────────────────────────
+
+    def settings(self) -> Dict[str, Any]:
+        """نسخة من صف الإعدادات"""
+        self.sync()
+        with self._lock:
+            return dict(self._settings)
+
+    def balances(self) -> Dict[str, float]:
+        """رصيد المحفظتين فقط"""
+        self.sync()
+        with self._lock:
+            return {key: self._settings[key] for key in WALLET_KEYS}
+
+    def batch_prices(self) -> Dict[str, Dict[str, float]]:
+        """نسخة من أسعار الباتشات {name: {'mart', 'restaurant'}}"""
+        self.sync()
+        with self._lock:
+            return {name: dict(prices) for name, prices in self._batch_prices.items()}
+
+    # ── LOADING ───────────────────────────────────────────────────────────────
+
+    def load(self) -> Dict[str, Any]:
+        """قراءة الإعدادات والأسعار من قاعدة البيانات (إعادة تحميل كاملة)"""
+        # Read on the writer under its lock: no commit of ours can land between
+        # the read and the data_version it is stamped with
+        with self._pool.committed() as conn:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            row = conn.execute("SELECT * FROM settings WHERE id = 1").fetchone()
+            rows = conn.execute("SELECT * FROM batch_prices ORDER BY batch_name").fetchall()
+            settings = dict(row) if row else {}
+            prices = {r['batch_name']: {'mart': r['mart_price'], 'restaurant': r['restaurant_price']} for r in rows}
+            with self._lock:
+                self._settings = settings
+                self._batch_prices = prices
+                self._data_version = version
+                self.loads += 1
+        return settings
+
+    def sync(self) -> bool:
+        """إعادة التحميل إن حفظت عملية أخرى تغييرات؛ ترجع True إن تغيّر شيء"""
+        if self._settings is None:
+            self.load()
+            return False
+        if self._pool.in_write():
+            return False  # the cache is the committed state; don't mix in our open transaction
+        version = self._pool.external_data_version()
+        if version is None or version == self._data_version:
+            return False  # unchanged, or our writer is busy committing (next call checks)
+        with self._lock:
+            old_settings, old_prices = self._settings, self._batch_prices
+        self.load()
+        with self._lock:
+            changes = {key: value for key, value in self._settings.items() if old_settings.get(key) != value}
+            if self._batch_prices != old_prices:
+                changes['batch_prices'] = {name: dict(p) for name, p in self._batch_prices.items()}
+        self._notify(changes)
+        return bool(changes)
+
+    # ── WRITES (called by Database inside its write transaction) ─────────────
+
+    def apply(self, changes: Dict[str, Any]) -> None:
+        """كتابة قيم جديدة لحقول الإعدادات بعد الحفظ"""
+        changes = {key: value for key, value in changes.items() if key in SETTINGS_KEYS}
+        if changes:
+            self._pool.after_commit(lambda: self._apply(changes))
+
+    def add_to_wallets(self, personal: float = 0.0, company: float = 0.0) -> None:
+        """إضافة فرق إلى المحفظتين بعد الحفظ (نفس الفرق الذي طُبّق في SQL)"""
+        if personal or company:
+            self._pool.after_commit(lambda: self._add(personal, company))
+
+    def set_batch_price(self, batch_name: str, mart_price: float, restaurant_price: float) -> None:
+        """تحديث سعر باتش بعد الحفظ"""
+        self._pool.after_commit(lambda: self._set_price(batch_name, mart_price, restaurant_price))
+
+    def _apply(self, changes: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._settings is None:
+                return
+            self._settings.update(changes)
+        self._notify(dict(changes))
+
+    def _add(self, personal: float, company: float) -> None:
+        with self._lock:
+            if self._settings is None:
+                return
+            self._settings['personal_wallet'] += personal
+            self._settings['company_wallet'] += company
+            changes = {key: self._settings[key] for key in WALLET_KEYS}
+        self._notify(changes)
+
+    def _set_price(self, batch_name: str, mart_price: float, restaurant_price: float) -> None:
+        with self._lock:
+            if self._batch_prices is None:
+                return
+            self._batch_prices[batch_name] = {'mart': mart_price, 'restaurant': restaurant_price}
+            self._batch_prices = dict(sorted(self._batch_prices.items()))
+            prices = {name: dict(p) for name, p in self._batch_prices.items()}
+        self._notify({'batch_prices': prices})
+
+    # ── LISTENERS ─────────────────────────────────────────────────────────────
+
+    def subscribe(self, listener: SettingsListener) -> Callable[[], None]:
+        """تسجيل مستمع للتغييرات؛ ترجع دالة إلغاء التسجيل"""
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return unsubscribe
+
+    def _notify(self, changes: Dict[str, Any]) -> None:
+        if not changes:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"Error in settings listener: {e}")
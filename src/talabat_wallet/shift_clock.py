@@ -0,0 +1,130 @@
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from .queries import ACTIVE_SHIFT, TODAY_FINISHED_SHIFT, TODAY_NEXT_SHIFT
+
+
+class ShiftClock:
+    """حالة ورديات اليوم في الذاكرة: تُحمّل من قاعدة البيانات عند التغيير فقط، والنبضة حساب فقط
+
+    `reload()` reads the active shift, today's next scheduled shift and today's
+    last finished one in a single pass and parses their times once. `status()`
+    then only does datetime arithmetic, so a 1-second timer costs no queries.
+    The owner calls `reload()` on ShiftUpdated and `refresh_if_changed()` now
+    and then to pick up commits made elsewhere (PRAGMA data_version).
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.day: Optional[date] = None
+        self.data_version: Optional[int] = None
+        self.reloads = 0
+        self.active: Optional[Dict[str, Any]] = None
+        self.next_shift: Optional[Dict[str, Any]] = None
+        self.finished: Optional[Dict[str, Any]] = None
+        # Pre-parsed times (None when the stored value can't be parsed)
+        self.active_start: Optional[datetime] = None
+        self.active_end: Optional[datetime] = None
+        self.break_start: Optional[datetime] = None
+        self.break_planned_seconds = 0
+        self.next_start: Optional[datetime] = None
+
+    def reload(self) -> "ShiftClock":
+        """إعادة تحميل ورديات اليوم وتحليل أوقاتها مرة واحدة"""
+        today = date.today()
+        today_iso = today.strftime("%Y-%m-%d")
+        try:
+            self.data_version = self.db.get_data_version()
+            with self.db._pool.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute(ACTIVE_SHIFT)
+                active = cursor.fetchone()
+                cursor.execute(TODAY_NEXT_SHIFT, (today_iso,))
+                next_shift = cursor.fetchone()
+                cursor.execute(TODAY_FINISHED_SHIFT, (today_iso,))
+                finished = cursor.fetchone()
+        except Exception as e:
+            print(f"Error reloading shift clock: {e}")
+            return self
+
+        self.day = today
+        self.reloads += 1
+        self.active = dict(active) if active else None
+        self.next_shift = dict(next_shift) if next_shift else None
+        self.finished = dict(finished) if finished else None
+
+        self.active_start = self.active_end = self.break_start = None
+        self.break_planned_seconds = 0
+        if self.active:
+            self.active_start = self._parse_stamp(self.active.get('actual_start'))
+            # end_ts already has the overnight roll applied at insert time
+            self.active_end = self._from_epoch(self.active.get('end_ts'))
+            self.break_start = self._parse_stamp(self.active.get('break_start'))
+            self.break_planned_seconds = (self.active.get('break_planned_duration') or 0) * 60
+        self.next_start = None
+        if self.next_shift:
+            self.next_start = self._from_epoch(self.next_shift.get('start_ts'))
+        return self
+
+    @staticmethod
+    def _from_epoch(value: Optional[int]) -> Optional[datetime]:
+        return datetime.fromtimestamp(value) if value is not None else None
+
+    @staticmethod
+    def _parse_stamp(value: Optional[str]) -> Optional[datetime]:
+        try:
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return None
+
+    def refresh_if_changed(self) -> bool:
+        """إعادة التحميل فقط إذا حفظ اتصال آخر تغييرات منذ آخر تحميل"""
+        try:
+            changed = self.db.get_data_version() != self.data_version
+        except Exception as e:
+            print(f"Error checking data version: {e}")
+            return False
+        if changed:
+            self.reload()
+        return changed
+
+    def status(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """حالة الهيدر والتايمرات (نفس شكل get_dashboard_status) بالحساب فقط"""
+        now = now or datetime.now()
+        if self.day != now.date():
+            # First use, or midnight passed: "today's" shifts are different rows now
+            self.reload()
+
+        if self.active:
+            if self.active['break_active']:
+                if not self.break_start:
+                    return {"state": "BREAK", "elapsed_seconds": 0, "remaining_seconds": 0}
+                elapsed = int((now - self.break_start).total_seconds())
+                return {
+                    "state": "BREAK",
+                    "elapsed_seconds": elapsed,
+                    "remaining_seconds": self.break_planned_seconds - elapsed
+                }
+            if not self.active_start:
+                return {"state": "SHIFT_ACTIVE", "elapsed_seconds": 0, "remaining_seconds": 0}
+            remaining = int((self.active_end - now).total_seconds()) if self.active_end else 0
+            return {
+                "state": "SHIFT_ACTIVE",
+                "elapsed_seconds": int((now - self.active_start).total_seconds()),
+                "remaining_seconds": remaining
+            }
+
+        if self.finished and not self.next_shift:
+            return {"state": "FINISHED", "elapsed_seconds": 0, "remaining_seconds": 0}
+
+        if self.next_shift:
+            wait_seconds = int((self.next_start - now).total_seconds()) if self.next_start else 0
+            return {
+                "state": "NEXT_UPCOMING",
+                "scheduled_start": self.next_shift['scheduled_start'],
+                "wait_seconds": wait_seconds,
+                "elapsed_seconds": 0,
+                "remaining_seconds": 0
+            }
+
+        return {"state": "NO_SHIFT", "elapsed_seconds": 0, "remaining_seconds": 0}
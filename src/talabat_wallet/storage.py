@@ -0,0 +1,70 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """نمط إعدادات التخزين (PRAGMAs) المطبقة عند فتح كل اتصال"""
+    name: str
+    description: str = ""
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    mmap_size: int = 0
+    cache_size: int = -2000  # negative values are KiB, as in SQLite
+    temp_store: str = "DEFAULT"
+    page_size: int = 4096
+
+    def apply(self, conn: sqlite3.Connection, is_writer: bool = False) -> None:
+        """تطبيق الإعدادات على اتصال مفتوح"""
+        if is_writer:
+            # page_size only takes effect before the first table is created
+            if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                conn.execute(f"PRAGMA page_size = {int(self.page_size)}")
+            # journal_mode is persistent in the file, the writer sets it once
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+
+
+PROFILES: Dict[str, StorageProfile] = {
+    profile.name: profile for profile in (
+        StorageProfile(
+            name="phone-flash-friendly",
+            description="WAL + NORMAL sync, small cache; fewest fsyncs for Termux/flash storage",
+            synchronous="NORMAL",
+            mmap_size=16 * 1024 * 1024,
+            cache_size=-4000,
+            temp_store="MEMORY",
+        ),
+        StorageProfile(
+            name="desktop-fast",
+            description="WAL + NORMAL sync, large cache and mmap",
+            synchronous="NORMAL",
+            mmap_size=256 * 1024 * 1024,
+            cache_size=-64000,
+            temp_store="MEMORY",
+        ),
+        StorageProfile(
+            name="paranoid",
+            description="WAL + FULL sync, every commit is fsynced",
+            synchronous="FULL",
+            mmap_size=0,
+            cache_size=-2000,
+            temp_store="FILE",
+        ),
+    )
+}
+
+DEFAULT_PROFILE = "phone-flash-friendly"
+
+
+def get_profile(name: Optional[str] = None) -> StorageProfile:
+    """الحصول على نمط التخزين بالاسم (أو من متغير البيئة TALABAT_STORAGE_PROFILE)"""
+    name = name or os.environ.get("TALABAT_STORAGE_PROFILE") or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown storage profile '{name}'. Available: {', '.join(PROFILES)}")
+    return PROFILES[name]
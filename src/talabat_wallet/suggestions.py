@@ -0,0 +1,100 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# التشكيل وعلامات القرآن والتطويل: لا تغيّر الكلمة عند البحث
+_ARABIC_MARKS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+# توحيد أشكال الحروف التي يكتبها الناس بالتبادل، والأرقام الهندية
+_ARABIC_FOLD = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+# نصف عمر الحداثة: وصف استُخدم قبل شهر يساوي نصف وصف استُخدم اليوم
+HALF_LIFE_SECONDS = 30 * 24 * 3600
+
+
+def normalize_text(text: str) -> str:
+    """الشكل الموحّد للبحث: NFKC + حذف التشكيل + توحيد الألف/الياء/التاء المربوطة + حروف صغيرة"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(_ARABIC_MARKS.sub("", text).translate(_ARABIC_FOLD).casefold().split())
+
+
+class SuggestionIndex:
+    """فهرس اقتراحات أوصاف المصاريف في الذاكرة (مصفوفة مرتبة + bisect على الشكل الموحّد)
+
+    Built once from a GROUP BY over expenses, then kept current in place by
+    the expense writes. Matches are ranked by use count decayed by age, so a
+    frequent old description and a fresh new one both surface. Deleting an
+    expense lowers the count but keeps the last-used time.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, int, Optional[int]]] = ()):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[int]] = {}  # description -> [count, last_ts]
+        self._keys: List[Tuple[str, str]] = []  # sorted (normalized, description)
+        for description, count, last_ts in rows:
+            if description and description.strip():
+                self._stats[description] = [count, last_ts or 0]
+                self._keys.append((normalize_text(description), description))
+        self._keys.sort()
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def add(self, description: str, ts: Optional[int] = None, count: int = 1) -> None:
+        """تسجيل استخدام وصف (إضافة أو تعديل مصروف)"""
+        if not description or not description.strip():
+            return
+        ts = ts or int(time.time())
+        with self._lock:
+            entry = self._stats.get(description)
+            if entry is None:
+                self._stats[description] = [count, ts]
+                bisect.insort(self._keys, (normalize_text(description), description))
+            else:
+                entry[0] += count
+                entry[1] = max(entry[1], ts)
+
+    def remove(self, description: str, count: int = 1) -> None:
+        """إلغاء استخدام وصف (حذف أو تعديل مصروف)؛ يختفي الوصف عند وصول العدد للصفر"""
+        with self._lock:
+            entry = self._stats.get(description)
+            if entry is None:
+                return
+            entry[0] -= count
+            if entry[0] <= 0:
+                del self._stats[description]
+                key = (normalize_text(description), description)
+                i = bisect.bisect_left(self._keys, key)
+                if i < len(self._keys) and self._keys[i] == key:
+                    del self._keys[i]
+
+    def suggest(self, prefix: str = "", limit: int = 5, now: Optional[float] = None) -> List[str]:
+        """أفضل الأوصاف التي تبدأ بالبادئة (بعد التوحيد) حسب التكرار والحداثة"""
+        needle = normalize_text(prefix)
+        now = time.time() if now is None else now
+        with self._lock:
+            matches = []
+            for i in range(bisect.bisect_left(self._keys, (needle,)), len(self._keys)):
+                norm, description = self._keys[i]
+                if not norm.startswith(needle):
+                    break
+                count, last_ts = self._stats[description]
+                score = count * 0.5 ** (max(0.0, now - last_ts) / HALF_LIFE_SECONDS)
+                matches.append((score, last_ts, description))
+        best = []
+        seen = set()
+        # spellings that normalize the same are one suggestion (the best-ranked one)
+        for _, _, description in heapq.nlargest(limit * 2, matches):
+            norm = normalize_text(description)
+            if norm not in seen:
+                seen.add(norm)
+                best.append(description)
+        return best[:limit]
@@ -168,7 +168,10 @@ class AddOrderWindow(BaseWindow):
 
     def refresh_ui(self, settings: dict) -> None:
         """Reactive UI: Auto-update visibility when settings change globally."""
-        self.settings = settings
+        self.settings.update(settings)
+        if 'batch_prices' in settings:
+            self.batch_prices = settings['batch_prices']
+        self.current_batch = self.settings['batch']
         self.update_field_visibility()
         self.update_delivery_fee()
 
@@ -217,7 +220,7 @@ class AddOrderWindow(BaseWindow):
 
     async def submit_order(self) -> None:
         if not self.order_to_edit:
-            active_shift = self.db.get_active_shift()
+            active_shift = await self.db.aio.get_active_shift()
             if not active_shift:
                 self.notify(
                     "❌ Please start a shift first!",
@@ -312,21 +315,26 @@ class AddOrderWindow(BaseWindow):
             
             if self.order_to_edit:
                 order_dict['datetime'] = self.order_to_edit['datetime']
-                if await self.db.update_order(self.order_to_edit['id'], order_dict):
+                if await self.db.aio.update_order(self.order_to_edit['id'], order_dict):
                     self.notify("Order updated successfully!")
-                    # 🚀 Broadcast update
-                    self.post_message(self.OrderAdded())
+                    # 🚀 Broadcast the edited row (before, after)
+                    updated = await self.db.aio.get_order_by_id(self.order_to_edit['id'])
+                    balances = await self.db.aio.get_balances()
+                    self.post_message(self.DataChanged(
+                        "order", updated=[(self.order_to_edit, updated)], balances=balances
+                    ))
                     if self.callback:
                         self.callback()
                     self.close()
                 else:
                     self.notify("Error updating order", severity="error")
             else:
-                self.db.add_order(order_dict)
+                rows = await self.db.aio.insert_order(order_dict)
                 profit = AccountingEngine.calculate_profit(delivery_fee, order.tip_cash, order.tip_visa)
                 self.notify(f"Order added! Profit: {profit:.2f} EGP")
-                # 🚀 Broadcast update to all listeners (Wallet, Dashboard, etc.)
-                self.post_message(self.OrderAdded())
+                # 🚀 Broadcast the new rows to all listeners (Wallet, Dashboard, etc.)
+                balances = await self.db.aio.get_balances()
+                self.post_message(self.OrderAdded(rows, balances))
                 if self.callback:
                     self.callback()
                 self.close()
@@ -5,10 +5,11 @@ from textual.widgets import Button, Static, Label, Input, Select, DataTable, Lis
 from textual.strip import Strip
 from rich.segment import Segment
 from textual.containers import Horizontal
+from textual.widget import Widget
 from textual.reactive import reactive
 from textual.message import Message
 from textual import events
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, Any, List, Set
 from ..utils import format_arabic
 
 class CustomButton(Button):
@@ -86,7 +87,254 @@ class BatchDisplay(Static):
     
     def watch_batch(self, batch: str) -> None:
         """تحديث العرض عند تغيير الباتش"""
-class HistoryRow(ListItem):
+class VirtualRow(Widget):
+    """سطر قابل لإعادة الاستخدام داخل VirtualList (يُربط ببيانات جديدة بدل إعادة إنشائه)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.add_class("virtual-row")
+        self.item: Optional[Dict[str, Any]] = None
+        self.index = -1
+        self._text = ""
+
+    def bind(self, item: Dict[str, Any], index: int, selected: bool = False) -> None:
+        """ربط السطر بعنصر جديد وتحديث محتواه في مكانه"""
+        self.item = item
+        self.index = index
+        self.render_item(item, index, selected)
+
+    def render_item(self, item: Dict[str, Any], index: int, selected: bool) -> None:
+        """عرض العنصر؛ الأسطر الفعلية (HistoryRow وغيرها) تعيد تعريفها وتحدّث عناصرها الفرعية"""
+        # Plain fallback so a bare VirtualRow still shows something
+        self._text = str(item)
+        self.set_class(selected, "selected")
+        self.refresh()
+
+    def render(self) -> str:
+        return self._text
+
+    def on_click(self, event: events.Click) -> None:
+        if isinstance(self.parent, VirtualList) and self.index >= 0:
+            self.parent.select_index(self.index)
+
+
+class VirtualList(Widget, can_focus=True):
+    """قائمة افتراضية: تعرض الصفوف الظاهرة فقط وتعيد استخدام نفس الـ widgets عند التمرير"""
+
+    # Handled in on_key (not BINDINGS) so arrows never reach BaseWindow.on_key, which moves the window
+    KEY_ACTIONS = {
+        "up": "cursor_up",
+        "down": "cursor_down",
+        "pageup": "page_up",
+        "pagedown": "page_down",
+        "home": "first",
+        "end": "last",
+        "enter": "select",
+    }
+
+    class Selected(Message):
+        """رسالة عند اختيار صف (Enter أو نقرة)"""
+        def __init__(self, virtual_list: "VirtualList", item: Dict[str, Any], index: int):
+            super().__init__()
+            self.virtual_list = virtual_list
+            self.item = item
+            self.index = index
+
+        @property
+        def control(self) -> "VirtualList":
+            return self.virtual_list
+
+    class NearEnd(Message):
+        """رسالة عند اقتراب العرض من آخر عنصر محمّل (لتحميل الصفحة التالية)"""
+        def __init__(self, virtual_list: "VirtualList"):
+            super().__init__()
+            self.virtual_list = virtual_list
+
+        @property
+        def control(self) -> "VirtualList":
+            return self.virtual_list
+
+    def __init__(self, row_factory: Callable[[], VirtualRow], max_rows: Optional[int] = None,
+                 row_height: int = 1, prefetch: int = 10,
+                 key: Optional[Callable[[Dict[str, Any]], Any]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.row_factory = row_factory
+        self.max_rows = max_rows  # fixed pool for height: auto lists
+        self.row_height = row_height
+        self.prefetch = prefetch
+        self.key = key or (lambda item: item.get('id'))
+        self.items: List[Dict[str, Any]] = []
+        self.selected: Set[Any] = set()
+        self.top = 0
+        self.cursor: Optional[int] = None
+        self._rows: List[VirtualRow] = []
+
+    @property
+    def page_size(self) -> int:
+        """عدد الصفوف الظاهرة (= عدد الـ widgets الفعلية)"""
+        if self.max_rows is not None:
+            return min(len(self.items), self.max_rows)
+        return min(len(self.items), max(self.size.height // self.row_height, 1))
+
+    def on_mount(self) -> None:
+        self._sync()
+
+    def on_resize(self, event: events.Resize) -> None:
+        self._sync()
+
+    def _sync(self) -> None:
+        """ضبط عدد الصفوف حسب المساحة ثم ربطها بالعناصر الظاهرة"""
+        if not self.is_mounted:
+            return
+        count = self.page_size
+        self.top = max(0, min(self.top, len(self.items) - count))
+        # the pool only grows or shrinks when the viewport (or a short list) changes size
+        if len(self._rows) < count:
+            new_rows = [self.row_factory() for _ in range(count - len(self._rows))]
+            self._rows.extend(new_rows)
+            self.mount(*new_rows)
+        elif len(self._rows) > count:
+            for row in self._rows[count:]:
+                row.remove()
+            del self._rows[count:]
+        for position, row in enumerate(self._rows):
+            self._bind(row, self.top + position)
+        if count and self.top + count >= len(self.items) - self.prefetch:
+            self.post_message(self.NearEnd(self))
+
+    def _bind(self, row: VirtualRow, index: int) -> None:
+        item = self.items[index]
+        row.bind(item, index, self.key(item) in self.selected)
+        row.set_class(index == self.cursor, "-highlight")
+
+    # Data
+
+    def set_items(self, items: List[Dict[str, Any]], reset: bool = True) -> None:
+        """استبدال العناصر (reset=False يحافظ على موضع التمرير والمؤشر)"""
+        self.items = list(items)
+        if reset:
+            self.top = 0
+            self.cursor = None
+        elif self.cursor is not None and self.cursor >= len(self.items):
+            self.cursor = len(self.items) - 1 if self.items else None
+        self._sync()
+
+    def extend(self, items: List[Dict[str, Any]]) -> None:
+        """إلحاق عناصر جديدة في النهاية (الصفحة التالية)"""
+        self.items.extend(items)
+        self._sync()
+
+    def clear(self) -> None:
+        self.set_items([])
+
+    def index_of(self, key: Any) -> Optional[int]:
+        for index, item in enumerate(self.items):
+            if self.key(item) == key:
+                return index
+        return None
+
+    def insert(self, index: int, item: Dict[str, Any]) -> None:
+        """إدراج عنصر في موضع محدد (المؤشر يبقى على نفس العنصر)"""
+        self.items.insert(index, item)
+        if self.cursor is not None and index <= self.cursor:
+            self.cursor += 1
+        self._sync()
+
+    def replace(self, item: Dict[str, Any]) -> bool:
+        """استبدال عنصر بنفس المفتاح وإعادة رسم سطره فقط"""
+        key = self.key(item)
+        index = self.index_of(key)
+        if index is None:
+            return False
+        self.items[index] = item
+        self.refresh_key(key)
+        return True
+
+    def remove_keys(self, keys) -> None:
+        """حذف العناصر بالمفاتيح المعطاة"""
+        keys = set(keys)
+        self.items = [item for item in self.items if self.key(item) not in keys]
+        self.selected.difference_update(keys)
+        if self.cursor is not None and self.cursor >= len(self.items):
+            self.cursor = len(self.items) - 1 if self.items else None
+        self._sync()
+
+    def refresh_key(self, key: Any) -> None:
+        """إعادة رسم سطر واحد في مكانه إذا كان ظاهراً"""
+        for row in self._rows:
+            if row.item is not None and self.key(row.item) == key:
+                self._bind(row, row.index)
+
+    def toggle_selected(self, key: Any) -> bool:
+        """تبديل تحديد عنصر وتحديث سطره فقط"""
+        if key in self.selected:
+            self.selected.discard(key)
+        else:
+            self.selected.add(key)
+        self.refresh_key(key)
+        return key in self.selected
+
+    # Navigation
+
+    def scroll_rows(self, delta: int) -> None:
+        self.top += delta
+        self._sync()
+
+    def move_cursor(self, index: int) -> None:
+        if not self.items:
+            return
+        self.cursor = max(0, min(index, len(self.items) - 1))
+        count = self.page_size
+        if self.cursor < self.top:
+            self.top = self.cursor
+        elif self.cursor >= self.top + count:
+            self.top = self.cursor - count + 1
+        self._sync()
+
+    def select_index(self, index: int) -> None:
+        self.move_cursor(index)
+        if self.cursor is not None:
+            self.post_message(self.Selected(self, self.items[self.cursor], self.cursor))
+
+    async def on_key(self, event: events.Key) -> None:
+        action = self.KEY_ACTIONS.get(event.key)
+        if action:
+            event.stop()
+            event.prevent_default()
+            await self.run_action(action)
+
+    def on_mouse_scroll_down(self, event: events.MouseScrollDown) -> None:
+        self.scroll_rows(2)
+        event.stop()
+
+    def on_mouse_scroll_up(self, event: events.MouseScrollUp) -> None:
+        self.scroll_rows(-2)
+        event.stop()
+
+    def action_cursor_down(self) -> None:
+        self.move_cursor(self.top if self.cursor is None else self.cursor + 1)
+
+    def action_cursor_up(self) -> None:
+        self.move_cursor(self.top if self.cursor is None else self.cursor - 1)
+
+    def action_page_down(self) -> None:
+        self.move_cursor((self.cursor or self.top) + self.page_size)
+
+    def action_page_up(self) -> None:
+        self.move_cursor((self.cursor or self.top) - self.page_size)
+
+    def action_first(self) -> None:
+        self.move_cursor(0)
+
+    def action_last(self) -> None:
+        self.move_cursor(len(self.items) - 1)
+
+    def action_select(self) -> None:
+        if self.cursor is not None:
+            self.select_index(self.cursor)
+
+
+class HistoryRow(VirtualRow):
     """سطر تاريخ يحتوي على زر حقيقي للاختيار"""
     
     class ToggleSelection(Message):
@@ -95,39 +343,47 @@ class HistoryRow(ListItem):
             super().__init__()
             self.order_id = order_id
 
-    def __init__(self, order: Dict[str, Any], display_id: int, is_selected: bool = False, **kwargs):
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.order = order
-        self.display_id = display_id
-        self.is_selected = is_selected
-        self.order_id = str(order.get('id', ''))
+        self.order: Dict[str, Any] = {}
+        self.order_id = ""
+        self.display_id = 0
+        # استخدام Label بدل Button للتحكم الكامل في العرض بدون أي مسافات زائدة
+        self.sel_label = Label("[ ]", classes="row-sel-toggle")
+        self.id_label = Label("", classes="col-id")
+        self.date_label = Label("", classes="col-date")
+        self.type_label = Label("", classes="col-type")
+        self.profit_label = Label("", classes="col-profit")
 
     def compose(self):
         with Horizontal(classes="history-row-content"):
-            # استخدام Label بدل Button للتحكم الكامل في العرض بدون أي مسافات زائدة
-            btn_text = "[●]" if self.is_selected else "[ ]"
-            yield Label(btn_text, id=f"sel-{self.order_id}", classes="row-sel-toggle " + ("selected" if self.is_selected else ""))
-            
+            yield self.sel_label
             # بيانات السطر
-            yield Label(str(self.display_id), classes="col-id")
-            yield Label(self.order.get('datetime', '')[:10], classes="col-date")
-            yield Label(format_arabic(self.order.get('order_type', '')), classes="col-type")
-            
-            profit = (self.order.get('delivery_fee', 0) + 
-                     self.order.get('tip_cash', 0) + 
-                     self.order.get('tip_visa', 0))
-            yield Label(f"{profit:.2f}", classes="col-profit")
+            yield self.id_label
+            yield self.date_label
+            yield self.type_label
+            yield self.profit_label
+
+    def render_item(self, order: Dict[str, Any], index: int, selected: bool) -> None:
+        self.order = order
+        self.order_id = str(order.get('id', ''))
+        self.display_id = index + 1
+        self.sel_label.update("[●]" if selected else "[ ]")
+        self.sel_label.set_class(selected, "selected")
+        self.id_label.update(str(self.display_id))
+        self.date_label.update(order.get('datetime', '')[:10])
+        self.type_label.update(format_arabic(order.get('order_type', '')))
+        profit = (order.get('delivery_fee', 0) + 
+                 order.get('tip_cash', 0) + 
+                 order.get('tip_visa', 0))
+        self.profit_label.update(f"{profit:.2f}")
 
     def on_click(self, event: events.Click) -> None:
-        # إذا كانت الضغطة على المربع (Label [ ])
-        # نستخدم event.control أو id للوصول الدقيق
-        if event.control and event.control.id == f"sel-{self.order_id}":
-            self.post_message(self.ToggleSelection(self.order_id))
-            event.stop() # منع وصول الضغطة للـ ListView
-            event.prevent_default()
-        elif "row-sel-toggle" in event.style.meta.get("classes", []):
+        # الضغط على المربع يبدّل التحديد فقط ولا يفتح التفاصيل
+        if event.widget is self.sel_label:
             self.post_message(self.ToggleSelection(self.order_id))
             event.stop()
+            # prevent_default keeps VirtualRow.on_click from opening the details
             event.prevent_default()
 
 
@@ -4,7 +4,10 @@ from textual.containers import Container, Horizontal, Vertical, Grid
 from textual.widgets import Header, Static
 from textual import events, on
 from datetime import datetime
+from typing import Optional
 from ..database import Database
+from ..deadlines import DeadlineScheduler
+from ..shift_clock import ShiftClock
 from ..utils import format_arabic
 from .components import CustomButton, WalletDisplay, ModeDisplay, BatchDisplay
 # Import base window only
@@ -13,10 +16,19 @@ from .window import BaseWindow
 class DashboardScreen(Screen):
     """شاشة لوحة التحكم الرئيسية (MDI Version)"""
     
+    # ⏱️ How often to look for commits made outside the app (cheap PRAGMA, no table reads)
+    EXTERNAL_CHECK_SECONDS = 5
+    # ⏰ Longest single sleep before re-checking deadlines (survives suspend / clock changes)
+    MAX_DEADLINE_SLEEP = 300
+
     def __init__(self):
         super().__init__()
         self.db = Database()
         self.settings = self.db.get_settings()
+        self.clock = ShiftClock(self.db)
+        self.deadlines = DeadlineScheduler(self.db)
+        self._deadline_timer = None
+        self._unsubscribe_settings = None
         
     def compose(self) -> ComposeResult:
         """بناء الواجهة"""
@@ -47,15 +59,78 @@ class DashboardScreen(Screen):
                     yield CustomButton("Settings", id="btn_settings")
                     yield CustomButton("Exit", id="btn_exit")
 
-    def on_mount(self) -> None:
+    async def on_mount(self) -> None:
         """تهيئة الشاشة"""
-        self.db.check_auto_updates()
+        report = self.db.migration_report
+        if report['applied']:
+            self.notify(f"Database upgraded to v{report['to_version']} in {report['elapsed_ms']:.0f} ms")
+        self.clock.reload()
         self.update_wallets()
         self.update_stats()
         self.update_shift_status()
+        # ⏱️ The 1 s tick is arithmetic on the clock; the DB is only read on change
         self.set_interval(1, self.update_shift_status)
-        self.set_interval(60, self.db.check_auto_updates)
-        pass
+        self.set_interval(self.EXTERNAL_CHECK_SECONDS, self.check_external_changes)
+        # ⏰ Overdue transitions (app was closed) fire right away, the rest on time
+        self.arm_deadlines()
+        # 💰 Wallets, mode and batch follow the SettingsStore, whoever wrote them
+        self._unsubscribe_settings = self.db.settings_store.subscribe(self._on_settings_changed)
+        # 📒 Ledger check off the UI thread; drift is reported, repair is a Database tool
+        self.run_worker(self.check_ledger())
+
+    def on_unmount(self) -> None:
+        if self._unsubscribe_settings:
+            self._unsubscribe_settings()
+            self._unsubscribe_settings = None
+
+    def _on_settings_changed(self, changes: dict) -> None:
+        """مستمع SettingsStore: قد يُستدعى من خيط الكتابة، وpost_message آمن بين الخيوط"""
+        self.post_message(BaseWindow.GlobalSettingsChanged(changes))
+
+    async def check_ledger(self) -> None:
+        """فحص الدفتر عند البدء والتنبيه عند وجود انحراف"""
+        report = await self.db.aio.run(self.db.verify_ledger, write=False)
+        if report['issues']:
+            self.notify(
+                f"Ledger drift: {report['issues']} stored totals differ from the orders. "
+                "Settings › Database › Verify Ledger repairs them.",
+                severity="warning", timeout=10
+            )
+
+    def check_external_changes(self) -> None:
+        """مزامنة الساعة والمواعيد إذا حُفظت تغييرات من خارج التطبيق"""
+        if self.clock.refresh_if_changed():
+            self.arm_deadlines()
+        # Another process moved the wallets / settings: the store reloads and notifies
+        self.db.settings_store.sync()
+
+    def arm_deadlines(self) -> None:
+        """إعادة بناء مواعيد الانتقالات وضبط المؤقت على أقربها"""
+        self.deadlines.rearm()
+        self._schedule_next_deadline()
+
+    def _schedule_next_deadline(self) -> None:
+        if self._deadline_timer is not None:
+            self._deadline_timer.stop()
+            self._deadline_timer = None
+        delay = self.deadlines.seconds_until_next()
+        if delay is not None:
+            self._deadline_timer = self.set_timer(min(delay, self.MAX_DEADLINE_SLEEP), self.fire_deadlines)
+
+    def fire_deadlines(self) -> None:
+        """تنفيذ الانتقالات المستحقة (انتهاء استراحة، إنهاء تلقائي، غياب) وبثّها"""
+        self._deadline_timer = None
+        results = self.deadlines.fire_due()
+        if not results['changed']:
+            self._schedule_next_deadline()
+            return
+        if results['ended_shift']:
+            self.notify("Shift ended automatically", severity="warning")
+        elif results['break_ended']:
+            self.notify("Break is over!")
+        rows = [self.db.get_shift_summary(shift_id) for shift_id in results['changed']]
+        # 🚀 Broadcast: re-arms the deadlines and reloads the clock on the way through
+        self.post_message(BaseWindow.ShiftUpdated([r for r in rows if r]))
 
     @on(BaseWindow.WindowResized)
     def handle_window_resize_msg(self, event: BaseWindow.WindowResized) -> None:
@@ -65,26 +140,41 @@ class DashboardScreen(Screen):
     @on(BaseWindow.OrderAdded)
     @on(BaseWindow.DataChanged)
     @on(BaseWindow.ShiftUpdated)
-    async def handle_data_update(self, event=None) -> None:
+    def handle_data_update(self, event=None) -> None:
         """Update dashboard stats instantly when data is modified in a window"""
+        if getattr(event, "fanned_out", False):
+            return  # a peer's forwarded copy bubbling back up
+        if event is None or isinstance(event, BaseWindow.ShiftUpdated) or event.is_full:
+            # Shift rows may have moved: rebuild the clock and deadlines once, ticks stay query-free
+            self.clock.reload()
+            self.update_shift_status()
+            self.arm_deadlines()
         # 🏎️ Optimize: Debounce stats update
         self.set_timer(0.2, self.update_stats)
-        self.update_wallets()
+        if event is None:
+            # called directly as a window callback, nothing to forward
+            self.update_wallets()
+            return
+        # Wallet displays follow the SettingsStore notification for the same commit
         
         # 📣 Forward to ALL open windows so they refresh siblings
-        sender = getattr(event, "sender", None)
+        # (the poster already handled it; a second delta would apply twice)
+        event.fanned_out = True
+        sender = getattr(event, "_sender", None)
         for window in self.query(BaseWindow):
             if window != sender:
                 window.post_message(event)
 
     @on(BaseWindow.GlobalSettingsChanged)
     def handle_settings_update(self, event: BaseWindow.GlobalSettingsChanged) -> None:
-        """Reactive UI: Handle settings changes (mode, batch) instantly"""
-        self.settings = event.settings
-        self.update_stats()
+        """Reactive UI: Handle settings changes (mode, batch, wallets, prices) from the SettingsStore"""
+        if getattr(event, "fanned_out", False):
+            return
+        event.fanned_out = True
+        self.update_wallets(event.settings)
         
         # 📣 Forward to peers
-        sender = getattr(event, "sender", None)
+        sender = getattr(event, "_sender", None)
         for window in self.query(BaseWindow):
             if window != sender:
                 window.post_message(event)
@@ -94,7 +184,7 @@ class DashboardScreen(Screen):
     
     def update_shift_status(self) -> None:
         """تحديث نص حالة الوردية والمؤقت في الهيدر"""
-        data = self.db.get_dashboard_status()
+        data = self.clock.status()
         status_widget = self.query_one("#shift-status-header")
         state = data.get('state')
         
@@ -187,7 +277,7 @@ class DashboardScreen(Screen):
              self.open_window(SettingsWindow(self.db, callback=self.handle_data_update, focus_section="batch"))
         elif widget_id == "shift-status-header":
              from .shift import ShiftDetailsWindow, DayShiftsWindow
-             status = self.db.get_dashboard_status()
+             status = self.clock.status()
              state = status.get('state')
              from datetime import date
              
@@ -246,9 +336,12 @@ class DashboardScreen(Screen):
              
         self.handle_data_update()
 
-    def update_wallets(self) -> None:
-        """تحديث عرض المحافظ"""
-        self.settings = self.db.get_settings()
+    def update_wallets(self, changes: Optional[dict] = None) -> None:
+        """تحديث عرض المحافظ (من حمولة الحدث إن وجدت، وإلا من SettingsStore)"""
+        if changes:
+            self.settings.update(changes)
+        else:
+            self.settings = self.db.get_settings()
         self.query_one("#personal-wallet").value = self.settings['personal_wallet']
         
         cw = self.query_one("#company-wallet")
@@ -272,7 +365,7 @@ class DashboardScreen(Screen):
             today_profit = sum(o['delivery_fee'] + o['tip_cash'] + o['tip_visa'] for o in today_orders)
             
             # Determine active shift stats if available
-            status_data = self.db.get_dashboard_status()
+            status_data = self.clock.status()
             shift_info = ""
             if status_data.get('state') == 'SHIFT_ACTIVE':
                  # Calculate elapsed time in simple terms
@@ -1,6 +1,8 @@
+import bisect
+import inspect
 from textual.app import ComposeResult
 from textual.containers import Container, Horizontal, Vertical
-from textual.widgets import Button, Static, ListView, Label, ListItem
+from textual.widgets import Button, Static, Label
 from textual.reactive import reactive
 from textual import events, on
 from textual.message import Message
@@ -8,7 +10,7 @@ from textual.message import Message
 from ..database import Database
 from ..utils import format_arabic
 from .window import BaseWindow
-from .components import CustomButton, OptionSelector, HistoryRow
+from .components import CustomButton, OptionSelector, HistoryRow, VirtualList
 
 class OrderDetailsWindow(BaseWindow):
     WINDOW_ID = "order_details"
@@ -108,6 +110,8 @@ class SettlementDetailsWindow(BaseWindow):
 class OrderHistoryWindow(BaseWindow):
     WINDOW_ID = "order_history"
     """نافذة سجل الطلبات (MDI)"""
+    PAGE_SIZE = 50
+    PREFETCH_ROWS = 10  # load the next page this many rows before the end
     
     def __init__(self, db: Database, chart_only=False):
         if chart_only:
@@ -119,6 +123,10 @@ class OrderHistoryWindow(BaseWindow):
         self.selected_ids = set()
         self.filter_type = "All"
         self.filter_period = "All"
+        self._cursor = None  # (ts, id) of the last loaded order
+        self._has_more = True
+        self._loading = False
+        self._generation = 0  # bumped by every reload; older in-flight pages are dropped
 
     def compose_content(self) -> ComposeResult:
         with Vertical(id="filter-section"):
@@ -143,7 +151,12 @@ class OrderHistoryWindow(BaseWindow):
                 yield Label("Type", classes="col-type")
                 yield Label("Profit", classes="col-profit")
             
-            self.history_list = ListView(id="history-list")
+            self.history_list = VirtualList(
+                HistoryRow, prefetch=self.PREFETCH_ROWS,
+                key=lambda order: str(order['id']), id="history-list"
+            )
+            # the list and the window share one selection set
+            self.history_list.selected = self.selected_ids
             yield self.history_list
             yield Static("No orders found", id="no-orders-msg", classes="no-data-msg hidden")
             
@@ -160,9 +173,33 @@ class OrderHistoryWindow(BaseWindow):
     # 🚀 REAL-TIME UPDATES: Listen for changes elsewhere
     @on(BaseWindow.OrderAdded)
     @on(BaseWindow.DataChanged)
-    async def handle_data_update(self) -> None:
-        """Debounced load to prevent freezes during rapid data changes."""
-        self.set_timer(0.3, self._do_load_data)
+    async def handle_data_update(self, event: BaseWindow.DataChanged) -> None:
+        """Patch the loaded rows from the event; only bare events reload."""
+        if event.is_full:
+            # Debounced load to prevent freezes during rapid data changes
+            self.set_timer(0.3, self._do_load_data)
+        elif event.entity == "order":
+            self.apply_order_changes(event)
+
+    def apply_order_changes(self, event: BaseWindow.DataChanged) -> None:
+        """تطبيق الإضافات/التعديلات/الحذف على القائمة المحمّلة دون استعلام"""
+        gone = event.deleted + [before for before, _ in event.updated]
+        self.history_list.remove_keys(str(row['id']) for row in gone)
+        for order in [after for _, after in event.updated] + event.added:
+            if self.db.order_matches(order, self.filter_type, self.filter_period):
+                self._insert_sorted(order)
+        self.query_one("#no-orders-msg").set_class(bool(self.history_list.items), "hidden")
+        self.update_delete_button()
+
+    def _insert_sorted(self, order: dict) -> None:
+        # the list is ordered by (ts, id) DESC, same as get_orders_page
+        if self.history_list.index_of(str(order['id'])) is not None:
+            return
+        rank = lambda row: (-(row['ts'] or 0), -row['id'])
+        index = bisect.bisect_left(self.history_list.items, rank(order), key=rank)
+        if index == len(self.history_list.items) and self._has_more:
+            return  # falls in a page that is not loaded yet
+        self.history_list.insert(index, order)
 
     async def on_option_selector_selected(self, message: OptionSelector.Selected) -> None:
         if message.selector.id == "filter-type":
@@ -172,42 +209,62 @@ class OrderHistoryWindow(BaseWindow):
         await self.load_data()
 
     async def load_data(self) -> None:
+        """إعادة التحميل من أول صفحة (الأحدث)"""
         # Safety check: ensure history_list is composed
         try:
             list_view = self.query_one("#history-list")
         except:
             return
 
-        # Pass filter directly to DB which now handles it correctly
-        try:
-            orders = self.db.get_all_orders(limit=100, order_type=self.filter_type, period=self.filter_period)
-        except Exception as e:
-            orders = []
-            self.notify(f"Error loading orders: {e}")
+        self._generation += 1
+        self._cursor = None
+        self._has_more = True
+        self._loading = False  # a page still loading for the old filter no longer counts
+        list_view.clear()
+        await self.load_more()
         
-        await list_view.clear()
-        
-        if not orders:
+        if not list_view.items:
             self.query_one("#no-orders-msg").remove_class("hidden")
-            return
         else:
             self.query_one("#no-orders-msg").add_class("hidden")
+
+    async def load_more(self) -> None:
+        """تحميل الصفحة التالية (ترقيم Keyset) وإلحاقها بالقائمة"""
+        if self._loading or not self._has_more:
+            return
+        self._loading = True
+        generation = self._generation
+        try:
+            try:
+                orders = await self.db.aio.get_orders_page(
+                    after=self._cursor, page_size=self.PAGE_SIZE,
+                    order_type=self.filter_type, period=self.filter_period
+                )
+            except Exception as e:
+                orders = []
+                self.notify(f"Error loading orders: {e}")
+            if generation != self._generation:
+                return  # the filter changed while this page loaded: stale rows, stale cursor
             
-        to_mount = []
-        for idx, order in enumerate(orders, 1):
-            is_selected = str(order['id']) in self.selected_ids
-            to_mount.append(HistoryRow(order, display_id=idx, is_selected=is_selected))
+            self._has_more = len(orders) == self.PAGE_SIZE
+            if not orders:
+                return
+            self._cursor = (orders[-1]['ts'], orders[-1]['id'])
             
-        if to_mount:
-            await list_view.mount(*to_mount)
+            # rows are only data here; the list rebinds its few visible widgets
+            self.history_list.extend(orders)
+        finally:
+            if generation == self._generation:
+                self._loading = False
+
+    def on_virtual_list_near_end(self, event: VirtualList.NearEnd) -> None:
+        if self._loading or not self._has_more:
+            return
+        self.call_later(self.load_more)
 
-    async def on_history_row_toggle_selection(self, message: HistoryRow.ToggleSelection) -> None:
-        order_id = message.order_id
-        if order_id in self.selected_ids:
-            self.selected_ids.remove(order_id)
-        else:
-            self.selected_ids.add(order_id)
-        await self.load_data()
+    def on_history_row_toggle_selection(self, message: HistoryRow.ToggleSelection) -> None:
+        # only the toggled row is redrawn, no reload
+        self.history_list.toggle_selected(message.order_id)
         self.update_delete_button()
 
     def update_delete_button(self):
@@ -215,28 +272,24 @@ class OrderHistoryWindow(BaseWindow):
         count = len(self.selected_ids)
         btn.label = f"Delete ({count})" if count > 0 else "Delete"
 
-    async def on_list_view_selected(self, event: ListView.Selected) -> None:
-        if event.item is None: return
-        row = event.item
-        if not hasattr(row, "order_id"): return
-        
-        order_id = row.order_id
-        display_id = row.display_id
+    async def on_virtual_list_selected(self, event: VirtualList.Selected) -> None:
+        if event.control is not self.history_list: return
+        order_id = str(event.item['id'])
+        display_id = event.index + 1
         
         if order_id in self.selected_ids:
-            self.selected_ids.remove(order_id)
+            self.history_list.toggle_selected(order_id)
             self.update_delete_button()
             
-        order = self.db.get_order_by_id(int(order_id))
+        order = await self.db.aio.get_order_by_id(int(order_id))
         if order:
-            await self.load_data()
             if hasattr(self.app.screen, "open_window"):
                 if order.get('mode') == 'TIP':
                     self.app.screen.open_window(TipDetailsWindow(order, display_id))
                 elif order.get('mode') == 'SETTLEMENT':
                     self.app.screen.open_window(SettlementDetailsWindow(order, display_id))
                 else:
-                    self.app.screen.open_window(OrderDetailsWindow(order, display_id, self.db, self._do_load_data))
+                    self.app.screen.open_window(OrderDetailsWindow(order, display_id, self.db))
 
     async def on_button_pressed(self, event: CustomButton.Pressed) -> None:
         if event.button.id == "close-window":
@@ -252,16 +305,14 @@ class OrderHistoryWindow(BaseWindow):
         if hasattr(self.app.screen, "open_window"):
              self.app.screen.open_window(ConfirmModal(f"Delete {len(self.selected_ids)} orders?", self.perform_delete))
 
-    def perform_delete(self):
-        count = 0
-        for oid in list(self.selected_ids):
-            if self.db.delete_order(int(oid)):
-                count += 1
+    async def perform_delete(self):
+        # one transaction: wallet, shift and daily deltas summed in SQL and applied once
+        deleted = await self.db.aio.delete_orders(int(order_id) for order_id in self.selected_ids)
         self.selected_ids.clear()
-        self.notify(f"Deleted {count} orders")
-        # 🚀 Broadcast update
-        self.post_message(self.DataChanged())
-        self.load_data()
+        self.notify(f"Deleted {len(deleted)} orders")
+        # 🚀 Broadcast the removed rows; this window patches itself from the same event
+        balances = await self.db.aio.get_balances()
+        self.post_message(self.DataChanged("order", deleted=deleted, balances=balances))
         self.update_delete_button()
 
 class AnalysisWindow(BaseWindow):
@@ -278,11 +329,11 @@ class AnalysisWindow(BaseWindow):
                 yield CustomButton("Close", id="close-analysis")
 
     def on_mount(self) -> None:
-        self.refresh_analysis()
+        self.call_after_refresh(self.refresh_analysis)
 
-    def refresh_analysis(self) -> None:
+    async def refresh_analysis(self) -> None:
         try:
-            stats = self.db.get_analysis_stats()
+            stats = await self.db.aio.get_analysis_stats()
             # Simple summary for now, can be expanded
             content = f"""
 [b green]Financial Summary[/b green]
@@ -314,9 +365,12 @@ class ConfirmModal(BaseWindow):
             yield CustomButton("YES", id="ok", classes="button-out")
             yield CustomButton("NO", id="cancel")
     
-    def on_button_pressed(self, event: Button.Pressed) -> None:
+    async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "ok":
-            if self.callback: self.callback()
+            if self.callback:
+                result = self.callback()
+                if inspect.isawaitable(result):
+                    await result
             self.remove()
         else:
             self.remove()
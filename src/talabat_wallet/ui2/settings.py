@@ -1,6 +1,7 @@
 from textual.app import ComposeResult
 from textual.containers import Container, Horizontal, Vertical, Grid
-from textual.widgets import Button, Static
+from textual.widgets import Button, Static, ProgressBar
+from textual.message import Message
 from textual import events
 from ..database import Database
 from .components import CustomButton, OptionSelector, ArabicInput
@@ -44,19 +45,128 @@ class DatabaseSettingsWindow(BaseWindow):
     def compose_content(self) -> ComposeResult:
         with Vertical(id="settings-content"):
             yield Static("\nDatabase Tools\n", classes="section-header")
+            with Vertical(classes="mgmt-group"):
+                yield Static("Recalculate analysis totals from all orders?")
+                yield CustomButton("Rebuild Stats", id="rebuild-stats")
+            with Vertical(classes="mgmt-group"):
+                yield Static("Check the company wallet and shift totals against the orders, and fix any drift?")
+                yield CustomButton("Verify Ledger", id="verify-ledger")
+            with Vertical(classes="mgmt-group"):
+                yield Static("Load orders from a CSV / JSONL export?")
+                yield CustomButton("Import Orders", id="import-orders")
             with Vertical(classes="mgmt-group"):
                 yield Static("Permanently delete everything?")
                 yield CustomButton("Reset Database", id="reset-db")
+            yield Static("", id="queue-stats")
             with Horizontal(id="dialog-buttons"):
                 yield CustomButton("Back", id="back")
 
+    def on_mount(self) -> None:
+        stats = self.db.aio.queue_stats()
+        self.query_one("#queue-stats").update(
+            f"Write queue: {stats['completed']} writes in {stats['batches']} commits, "
+            f"avg {stats['avg_latency_ms']:.1f} ms, {stats['throughput_per_sec']:.1f}/s"
+        )
+
     async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "reset-db":
              if hasattr(self.app.screen, "open_window"):
                  self.app.screen.open_window(ConfirmResetWindow(self.db, self.callback))
+        elif event.button.id == "import-orders":
+            if hasattr(self.app.screen, "open_window"):
+                self.app.screen.open_window(ImportOrdersWindow(self.db))
+        elif event.button.id == "rebuild-stats":
+            if await self.db.aio.run(self.db.rebuild_daily_stats):
+                # 🚀 Broadcast refreshed totals
+                self.post_message(self.DataChanged())
+                self.notify("Stats rebuilt!")
+            else:
+                self.notify("Failed to rebuild stats", severity="error")
+        elif event.button.id == "verify-ledger":
+            report = await self.db.aio.run(self.db.verify_ledger, True, write=False)
+            if 'error' in report:
+                self.notify("Failed to verify ledger", severity="error")
+            elif report['repaired']:
+                # 🚀 Broadcast corrected totals
+                self.post_message(self.DataChanged())
+                self.notify(f"Ledger repaired: {report['issues']} values fixed")
+            else:
+                self.notify(f"Ledger OK ({report['orders']} orders, {report['elapsed_ms']:.0f} ms)")
         elif event.button.id == "back":
             self.close()
 
+class ImportOrdersWindow(BaseWindow):
+    WINDOW_ID = "import_orders"
+    """استيراد الطلبات من ملف CSV أو JSONL"""
+
+    class Progress(Message):
+        """Posted from the import thread after every committed chunk."""
+        def __init__(self, report: dict):
+            self.report = report
+            super().__init__()
+
+    def __init__(self, db):
+        super().__init__(title="IMPORT ORDERS", width=65)
+        self.db = db
+        self.running = False
+
+    def compose_content(self) -> ComposeResult:
+        with Vertical(id="settings-content"):
+            yield Static("File (.csv with a header row, or .jsonl):")
+            yield ArabicInput(placeholder="orders.csv", id="import-path", required=True)
+            yield ProgressBar(total=100, show_eta=False, id="import-progress")
+            yield Static("", id="import-report")
+            with Horizontal(id="dialog-buttons"):
+                yield CustomButton("Import", id="start-import")
+                yield CustomButton("Close", id="close-import")
+
+    async def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "start-import":
+            # A worker, so this window's queue stays free to show Progress messages
+            self.run_worker(self.start_import(), exclusive=True)
+        elif event.button.id == "close-import":
+            self.close()
+
+    async def start_import(self) -> None:
+        from pathlib import Path
+        from ..importer import import_orders
+        if self.running:
+            return
+        path = Path(self.query_one("#import-path").value.strip()).expanduser()
+        if not path.is_file():
+            self.notify(f"File not found: {path}", severity="error")
+            return
+        self.running = True
+        try:
+            # 🧵 Chunks commit on a reader thread, each in its own write transaction,
+            # so the group-commit queue keeps serving the UI in between
+            report = await self.db.aio.run(
+                import_orders, self.db, str(path), progress=lambda r: self.post_message(self.Progress(r)), write=False
+            )
+        except Exception as e:
+            self.notify(f"Import failed: {e}", severity="error")
+            return
+        finally:
+            self.running = False
+        self.show_report(report)
+        self.notify(f"Imported {report['imported']} orders ({report['duplicates']} already there)")
+        if report['imported']:
+            # 🚀 Many rows across many days: listeners requery instead of patching
+            self.post_message(self.DataChanged())
+
+    def on_import_orders_window_progress(self, message: "ImportOrdersWindow.Progress") -> None:
+        self.show_report(message.report)
+
+    def show_report(self, report: dict) -> None:
+        total = report['total_bytes'] or 1
+        self.query_one("#import-progress").update(progress=100 * report['bytes_read'] / total)
+        lines = [f"Read {report['read']}: {report['imported']} imported, {report['duplicates']} duplicates, "
+                 f"{report['skipped']} tip rows skipped, {report['failed']} failed "
+                 f"({report['elapsed_ms'] / 1000:.1f} s)"]
+        lines += [f"line {line_no}: {error}" for line_no, error in report['errors'][:5]]
+        self.query_one("#import-report").update("\n".join(lines))
+
+
 class BatchPricesWindow(BaseWindow):
     WINDOW_ID = "batch_prices"
     """شاشة تحرير الأسعار"""
@@ -115,8 +225,7 @@ class BatchPricesWindow(BaseWindow):
                 mart_price = float(self.query_one(f"#mart-{batch_name}").value or 0)
                 rest_price = float(self.query_one(f"#restaurant-{batch_name}").value or 0)
                 self.db.update_batch_price(batch_name, mart_price, rest_price)
-            # 🚀 Broadcast price changes
-            self.post_message(self.DataChanged())
+            # 🚀 Open order windows pick the new prices up from the SettingsStore broadcast
             self.notify("Prices saved!")
             self.close()
         except Exception as e: self.notify(str(e), severity="error")
@@ -189,7 +298,7 @@ class SettingsWindow(BaseWindow):
             from datetime import datetime
             from pathlib import Path
             
-            report_content = self.db.generate_report()
+            report_content = await self.db.aio.generate_report()
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"talabat_report_{timestamp}.txt"
@@ -204,17 +313,12 @@ class SettingsWindow(BaseWindow):
 
     async def save_settings(self) -> None:
         try:
-            new_settings = {
+            # Wallet balances are left to the in-SQL deltas, not this window's snapshot
+            # 🚀 The SettingsStore notifies the dashboard, which broadcasts to all windows
+            await self.db.aio.update_settings({
                 'mode': self.mode_selector.value,
                 'batch': self.batch_selector.value,
-                'personal_wallet': self.settings['personal_wallet'],
-                'company_wallet': self.settings['company_wallet']
-            }
-            self.db.update_settings(new_settings)
-            
-            # 🚀 Broadcast globally to all open windows
-            self.post_message(self.GlobalSettingsChanged(new_settings))
-            self.post_message(self.DataChanged()) # Also trigger data refresh
+            })
             
             if self.callback:
                 self.callback()
@@ -1,9 +1,10 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from textual.app import ComposeResult
 from textual.containers import Container, Horizontal, Vertical
-from textual.widgets import Button, Static
+from textual.widgets import Button, Sparkline, Static
 from textual import on
+from textual.css.query import NoMatches
 from .window import BaseWindow
 from .components import CustomButton, ArabicInput
 from ..engine import AccountingEngine
@@ -29,7 +30,7 @@ class ManualSettlementWindow(BaseWindow):
             yield CustomButton("Confirm", id="confirm-manual")
             yield CustomButton("Cancel", id="cancel-manual")
 
-    def on_button_pressed(self, event: Button.Pressed) -> None:
+    async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "pay-mode":
             self.mode = "PAY"
             self.query_one("#pay-mode").add_class("active")
@@ -42,16 +43,21 @@ class ManualSettlementWindow(BaseWindow):
             try:
                 val = float(self.amount_input.value or 0)
                 if val <= 0: return
-                if self.callback: self.callback(self.mode, val)
+                if self.callback: await self.callback(self.mode, val)
                 self.close()
             except: pass
         elif event.button.id == "cancel-manual":
             self.close()
 
+def balance_status(company_balance: float) -> str:
+    return "Company owes you" if company_balance > 0 else "You owe company"
+
+
 class SettlementWindow(BaseWindow):
     WINDOW_ID = "settlement"
     """نافذة التسوية (MDI)"""
     WINDOW_ID = "settlement"
+    CHART_DAYS = 30  # 📈 company balance at the end of each of the last N days
     def __init__(self, db, callback=None):
         super().__init__(title="SETTLEMENT", width=65)  # 📏 No fixed height — stops at last button
         self.db = db
@@ -62,8 +68,13 @@ class SettlementWindow(BaseWindow):
 
     def compose_content(self) -> ComposeResult:
         company_balance = self.settings['company_wallet']
-        balance_status = "Company owes you" if company_balance > 0 else "You owe company"
-        yield Static(f"{balance_status}: {abs(company_balance):.2f} EGP", id="balance-info")
+        yield Static(f"{balance_status(company_balance)}: {abs(company_balance):.2f} EGP", id="balance-info")
+        yield Static("", id="balance-chart-title")
+        yield Sparkline([], id="balance-chart")
+        with Vertical(classes="input-group"):
+            yield Static("Balance on date (YYYY-MM-DD):")
+            yield ArabicInput(placeholder=datetime.now().strftime("%Y-%m-%d"), id="balance-date")
+        yield Static("", id="balance-on-date")
         yield Static("Amount / Salary Received:")
         self.amount_input = ArabicInput(placeholder="0.0", id="settlement-amount")
         yield self.amount_input
@@ -90,21 +101,58 @@ class SettlementWindow(BaseWindow):
     def on_mount(self) -> None:
         self.update_ui_state()
         self.update_preview()
+        self.run_worker(self.load_balance_chart, exclusive=True, group="balance-chart")
+
+    def balance_points(self) -> list:
+        """رصيد الشركة في نهاية كل يوم من آخر CHART_DAYS يوماً (balance_at لكل نقطة)"""
+        today = datetime.now().replace(hour=23, minute=59, second=59, microsecond=0)
+        return [
+            self.db.balance_at(today - timedelta(days=days_back))['company_wallet']
+            for days_back in range(self.CHART_DAYS - 1, -1, -1)
+        ]
+
+    async def load_balance_chart(self) -> None:
+        points = await self.db.aio.run(self.balance_points, write=False)
+        try:
+            self.query_one("#balance-chart", Sparkline).data = points
+            self.query_one("#balance-chart-title").update(
+                f"Company balance, last {self.CHART_DAYS} days: {points[0]:.2f} → {points[-1]:.2f} EGP "
+                f"(low {min(points):.2f}, high {max(points):.2f})"
+            )
+        except NoMatches:
+            pass  # closed while the points were loading
+
+    async def show_balance_on_date(self, value: str) -> None:
+        """الرصيد في نهاية يوم معيّن (للمطابقة مع تسوية سابقة)"""
+        label = self.query_one("#balance-on-date")
+        try:
+            day = datetime.strptime(value.strip(), "%Y-%m-%d")
+        except ValueError:
+            label.update("" if not value.strip() else "Use YYYY-MM-DD")
+            return
+        end_of_day = day.replace(hour=23, minute=59, second=59)
+        balance = (await self.db.aio.run(self.db.balance_at, end_of_day, write=False))['company_wallet']
+        label.update(f"End of {day:%Y-%m-%d}: {balance_status(balance)} {abs(balance):.2f} EGP")
 
     # 🚀 REAL-TIME UPDATES
     @on(BaseWindow.OrderAdded)
     @on(BaseWindow.DataChanged)
-    def handle_data_update(self) -> None:
+    def handle_data_update(self, event: BaseWindow.DataChanged = None) -> None:
         """Update balance instantly if orders are added elsewhere"""
-        self.settings = self.db.get_settings()
+        if event is not None and event.balances:
+            self.settings.update(event.balances)
+        elif event is None or event.is_full:
+            self.settings = self.db.get_settings()
         company_balance = self.settings['company_wallet']
-        balance_status = "Company owes you" if company_balance > 0 else "You owe company"
-        self.query_one("#balance-info").update(f"{balance_status}: {abs(company_balance):.2f} EGP")
+        self.query_one("#balance-info").update(f"{balance_status(company_balance)}: {abs(company_balance):.2f} EGP")
         self.update_preview()
+        # Expense events never move the company wallet, so the chart stays as it is
+        if event is None or event.is_full or event.entity == "order":
+            self.run_worker(self.load_balance_chart, exclusive=True, group="balance-chart")
 
     def refresh_ui(self, settings: dict) -> None:
         """Reactive UI: Handle global settings changes (e.g. mode change)"""
-        self.settings = settings
+        self.settings.update(settings)
         self.handle_data_update()
 
     def update_ui_state(self) -> None:
@@ -138,6 +186,7 @@ class SettlementWindow(BaseWindow):
 
     async def on_input_changed(self, event: ArabicInput.Changed) -> None:
         if event.input.id == "settlement-amount": self.update_preview()
+        elif event.input.id == "balance-date": await self.show_balance_on_date(event.value)
 
     async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "direction-toggle":
@@ -156,19 +205,21 @@ class SettlementWindow(BaseWindow):
         elif event.button.id == "close-settlement":
             self.close()
 
-    def on_manual_done(self, mode, amount):
-        p_effect = -amount if mode == "PAY" else amount
-        self.db.add_order({
-            'datetime': datetime.now().isoformat(), 'mode': 'SETTLEMENT', 'order_type': 'Settlement',
-            'subtype': 'manual', 'paid': 0, 'expected': 0, 'actual': amount,
-            'tip_cash': 0, 'tip_visa': 0, 'delivery_fee': 0,
-            'personal_wallet_effect': p_effect, 'company_wallet_effect': 0,
-            'metadata': json.dumps({"manual_mode": mode})
-        })
-        # 🚀 Broadcast update
-        self.post_message(self.OrderAdded())
-        if self.callback: self.callback()
-        self.close()
+    async def on_manual_done(self, mode, amount):
+        try:
+            p_effect = -amount if mode == "PAY" else amount
+            rows = await self.db.aio.insert_order({
+                'datetime': datetime.now().isoformat(), 'mode': 'SETTLEMENT', 'order_type': 'Settlement',
+                'subtype': 'manual', 'paid': 0, 'expected': 0, 'actual': amount,
+                'tip_cash': 0, 'tip_visa': 0, 'delivery_fee': 0,
+                'personal_wallet_effect': p_effect, 'company_wallet_effect': 0,
+                'metadata': json.dumps({"manual_mode": mode})
+            })
+            # 🚀 Broadcast update
+            self.post_message(self.OrderAdded(rows, await self.db.aio.get_balances()))
+            if self.callback: self.callback()
+            self.close()
+        except Exception as e: self.notify(str(e), severity="error")
 
     async def process(self) -> None:
         try:
@@ -180,14 +231,14 @@ class SettlementWindow(BaseWindow):
                 p_effect = -amount if "PAY" in self.direction_toggle.label.plain else amount
                 c_effect, subtype = -amount, 'normal'
             
-            self.db.add_order({
+            rows = await self.db.aio.insert_order({
                 'datetime': datetime.now().isoformat(), 'mode': 'SETTLEMENT', 'order_type': 'Settlement',
                 'subtype': subtype, 'paid': 0, 'expected': 0, 'actual': amount,
                 'tip_cash': 0, 'tip_visa': 0, 'delivery_fee': 0,
                 'personal_wallet_effect': p_effect, 'company_wallet_effect': c_effect
             })
             # 🚀 Broadcast update
-            self.post_message(self.OrderAdded())
+            self.post_message(self.OrderAdded(rows, await self.db.aio.get_balances()))
             if self.callback: self.callback()
             self.close()
         except Exception as e: self.notify(str(e), severity="error")
@@ -1,12 +1,13 @@
 from textual.app import ComposeResult
 from textual.containers import Container, Vertical, Horizontal, Grid, ScrollableContainer
-from textual.widgets import Button, Static, Label, Select, ListItem, ListView
+from textual.widgets import Button, Static, Label, Select
 from textual.message import Message
 from textual import events, on
 from datetime import datetime, timedelta, date
 import calendar
+from typing import List, Optional, Tuple
 from .window import BaseWindow
-from .components import CustomButton
+from .components import CustomButton, OptionSelector, VirtualList, VirtualRow
 from ..utils import format_arabic
 
 class TimePickerWidget(Container):
@@ -87,6 +88,8 @@ class CalendarWindow(BaseWindow):
         self.db = db
         self.year = datetime.now().year
         self.month = datetime.now().month
+        # (year, month) -> {date_iso: day summary}, filled a neighbourhood at a time
+        self._month_cache = {}
         
     def compose_content(self) -> ComposeResult:
         with Horizontal(id="calendar-nav"):
@@ -103,33 +106,79 @@ class CalendarWindow(BaseWindow):
 
     # 🚀 REAL-TIME UPDATES
     @on(BaseWindow.ShiftUpdated)
-    async def handle_shift_update(self) -> None:
-        await self.update_calendar()
+    async def handle_shift_update(self, event: BaseWindow.ShiftUpdated) -> None:
+        if event.is_full:
+            self._month_cache.clear()
+            await self.update_calendar()
+            return
+        # Only the touched days are re-read and restyled, the grid stays mounted
+        dates = sorted({s['shift_date'] for s in event.shifts + event.deleted})
+        summary = await self.db.aio.get_shift_summary_for_range(dates[0], dates[-1])
+        for date_iso in dates:
+            days = self._month_cache.get((int(date_iso[:4]), int(date_iso[5:7])))
+            if days is not None:
+                days.pop(date_iso, None)
+                if date_iso in summary:
+                    days[date_iso] = summary[date_iso]
+        for btn in self.query("#calendar-grid .day-cell"):
+            if getattr(btn, "date_str", None) in dates:
+                self.style_day(btn, summary.get(btn.date_str))
+
+    @staticmethod
+    def style_day(btn: Button, day: Optional[dict]) -> None:
+        has_pending = bool(day and day['has_pending'])
+        all_finished = bool(day and day['all_finished'])
+        btn.set_class(has_pending, "has-shift")
+        btn.set_class(all_finished and not has_pending, "shifts-completed")
+
+    @staticmethod
+    def _add_months(year: int, month: int, delta: int) -> Tuple[int, int]:
+        y, m = divmod(year * 12 + (month - 1) + delta, 12)
+        return y, m + 1
+
+    async def _load_months(self, months: List[Tuple[int, int]]) -> None:
+        """تحميل عدة أشهر متتالية في استعلام واحد وتخزينها"""
+        months = [m for m in months if m not in self._month_cache]
+        if not months:
+            return
+        (y0, m0), (y1, m1) = months[0], months[-1]
+        start = date(y0, m0, 1).isoformat()
+        end = date(y1, m1, calendar.monthrange(y1, m1)[1]).isoformat()
+        summary = await self.db.aio.get_shift_summary_for_range(start, end)
+        for y, m in months:
+            prefix = f"{y:04d}-{m:02d}-"
+            self._month_cache[(y, m)] = {d: info for d, info in summary.items() if d.startswith(prefix)}
+
+    async def _prefetch_neighbours(self) -> None:
+        # warm both sides (one range query) so the next prev/next click renders without a query
+        await self._load_months([self._add_months(self.year, self.month, d) for d in (-1, 0, 1)])
 
     async def update_calendar(self) -> None:
         try:
+            key = (self.year, self.month)
+            if key not in self._month_cache:
+                await self._load_months([self._add_months(self.year, self.month, d) for d in (-1, 0, 1)])
+            days = self._month_cache[key]
             grid = self.query_one("#calendar-grid")
             await grid.remove_children()
             month_days = calendar.monthcalendar(self.year, self.month)
             today = date.today()
+            cells = []
             for week in month_days:
                 for day in week:
                     if day == 0:
-                        grid.mount(Static("", classes="day-cell empty-day"))
+                        cells.append(Static("", classes="day-cell empty-day"))
                     else:
                         date_val = date(self.year, self.month, day)
                         date_iso = date_val.isoformat()
-                        shifts = self.db.get_shifts_by_date(date_iso)
-                        is_today = (date_val == today)
-                        has_pending = any(s['status'] in ['SCHEDULED', 'ACTIVE'] for s in shifts)
-                        all_finished = len(shifts) > 0 and all(s['status'] in ['FINISHED', 'ABSENT'] for s in shifts)
                         btn = Button(str(day), classes="day-cell")
                         btn.date_str = date_iso
-                        if is_today: btn.add_class("today")
-                        if has_pending: btn.add_class("has-shift")
-                        elif all_finished: btn.add_class("shifts-completed")
-                        grid.mount(btn)
+                        if date_val == today: btn.add_class("today")
+                        self.style_day(btn, days.get(date_iso))
+                        cells.append(btn)
+            await grid.mount(*cells)
             self.query_one("#month-label").update(f"{calendar.month_name[self.month]} {self.year}")
+            self.call_after_refresh(self._prefetch_neighbours)
         except Exception as e:
             self.notify(f"Calendar Error: {e}", severity="error")
 
@@ -164,6 +213,7 @@ class DayShiftsWindow(BaseWindow):
         with Horizontal(classes="dialog-buttons"):
             if datetime.strptime(self.date_str, "%Y-%m-%d").date() >= date.today():
                 yield CustomButton("Add Shift", id="add-shift-btn")
+                yield CustomButton("Repeat", id="repeat-shift-btn")
             yield CustomButton("Close", id="close-day-shifts")
 
     def on_mount(self) -> None:
@@ -195,6 +245,9 @@ class DayShiftsWindow(BaseWindow):
         elif event.button.id == "add-shift-btn":
             if hasattr(self.app.screen, "open_window"):
                  self.app.screen.open_window(AddShiftWindow(self.db, self.date_str, self.refresh_shifts))
+        elif event.button.id == "repeat-shift-btn":
+            if hasattr(self.app.screen, "open_window"):
+                 self.app.screen.open_window(RecurringShiftsWindow(self.db, self.date_str, self.refresh_shifts))
 
     async def on_shift_item_widget_selected(self, message: "ShiftItemWidget.Selected") -> None:
         if hasattr(self.app.screen, "open_window"):
@@ -243,8 +296,8 @@ class AddShiftWindow(BaseWindow):
             end = self.query_one("#end-picker").value
             success, final_date, err = self.db.add_scheduled_shift(self.date_str, start, end)
             if success:
-                # 🚀 Broadcast update
-                self.post_message(self.ShiftUpdated())
+                # 🚀 Broadcast that day's rows (the new shift among them)
+                self.post_message(self.ShiftUpdated(self.db.get_shifts_by_date(final_date)))
                 if self.on_success: 
                     import inspect
                     if inspect.iscoroutinefunction(self.on_success):
@@ -254,6 +307,69 @@ class AddShiftWindow(BaseWindow):
                 self.remove()
             else: self.query_one("#error-msg").update(err)
 
+class RecurringShiftsWindow(BaseWindow):
+    WINDOW_ID = "recurring_shifts"
+    """نافذة جدولة ورديات متكررة (MDI)"""
+    WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    WEEK_OPTIONS = [("1w", "1"), ("2w", "2"), ("4w", "4"), ("8w", "8"), ("12w", "12")]
+
+    def __init__(self, db, date_str, on_success=None):
+        super().__init__(title="REPEAT SHIFTS", width=62)  # 📏 auto height
+        self.db = db
+        self.date_str = date_str
+        self.on_success = on_success
+        self.days = {datetime.strptime(date_str, "%Y-%m-%d").weekday()}
+
+    def compose_content(self) -> ComposeResult:
+        yield Static(f"From {self.date_str}, repeat on:")
+        with Horizontal(classes="option-selector", id="weekday-toggles"):
+            for i, name in enumerate(self.WEEKDAYS):
+                btn = Button(name, id=f"weekday-{i}", classes="option-button")
+                btn.set_class(i in self.days, "active")
+                yield btn
+        yield TimePickerWidget(label="Start Time", initial_time="18:00", id="start-picker")
+        yield TimePickerWidget(label="End Time", initial_time="02:00", id="end-picker")
+        yield Static("For:")
+        self.weeks_selector = OptionSelector(self.WEEK_OPTIONS, value="4", id="weeks-selector")
+        yield self.weeks_selector
+        yield Static("", id="recurring-report")
+        with Horizontal(classes="dialog-buttons"):
+            yield CustomButton("Schedule", id="save-recurring")
+            yield CustomButton("Close", id="cancel-recurring")
+
+    async def on_button_pressed(self, event: Button.Pressed) -> None:
+        button_id = event.button.id or ""
+        if button_id.startswith("weekday-"):
+            day = int(button_id.split("-")[1])
+            self.days ^= {day}
+            event.button.set_class(day in self.days, "active")
+        elif button_id == "cancel-recurring":
+            self.remove()
+        elif button_id == "save-recurring":
+            if not self.days:
+                self.query_one("#recurring-report").update("[red]Pick at least one day[/]")
+                return
+            result = await self.db.aio.add_recurring_shifts(
+                self.date_str, sorted(self.days),
+                self.query_one("#start-picker").value, self.query_one("#end-picker").value,
+                int(self.weeks_selector.value)
+            )
+            # 📋 Per-date report of what was skipped
+            lines = [f"[green]Added {len(result['added'])} shifts[/] in {result['elapsed_ms']:.1f} ms"]
+            if result['conflicts']:
+                lines.append(f"[yellow]Skipped {len(result['conflicts'])}:[/]")
+                lines.extend(f"  {day}: {reason}" for day, reason in result['conflicts'])
+            self.query_one("#recurring-report").update("\n".join(lines))
+            if result['added']:
+                # 🚀 Broadcast the new rows (calendar re-reads only those days)
+                self.post_message(self.ShiftUpdated(result['added']))
+                if self.on_success:
+                    import inspect
+                    if inspect.iscoroutinefunction(self.on_success):
+                        await self.on_success()
+                    else:
+                        self.on_success()
+
 class ShiftDetailsWindow(BaseWindow):
     WINDOW_ID = "shift_details"
     """تفاصيل الوردية (MDI)"""
@@ -274,6 +390,10 @@ class ShiftDetailsWindow(BaseWindow):
 
     def on_mount(self) -> None: self.refresh_ui()
 
+    def on_base_window_global_settings_changed(self, message: BaseWindow.GlobalSettingsChanged) -> None:
+        # Nothing here depends on settings or wallets (and refresh_ui takes no settings)
+        pass
+
     def refresh_ui(self) -> None:
         updated = self.db.get_shift_summary(self.shift['id'])
         if not updated: self.close(); return
@@ -291,26 +411,40 @@ class ShiftDetailsWindow(BaseWindow):
 
     # 🚀 REAL-TIME UPDATES: refresh if orders are added elsewhere
     @on(BaseWindow.OrderAdded)
-    def handle_order_added(self) -> None:
-        self.refresh_ui()
+    def handle_order_added(self, event: BaseWindow.OrderAdded) -> None:
+        # orders outside this shift do not touch its totals
+        if event.is_full or any(o.get('shift_id') == self.shift['id'] for o in event.added):
+            self.refresh_ui()
+
+    @on(BaseWindow.ShiftUpdated)
+    def handle_shift_update(self, event: BaseWindow.ShiftUpdated) -> None:
+        # e.g. a break that expired or a shift auto-ended while this window is open
+        if getattr(event, "_sender", None) is self:
+            return
+        if event.is_full or any(s.get('id') == self.shift['id'] for s in event.shifts + event.deleted):
+            self.refresh_ui()
 
     async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "delete-shift-btn":
             if self.db.delete_shift(self.shift['id']):
+                # 🚀 Broadcast update
+                self.post_message(self.ShiftUpdated(deleted=[self.shift]))
                 if self.on_change: self.on_change()
                 self.close()
         elif event.button.id == "start-shift-btn":
             if self.db.start_shift(self.shift['id'])[0]:
                 self.refresh_ui()
+                # 🚀 Broadcast update
+                self.post_message(self.ShiftUpdated([self.shift]))
                 if self.on_change: self.on_change()
         elif event.button.id == "break-btn":
             if hasattr(self.app.screen, "open_window"):
                  self.app.screen.open_window(BreakWindow(self.db, self.shift['id'], self.refresh_ui))
         elif event.button.id == "end-break-btn":
             self.db.toggle_break(self.shift['id'])
-            # 🚀 Broadcast update
-            self.post_message(self.ShiftUpdated())
             self.refresh_ui()
+            # 🚀 Broadcast update
+            self.post_message(self.ShiftUpdated([self.shift]))
             if self.on_change: self.on_change()
 
 class BreakWindow(BaseWindow):
@@ -332,34 +466,44 @@ class BreakWindow(BaseWindow):
             mins = int(event.button.id.split("-")[1])
             self.db.toggle_break(self.shift_id, mins)
             # 🚀 Broadcast update
-            self.post_message(self.ShiftUpdated())
+            self.post_message(self.ShiftUpdated([self.db.get_shift_summary(self.shift_id)]))
             if self.on_success: self.on_success()
             self.close()
 
-class ShiftHistoryRow(ListItem):
+class ShiftHistoryRow(VirtualRow):
     """سطر تاريخ الورديات المطور - أعمدة منظمة"""
-    def __init__(self, shift: dict, **kwargs):
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.shift = shift
+        self.shift: dict = {}
         self.add_class("shift-history-row")
+        self.date_label = Label("", classes="col-date")
+        self.status_label = Label("", classes="col-status")
+        self.orders_label = Label("", classes="col-orders")
 
     def compose(self) -> ComposeResult:
         with Horizontal(classes="shift-row-content"):
-            # 📅 Date (formatted for display)
-            yield Label(format_arabic(str(self.shift.get('shift_date', 'N/A'))), classes="col-date")
-            
-            # 🏁 Status
-            status = self.shift.get('status', 'Unknown')
-            icon = {"ACTIVE": "🟢", "SCHEDULED": "📅", "FINISHED": "🏁", "ABSENT": "❌"}.get(status, "❓")
-            yield Label(format_arabic(f"{icon} {status}"), classes="col-status")
-            
-            # 📦 Orders
-            orders = self.shift.get('total_orders', 0)
-            yield Label(f"{orders}", classes="col-orders")
+            yield self.date_label
+            yield self.status_label
+            yield self.orders_label
+
+    def render_item(self, shift: dict, index: int, selected: bool) -> None:
+        self.shift = shift
+        # 📅 Date (formatted for display)
+        self.date_label.update(format_arabic(str(shift.get('shift_date', 'N/A'))))
+        
+        # 🏁 Status
+        status = shift.get('status', 'Unknown')
+        icon = {"ACTIVE": "🟢", "SCHEDULED": "📅", "FINISHED": "🏁", "ABSENT": "❌"}.get(status, "❓")
+        self.status_label.update(format_arabic(f"{icon} {status}"))
+        
+        # 📦 Orders
+        self.orders_label.update(f"{shift.get('total_orders', 0)}")
 
 class ShiftsHistoryWindow(BaseWindow):
     WINDOW_ID = "shifts_history"
     """سجل الورديات (MDI)"""
+    VISIBLE_ROWS = 10  # #shifts-history-content max-height 20, two lines per row
+
     def __init__(self, db):
         super().__init__(title="SHIFTS HISTORY", width=80)  # 📏 No fixed height — fills real rows only
         self.db = db
@@ -370,7 +514,7 @@ class ShiftsHistoryWindow(BaseWindow):
             yield Label("STATUS", classes="col-status")
             yield Label("ORDERS", classes="col-orders")
             
-        self.history_list = ListView(id="shifts-history-content")
+        self.history_list = VirtualList(ShiftHistoryRow, max_rows=self.VISIBLE_ROWS, id="shifts-history-content")
         yield self.history_list
         
         with Horizontal(id="dialog-buttons"):
@@ -382,8 +526,21 @@ class ShiftsHistoryWindow(BaseWindow):
 
     # 🚀 REAL-TIME UPDATES
     @on(BaseWindow.ShiftUpdated)
-    def handle_shift_update(self) -> None:
-        self.refresh_history()
+    def handle_shift_update(self, event: BaseWindow.ShiftUpdated) -> None:
+        if event.is_full:
+            self.refresh_history()
+            return
+        self.history_list.remove_keys(s['id'] for s in event.deleted)
+        for shift in event.shifts:
+            if not self.history_list.replace(shift):
+                self._insert_sorted(shift)
+
+    def _insert_sorted(self, shift: dict) -> None:
+        # same order as get_all_shifts: ts DESC, scheduled_start DESC
+        rank = lambda row: (row['ts'] or 0, row['scheduled_start'] or "")
+        items = self.history_list.items
+        index = next((i for i, row in enumerate(items) if rank(row) < rank(shift)), len(items))
+        self.history_list.insert(index, shift)
 
     def refresh_history(self) -> None:
         try:
@@ -391,20 +548,16 @@ class ShiftsHistoryWindow(BaseWindow):
         except Exception:
             return
         # ✅ Only real DB rows — no placeholders, no spacers
-        # Always refresh when count changes
-        current_count = len(self.history_list.children)
-        if current_count != len(all_shifts):
-            self.history_list.clear()
-            for s in all_shifts:
-                self.history_list.append(ShiftHistoryRow(s))
+        # Rebinding the visible rows is cheap, so status changes show up too
+        self.history_list.set_items(all_shifts, reset=False)
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "close-history-btn":
             self.remove()
 
-    async def on_list_view_selected(self, event: ListView.Selected) -> None:
-        if event.item and hasattr(event.item, "shift"):
-             shift = event.item.shift
+    async def on_virtual_list_selected(self, event: VirtualList.Selected) -> None:
+        if event.control is self.history_list:
+             shift = event.item
              if shift['status'] in ['SCHEDULED', 'ACTIVE']:
                  if hasattr(self.app.screen, "open_window"):
                       self.app.screen.open_window(ShiftDetailsWindow(self.db, shift, self.refresh_history))
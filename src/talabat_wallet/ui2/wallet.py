@@ -1,8 +1,9 @@
 from textual.app import ComposeResult
 from textual.containers import Container, Horizontal, Vertical
-from textual.widgets import Static, Label, Input, ListView, ListItem, OptionList, Button
+from textual.widgets import Static, Label, Input, OptionList, Button
+from textual.widgets.option_list import Option
 from textual import events, on
-from .components import CustomButton, WalletDisplay, ArabicInput
+from .components import CustomButton, WalletDisplay, ArabicInput, VirtualList, VirtualRow
 from ..utils import format_arabic
 from typing import Optional, Callable
 from .window import BaseWindow
@@ -63,8 +64,10 @@ class EditTransactionWindow(BaseWindow):
             amount = float(amount_str)
             if self.db.update_expense(self.txn_id, desc, amount, self.txn_type):
                 self.notify("Transaction updated!")
-                # 🚀 Broadcast update
-                self.post_message(self.DataChanged())
+                # 🚀 Broadcast the edited row; only these three fields can change
+                after = self.db.get_expense_by_id(self.txn_id)
+                before = dict(after, description=self.current_desc, amount=self.current_amount, type=self.current_type)
+                self.post_message(self.DataChanged("expense", updated=[(before, after)]))
                 if self.callback: self.callback()
                 self.close()
             else:
@@ -89,10 +92,11 @@ class ConfirmDeleteWindow(BaseWindow):
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "confirm-delete":
-            if self.db.delete_expense(self.txn_id):
+            row = self.db.get_expense_by_id(self.txn_id)
+            if row and self.db.delete_expense(self.txn_id):
                 self.notify("Transaction deleted!")
                 # 🚀 Broadcast update
-                self.post_message(self.DataChanged())
+                self.post_message(self.DataChanged("expense", deleted=[row]))
                 if self.callback: self.callback()
                 self.close()
             else:
@@ -148,34 +152,47 @@ class TransactionDetailsWindow(BaseWindow):
                     )
                 )
 
-class ExpenseRow(ListItem):
+class ExpenseRow(VirtualRow):
     """سطر لعرض مصروف واحد"""
-    def __init__(self, expense: dict, **kwargs):
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.expense = expense
+        self.expense: dict = {}
         self.add_class("expense-row")
+        self.content = Horizontal(classes="expense-row-content")
+        self.date_label = Label("", classes="expense-date")
+        self.desc_label = Label("", classes="expense-desc")
+        self.amount_label = Label("", classes="expense-amount")
 
     def compose(self) -> ComposeResult:
-        txn_type = self.expense.get('type', 'OUT')
+        with self.content:
+            yield self.date_label
+            yield self.desc_label
+            yield self.amount_label
+
+    def render_item(self, expense: dict, index: int, selected: bool) -> None:
+        self.expense = expense
+        txn_type = expense.get('type', 'OUT')
         txn_char = "+" if txn_type == 'IN' else "-"
-        txn_class = "txn-in" if txn_type == 'IN' else "txn-out"
-        
-        with Horizontal(classes=f"expense-row-content {txn_class}"):
-            yield Label(self.expense['datetime'][11:16], classes="expense-date")
-            desc = self.expense.get('description', 'No Desc')
-            yield Label(format_arabic(desc), classes="expense-desc")
-            # The color is now controlled by CSS .txn-in / .txn-out classes
-            yield Label(f"{txn_char} {self.expense.get('amount', 0.0):.2f}", classes="expense-amount")
+        # The color is now controlled by CSS .txn-in / .txn-out classes
+        self.content.set_class(txn_type == 'IN', "txn-in")
+        self.content.set_class(txn_type != 'IN', "txn-out")
+        self.date_label.update(expense['datetime'][11:16])
+        self.desc_label.update(format_arabic(expense.get('description', 'No Desc')))
+        self.amount_label.update(f"{txn_char} {expense.get('amount', 0.0):.2f}")
 
 class WalletWindow(BaseWindow):
     WINDOW_ID = "wallet"
     """نافذة المحفظة الرئيسية"""
+    VISIBLE_EXPENSES = 8  # rows that fit in #expense-list (max-height 10 minus border)
+    EXPENSE_LIMIT = 200
+
     def __init__(self, db, on_close: Optional[Callable] = None):
         super().__init__(title="WALLET", width=75, height=30)  # 💌 Keep height for scrollable list
         self.db = db
         self.on_close = on_close
         self.txn_type = 'OUT'
         self._selecting_suggestion = False
+        self.stats = {'total_in': 0.0, 'total_out': 0.0, 'net': 0.0}
 
     def compose_content(self) -> ComposeResult:
         settings = self.db.get_settings()
@@ -199,7 +216,7 @@ class WalletWindow(BaseWindow):
                 with Horizontal(id="expense-buttons"):
                     yield CustomButton("Save", id="save-expense", custom_width=12)
             
-            self.expense_list = ListView(id="expense-list")
+            self.expense_list = VirtualList(ExpenseRow, max_rows=self.VISIBLE_EXPENSES, id="expense-list")
             yield self.expense_list
             
             with Horizontal(id="dialog-buttons"):
@@ -216,33 +233,68 @@ class WalletWindow(BaseWindow):
 
     async def _do_load_data(self):
         await self.load_data()
+        # 🔤 Warm the suggestion index on a reader thread so the first keystroke is instant
+        await self.db.aio.get_unique_descriptions()
 
     async def load_data(self) -> None:
-        stats = self.db.get_wallet_stats()
+        self.stats = self.db.get_wallet_stats()
+        self.update_stats_bar()
+
+        expenses = self.db.get_all_expenses(limit=self.EXPENSE_LIMIT)
+        self.expense_list.set_items(expenses, reset=False)
+            
+        self.update_balances(self.db.get_balances())
+
+    def update_stats_bar(self) -> None:
+        stats = self.stats
         stats_text = f"In: [b green]{stats['total_in']:.2f}[/] | Out: [b red]{stats['total_out']:.2f}[/] | Net: [b]{stats['net']:.2f}[/]"
         self.query_one("#wallet-stats-bar").update(stats_text)
 
-        expenses = self.db.get_all_expenses(limit=15)
-        await self.expense_list.clear() # Making this async
-        to_mount = [ExpenseRow(exp) for exp in expenses]
-        await self.expense_list.mount(*to_mount)
-            
-        settings = self.db.get_settings()
-        self.query_one("#wallet-personal").value = settings['personal_wallet']
-        self.query_one("#wallet-company").value = settings['company_wallet']
+    def update_balances(self, balances: dict) -> None:
+        self.query_one("#wallet-personal").value = balances['personal_wallet']
+        self.query_one("#wallet-company").value = balances['company_wallet']
+
+    def refresh_ui(self, settings: dict) -> None:
+        """Reactive UI: wallet moves broadcast by the SettingsStore (incl. other processes)"""
+        if 'personal_wallet' in settings or 'company_wallet' in settings:
+            self.update_balances(self.db.get_balances())
 
     # 🚀 REAL-TIME UPDATES: Listen for changes from other windows
     @on(BaseWindow.OrderAdded)
     @on(BaseWindow.DataChanged)
-    async def handle_data_update(self) -> None:
+    async def handle_data_update(self, event: BaseWindow.DataChanged) -> None:
         """Update transaction list instantly when an order or txn is added elsewhere"""
-        await self.load_data()
+        if event.is_full:
+            await self.load_data()
+            return
+        if event.balances:
+            self.update_balances(event.balances)
+        if event.entity == "expense":
+            self.apply_expense_changes(event)
+
+    def apply_expense_changes(self, event: BaseWindow.DataChanged) -> None:
+        """تحديث القائمة والإجماليات من حمولة الحدث"""
+        changes = [(row, -1) for row in event.deleted]
+        for before, after in event.updated:
+            changes += [(before, -1), (after, 1)]
+            self.expense_list.replace(after)
+        changes += [(row, 1) for row in event.added]
+        for row, sign in changes:
+            total = 'total_in' if row['type'] == 'IN' else 'total_out'
+            self.stats[total] += sign * row['amount']
+        self.stats['net'] = self.stats['total_in'] - self.stats['total_out']
+        self.update_stats_bar()
+
+        self.expense_list.remove_keys(row['id'] for row in event.deleted)
+        # new transactions are stamped "now", so they go on top
+        for row in event.added:
+            self.expense_list.insert(0, row)
 
-    def on_list_view_selected(self, message: ListView.Selected) -> None:
-        if isinstance(message.item, ExpenseRow):
+    def on_virtual_list_selected(self, message: VirtualList.Selected) -> None:
+        if message.control is self.expense_list:
             if hasattr(self.app.screen, "open_window"):
                 self.app.screen.open_window(
-                    TransactionDetailsWindow(self.db, message.item.expense, callback=self.load_data)
+                    TransactionDetailsWindow(self.db, message.item)
                 )
 
     def on_input_changed(self, event: Input.Changed) -> None:
@@ -258,8 +310,8 @@ class WalletWindow(BaseWindow):
                 suggestions = self.db.get_unique_descriptions(prefix)
                 if suggestions:
                     self.suggestions_list.clear_options()
-                    for s in suggestions:
-                        self.suggestions_list.add_option(format_arabic(s))
+                    # id keeps the stored text; the prompt is only the shaped display form
+                    self.suggestions_list.add_options([Option(format_arabic(s), id=s) for s in suggestions])
                     self.suggestions_list.display = "block"
                 else:
                     self.suggestions_list.display = "none"
@@ -272,7 +324,7 @@ class WalletWindow(BaseWindow):
             desc_input = self.query_one("#expense-desc")
             self.suggestions_list.display = "none"
             self.suggestions_list.clear_options()
-            desc_input.value = str(event.option.prompt)
+            desc_input.value = event.option.id or str(event.option.prompt)
             self.query_one("#expense-amount").focus()
 
     async def on_button_pressed(self, event: CustomButton.Pressed) -> None:
@@ -314,14 +366,14 @@ class WalletWindow(BaseWindow):
 
         try:
              amount = float(amount_str)
-             if self.db.add_expense(description, amount, self.txn_type):
+             row = self.db.insert_expense(description, amount, self.txn_type)
+             if row:
                  self.notify("Saved!")
                  desc_input.value = ""
                  amount_input.value = ""
                  self.suggestions_list.display = "none"
-                 await self.load_data()
-                 # 🚀 Broadcast my own update too
-                 self.post_message(self.DataChanged())
+                 # 🚀 Broadcast the new row; this window patches itself from the same event
+                 self.post_message(self.DataChanged("expense", added=[row]))
              else:
                  self.notify("Error saving", severity="error")
         except ValueError:
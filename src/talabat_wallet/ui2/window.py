@@ -3,6 +3,7 @@ from textual.containers import Vertical, Horizontal
 from textual.widgets import Static
 from textual import events
 from textual.message import Message
+from typing import Optional
 
 
 # ================= CLOSE BUTTON ================= #
@@ -135,16 +136,45 @@ class BaseWindow(Vertical):
             super().__init__()
 
     class DataChanged(Message):
-        """Broadcasted when any major database change occurs."""
-        pass
-
-    class OrderAdded(Message):
-        """Broadcasted when a new order is successfully added."""
-        pass
+        """Broadcasted when any major database change occurs.
+
+        ``entity`` ("order" / "expense") plus the row lists carry the delta so
+        listeners patch their views in place. A bare DataChanged() still means
+        "requery everything" (reset, rebuilt stats, new prices).
+        """
+        def __init__(self, entity: Optional[str] = None, added=(), updated=(), deleted=(),
+                     balances: Optional[dict] = None):
+            super().__init__()
+            self.entity = entity
+            self.added = list(added)      # new rows
+            self.updated = list(updated)  # (before, after) row pairs
+            self.deleted = list(deleted)  # removed rows
+            self.balances = balances      # wallet balances after the change, if they moved
+
+        @property
+        def is_full(self) -> bool:
+            return self.entity is None
+
+    class OrderAdded(DataChanged):
+        """Broadcasted when a new order is successfully added (rows = order + its tip row)."""
+        def __init__(self, orders=(), balances: Optional[dict] = None):
+            # no rows -> plain "something changed", listeners requery
+            super().__init__("order" if orders else None, added=orders, balances=balances)
 
     class ShiftUpdated(Message):
-        """Broadcasted when shift status or data changes."""
-        pass
+        """Broadcasted when shift status or data changes.
+
+        ``shifts`` holds the changed rows and ``deleted`` the removed ones;
+        with neither, listeners requery.
+        """
+        def __init__(self, shifts=(), deleted=()):
+            super().__init__()
+            self.shifts = list(shifts)
+            self.deleted = list(deleted)
+
+        @property
+        def is_full(self) -> bool:
+            return not self.shifts and not self.deleted
 
     class WindowResized(Message):
         """Broadcasted when a focused window is resized."""
@@ -1,7 +1,8 @@
 import sys
 import os
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple, Union
 try:
     import arabic_reshaper
     from bidi.algorithm import get_display
@@ -10,14 +11,26 @@ except ImportError:
     HAS_ARABIC_SUPPORT = False
 
 import re
+from functools import lru_cache
+
+# نطاق الحروف العربية (مُجمّع مرة واحدة) وحجم ذاكرة التشكيل
+_ARABIC_RE = re.compile(r'[\u0600-\u06FF]')
+FORMAT_ARABIC_CACHE_SIZE = 4096
 
 def format_arabic(text: str) -> str:
     """معالجة النصوص العربية لتظهر بشكل صحيح (غير متقطعة وغير معكوسة)"""
     if not text or not HAS_ARABIC_SUPPORT:
         return text
-    
+    # most labels are plain ASCII (ids, amounts, dates): no lookup at all
+    if text.isascii():
+        return text
+    return _shape_arabic(text)
+
+@lru_cache(maxsize=FORMAT_ARABIC_CACHE_SIZE)
+def _shape_arabic(text: str) -> str:
+    """التشكيل الفعلي (مخزّن مؤقتاً: نفس الأوصاف تتكرر آلاف المرات في الجلسة)"""
     # فحص ما إذا كان النص يحتوي على حروف عربية
-    if not re.search(r'[\u0600-\u06FF]', text):
+    if not _ARABIC_RE.search(text):
         return text
         
     try:
@@ -30,6 +43,15 @@ def format_arabic(text: str) -> str:
         # في حالة حدوث أي خطأ، نعود للنص الأصلي لضمان عدم توقف البرنامج
         return text
 
+def format_arabic_cache_info() -> Dict[str, Any]:
+    """عدادات ذاكرة التشكيل (إصابة/إخفاق/الحجم)"""
+    info = _shape_arabic.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
+
+def clear_format_arabic_cache() -> None:
+    """تفريغ ذاكرة التشكيل (للقياس)"""
+    _shape_arabic.cache_clear()
+
 def get_data_directory() -> Path:
     """الحصول على دليل البيانات"""
     if sys.platform == "linux":
@@ -58,6 +80,44 @@ def format_currency(amount: float) -> str:
     else:
         return f"-{abs(amount):,.2f} SAR"
 
+def to_epoch(value: Union[str, date, datetime, None]) -> Optional[int]:
+    """تحويل تاريخ محلي (ISO بحرف T أو بمسافة، أو تاريخ فقط) إلى ثوانٍ منذ Epoch"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, date):
+        return int(datetime.combine(value, datetime.min.time()).timestamp())
+    try:
+        return int(datetime.fromisoformat(str(value).strip()).timestamp())
+    except ValueError:
+        return None
+
+SHIFT_TIME_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %I:%M %p")
+
+def parse_shift_datetime(date_str: Optional[str], time_str: Optional[str]) -> Optional[datetime]:
+    """تحويل تاريخ ووقت الوردية (بأي من الصيغ المخزنة) إلى datetime، أو None إن تعذر"""
+    if not date_str or not time_str:
+        return None
+    text = f"{date_str} {time_str}".strip()
+    for fmt in SHIFT_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text.replace(" ", "T"))
+    except ValueError:
+        return None
+
+def shift_span(date_str: Optional[str], start_str: Optional[str], end_str: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """بداية ونهاية الوردية كثوانٍ منذ Epoch (نهاية قبل البداية = عبور منتصف الليل)"""
+    start = parse_shift_datetime(date_str, start_str)
+    end = parse_shift_datetime(date_str, end_str)
+    if start and end and end <= start:
+        end += timedelta(days=1)
+    return (int(start.timestamp()) if start else None, int(end.timestamp()) if end else None)
+
 def validate_positive_number(value: str, field_name: str = "Value") -> Optional[float]:
     """التحقق من أن القيمة عدد موجب"""
     try:
@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+from .connection import ConnectionManager
+
+
+class WriteQueue:
+    """طابور كتابة بخيط واحد: الأوامر المتقاربة زمنياً تُنفَّذ في معاملة واحدة (Group Commit)
+
+    Every command runs inside its own SAVEPOINT, so a failing command is
+    rolled back alone and the rest of the batch still commits. Futures are
+    resolved only after the shared COMMIT has succeeded.
+    """
+
+    def __init__(self, pool: ConnectionManager, window: float = 0.004, max_batch: int = 64):
+        self._pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: threading.Thread = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """إضافة أمر كتابة إلى الطابور؛ النتيجة تصل عبر Future"""
+        future = Future()
+        self._ensure_thread()
+        with self._stats_lock:
+            self.submitted += 1
+        self._queue.put((fn, args, kwargs, future, time.perf_counter()))
+        return future
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # اجمع ما يصل خلال نافذة قصيرة ليشارك نفس الـ COMMIT
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple]) -> None:
+        outcomes = []
+        try:
+            with self._pool.write():
+                for fn, args, kwargs, future, _ in batch:
+                    try:
+                        with self._pool.write():
+                            outcomes.append((future, True, fn(*args, **kwargs)))
+                    except Exception as e:
+                        outcomes.append((future, False, e))
+        except Exception as e:
+            # COMMIT (or BEGIN) failed: nothing in this batch was stored
+            outcomes = [(future, False, e) for _, _, _, future, _ in batch]
+
+        now = time.perf_counter()
+        with self._stats_lock:
+            self.batches += 1
+            for (_, ok, _), (_, _, _, _, queued_at) in zip(outcomes, batch):
+                latency = now - queued_at
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self) -> Dict[str, float]:
+        """عدادات الطابور: الأوامر، الدفعات (COMMITs)، زمن الانتظار والإنتاجية"""
+        with self._stats_lock:
+            done = self.completed + self.failed
+            elapsed = time.perf_counter() - self._started
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'pending': self.submitted - done,
+                'batches': self.batches,
+                'avg_batch_size': done / self.batches if self.batches else 0.0,
+                'avg_latency_ms': self._latency_total * 1000 / done if done else 0.0,
+                'max_latency_ms': self._latency_max * 1000,
+                'throughput_per_sec': done / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def close(self) -> None:
+        """تنفيذ ما تبقى في الطابور ثم إيقاف الخيط"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None